@@ -1,13 +1,16 @@
 
 import streamlit as st
 from dotenv import load_dotenv
-from main import processar_pergunta
+from main import processar_pergunta_stream
 from pathlib import Path
 import json
 from datetime import datetime
 import unicodedata
 import re
-from db_sqlalchemy import ChatHistory, salvar_chat,buscar_historico
+import uuid
+from config import UI_CONFIG
+from db_sqlalchemy import (listar_conversas, cursor_conversa, buscar_conversa, carregar_mensagens,
+                           nova_conversa_id, salvar_conversa_async, salvar_mensagem_async)
 from db_sqlalchemy import criar_tabelas
 
     # Garante que a tabela do banco será criada se não existir
@@ -166,107 +169,227 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Buscar histórico do banco ao abrir o app
+# Usuário e conversa ficam na URL (?usuario=...&conversa=...): sobrevivem a
+# recarregamentos, funcionam em qualquer réplica e permitem compartilhar o link
+if "usuario" not in st.session_state:
+    st.session_state.usuario = st.query_params.get("usuario") or uuid.uuid4().hex
+    st.query_params["usuario"] = st.session_state.usuario
+
+def item_historico(m):
+    """Linha de messages no formato usado pelo chat"""
+    return {
+        "id": m.id,
+        "pergunta": m.pergunta,
+        "resposta": m.resposta,
+        "citacoes": m.citacoes or [],
+        "acao": m.acao or "",
+        "timestamp": m.created_at.isoformat() if hasattr(m.created_at, 'isoformat') else str(m.created_at)
+    }
+
+def carregar_conversa(conversation_id):
+    """Carrega só a última página de mensagens; as anteriores vêm sob demanda"""
+    limite = UI_CONFIG["max_chat_history"]
+    mensagens = carregar_mensagens(conversation_id, limit=limite)
+    st.session_state.conversa_id = conversation_id
+    st.session_state.historico = [item_historico(m) for m in reversed(mensagens)]
+    st.session_state.antes_id = mensagens[-1].id if len(mensagens) == limite else None
+    reiniciar_exibicao()
+
+def carregar_mensagens_anteriores():
+    limite = UI_CONFIG["max_chat_history"]
+    mensagens = carregar_mensagens(st.session_state.conversa_id, limit=limite, before_id=st.session_state.antes_id)
+    st.session_state.historico[:0] = [item_historico(m) for m in reversed(mensagens)]
+    st.session_state.antes_id = mensagens[-1].id if len(mensagens) == limite else None
+
+def iniciar_sem_conversa():
+    st.session_state.conversa_id = None
+    st.session_state.historico = []
+    st.session_state.antes_id = None
+    reiniciar_exibicao()
+
+def reiniciar_exibicao():
+    """Volta a exibir só os últimos turnos e descarta o HTML da conversa anterior"""
+    st.session_state.turnos_visiveis = UI_CONFIG["turnos_visiveis"]
+    st.session_state.html_turnos = {}
+
+def mostrar_turnos_anteriores():
+    """Amplia a janela exibida, buscando no banco quando a memória não basta"""
+    passo = UI_CONFIG["turnos_visiveis"]
+    ocultos = len(st.session_state.historico) - st.session_state.turnos_visiveis
+    if ocultos < passo and st.session_state.antes_id is not None:
+        carregar_mensagens_anteriores()
+    st.session_state.turnos_visiveis += passo
+
+# Buscar a conversa da URL ao abrir o app
 if "historico" not in st.session_state:
+    iniciar_sem_conversa()
+    conversa_url = st.query_params.get("conversa")
+    if conversa_url:
+        try:
+            if buscar_conversa(conversa_url) is not None:
+                carregar_conversa(conversa_url)
+        except Exception as e:
+            st.warning(f"Não foi possível carregar histórico do banco: {e}")
+
+def carregar_conversas(before=None):
+    linhas = listar_conversas(st.session_state.usuario, limit=UI_CONFIG["max_chat_history"], before=before)
+    st.session_state.cursor_conversas = cursor_conversa(linhas[-1]) if len(linhas) == UI_CONFIG["max_chat_history"] else None
+    return [{"id": c.id, "titulo": c.titulo, "total_mensagens": c.total_mensagens} for c in linhas]
+
+# Lista de conversas do usuário: lida uma vez por sessão e mantida localmente
+if "conversas" not in st.session_state:
     try:
-        historico_db = buscar_historico(user_id="default", limit=20)
-        # Monta o formato esperado para o chat
-        st.session_state.historico = [
-            {
-                "pergunta": h.pergunta,
-                "resposta": h.resposta,
-                "citacoes": [],
-                "acao": "",
-                "timestamp": h.created_at.isoformat() if hasattr(h.created_at, 'isoformat') else str(h.created_at)
-            }
-            for h in reversed(historico_db)
-        ]
+        st.session_state.conversas = carregar_conversas()
     except Exception as e:
-        st.session_state.historico = []
-        st.warning(f"Não foi possível carregar histórico do banco: {e}")
+        st.session_state.conversas = []
+        st.session_state.cursor_conversas = None
+        st.warning(f"Não foi possível carregar conversas do banco: {e}")
 
 if "mensagem" not in st.session_state:
     st.session_state.mensagem = ""
 
-if "chats_salvos" not in st.session_state:
-    st.session_state.chats_salvos = []
-
-if "chat_atual_id" not in st.session_state:
-    st.session_state.chat_atual_id = 0
+if "pergunta_pendente" not in st.session_state:
+    st.session_state.pergunta_pendente = None
 
 def enviar_mensagem():
+    # A resposta é gerada (em streaming) na área do chat; aqui apenas enfileira a pergunta
     if st.session_state.mensagem.strip():
-        try:
-            resposta_final = processar_pergunta(st.session_state.mensagem, st.session_state.historico)
-            resposta_sanitizada = sanitize_text(resposta_final.get("resposta", ""))
-            citacoes_sanitizadas = []
-            for cit in resposta_final.get("citacoes", []):
-                cit_sanitizada = {
-                    "documento": sanitize_text(cit.get("documento", "")),
-                    "pagina": cit.get("pagina", 1),
-                    "trecho": sanitize_text(cit.get("trecho", ""))[:300],
-                    "relevancia": sanitize_text(cit.get("relevancia", "Fonte"))
-                }
-                citacoes_sanitizadas.append(cit_sanitizada)
-            st.session_state.historico.append({
-                "pergunta": sanitize_text(st.session_state.mensagem),
-                "resposta": resposta_sanitizada,
-                "citacoes": citacoes_sanitizadas,
-                "acao": resposta_final.get("acao_final", ""),
-                "timestamp": resposta_final.get("timestamp", datetime.now().isoformat())
-            })
-            # Salva no banco (user_id pode ser customizado, aqui é 'default')
-            try:
-                salvar_chat(
-                    user_id="default",
-                    pergunta=sanitize_text(st.session_state.mensagem),
-                    resposta=resposta_sanitizada
-                )
-            except Exception as e:
-                st.warning(f"Não foi possível salvar no banco: {e}")
-            st.session_state.mensagem = ""
-        except UnicodeEncodeError as e:
-            st.session_state.historico.append({
-                "pergunta": st.session_state.mensagem,
-                "resposta": f"Erro de codificacao: {str(e)}. Resposta contem caracteres especiais nao suportados.",
-                "citacoes": [],
-                "acao": "ERRO",
-                "timestamp": datetime.now().isoformat()
-            })
-            st.session_state.mensagem = ""
-        except Exception as e:
-            st.session_state.historico.append({
-                "pergunta": st.session_state.mensagem,
-                "resposta": f"Erro ao processar sua pergunta: {type(e).__name__}: {str(e)}",
-                "citacoes": [],
-                "acao": "ERRO",
-                "timestamp": datetime.now().isoformat()
-            })
-            st.session_state.mensagem = ""
+        st.session_state.pergunta_pendente = st.session_state.mensagem
+        st.session_state.mensagem = ""
+
+def registrar_resposta(pergunta, resposta_final):
+    resposta_sanitizada = sanitize_text(resposta_final.get("resposta", ""))
+    citacoes_sanitizadas = []
+    for cit in resposta_final.get("citacoes", []):
+        cit_sanitizada = {
+            "documento": sanitize_text(cit.get("documento", "")),
+            "pagina": cit.get("pagina", 1),
+            "trecho": sanitize_text(cit.get("trecho", ""))[:300],
+            "relevancia": sanitize_text(cit.get("relevancia", "Fonte"))
+        }
+        citacoes_sanitizadas.append(cit_sanitizada)
+    item = {
+        "id": uuid.uuid4().hex,  # Chave local do turno; o id do banco só existe após a gravação
+        "pergunta": sanitize_text(pergunta),
+        "resposta": resposta_sanitizada,
+        "citacoes": citacoes_sanitizadas,
+        "acao": resposta_final.get("acao_final", ""),
+        "timestamp": resposta_final.get("timestamp", datetime.now().isoformat())
+    }
+    st.session_state.historico.append(item)
+    # Salva no banco em segundo plano; a conversa é criada na primeira mensagem
+    try:
+        if st.session_state.conversa_id is None:
+            titulo = item["pergunta"][:50] + "..." if len(item["pergunta"]) > 50 else item["pergunta"]
+            st.session_state.conversa_id = nova_conversa_id()
+            salvar_conversa_async(st.session_state.conversa_id, st.session_state.usuario, titulo)
+            st.session_state.conversas.insert(0, {"id": st.session_state.conversa_id, "titulo": titulo, "total_mensagens": 0})
+            st.query_params["conversa"] = st.session_state.conversa_id
+        salvar_mensagem_async(st.session_state.conversa_id, item["pergunta"], item["resposta"],
+                              item["citacoes"], item["acao"])
+        conversa = next((c for c in st.session_state.conversas if c["id"] == st.session_state.conversa_id), None)
+        if conversa is not None:  # Conversa compartilhada de outro usuário não aparece na lista
+            conversa["total_mensagens"] += 1
+    except Exception as e:
+        st.warning(f"Não foi possível salvar no banco: {e}")
+
+def registrar_erro(pergunta, resposta):
+    st.session_state.historico.append({
+        "id": uuid.uuid4().hex,
+        "pergunta": pergunta,
+        "resposta": resposta,
+        "citacoes": [],
+        "acao": "ERRO",
+        "timestamp": datetime.now().isoformat()
+    })
+
+def html_mensagem_usuario(pergunta):
+    return f"""
+            <div class="chat-message user-message">
+                <div>
+                    <strong>Voce:</strong><br>
+                    {pergunta}
+                </div>
+            </div>
+            """
+
+def html_mensagem_assistente(icone_acao, resposta):
+    return f"""
+            <div class="chat-message assistant-message">
+                <div>
+                    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px;">
+                        <strong>{icone_acao} Assistente</strong>
+                    </div>
+                    {resposta}
+                </div>
+            </div>
+            """
+
+def fragmento_turno(item):
+    """
+    HTML do turno (pergunta + resposta) e markdown das citações, gerados uma
+    vez por mensagem e reaproveitados nos reruns seguintes
+    """
+    cache = st.session_state.html_turnos
+    fragmento = cache.get(item["id"])
+    if fragmento is None:
+        # Ícone baseado na ação - usando texto simples para evitar problemas de codificação
+        icone_acao = {
+            'AUTO_RESOLVER': '[OK]',
+            'PEDIR_INFO': '[?]',
+            'ERRO': '[ERRO]'
+        }.get(item.get('acao', 'N/A'), '[BOT]')
+        html = (html_mensagem_usuario(item['pergunta'])
+                + html_mensagem_assistente(icone_acao, item['resposta']))
+        citacoes = "\n".join(
+            f"**{cit.get('relevancia', f'Fonte {j+1}')}** | **{cit['documento']}** | **Pagina {cit['pagina']}**\n\n> {cit['trecho']}\n"
+            for j, cit in enumerate(item["citacoes"])
+        )
+        fragmento = cache[item["id"]] = (html, citacoes)
+    return fragmento
+
+def podar_html_turnos(visiveis):
+    """Mantém no cache só o HTML da janela exibida (turnos que saíram dela são descartados)"""
+    cache = st.session_state.html_turnos
+    ids = {item["id"] for item in visiveis}
+    for chave in [c for c in cache if c not in ids]:
+        del cache[chave]
+
+def responder_pergunta_pendente():
+    """Gera a resposta da pergunta pendente exibindo os tokens conforme chegam"""
+    pergunta = st.session_state.pergunta_pendente
+    st.session_state.pergunta_pendente = None
+    st.markdown(html_mensagem_usuario(sanitize_text(pergunta)), unsafe_allow_html=True)
+    area_resposta = st.empty()
+    texto_parcial = ""
+    try:
+        for evento in processar_pergunta_stream(pergunta, st.session_state.historico):
+            if evento["tipo"] == "token":
+                texto_parcial += evento["texto"]
+                area_resposta.markdown(html_mensagem_assistente("[...]", sanitize_text(texto_parcial)), unsafe_allow_html=True)
+            else:
+                registrar_resposta(pergunta, evento["resultado"])
+    except UnicodeEncodeError as e:
+        registrar_erro(pergunta, f"Erro de codificacao: {str(e)}. Resposta contem caracteres especiais nao suportados.")
+    except Exception as e:
+        registrar_erro(pergunta, f"Erro ao processar sua pergunta: {type(e).__name__}: {str(e)}")
 
 def novo_chat():
-    # Salvar chat atual se houver mensagens
-    if st.session_state.historico:
-        primeiro_pergunta = st.session_state.historico[0]["pergunta"][:50] + "..." if len(st.session_state.historico[0]["pergunta"]) > 50 else st.session_state.historico[0]["pergunta"]
-        st.session_state.chats_salvos.append({
-            "id": len(st.session_state.chats_salvos),
-            "titulo": primeiro_pergunta,
-            "historico": st.session_state.historico.copy()
-        })
-    
-    # Limpar chat atual
-    st.session_state.historico = []
+    # A conversa atual já está no banco; basta começar outra
+    iniciar_sem_conversa()
     st.session_state.mensagem = ""
-    st.session_state.chat_atual_id = len(st.session_state.chats_salvos)
+    if "conversa" in st.query_params:
+        del st.query_params["conversa"]
 
-def carregar_chat(chat_id):
-    chat_selecionado = next((chat for chat in st.session_state.chats_salvos if chat["id"] == chat_id), None)
-    if chat_selecionado:
-        st.session_state.historico = chat_selecionado["historico"].copy()
-        st.session_state.chat_atual_id = chat_id
-        st.session_state.mensagem = ""  # Limpar mensagem atual
-        return True
-    return False
+def carregar_chat(conversation_id):
+    try:
+        carregar_conversa(conversation_id)
+    except Exception as e:
+        st.warning(f"Não foi possível carregar a conversa: {e}")
+        return False
+    st.session_state.mensagem = ""  # Limpar mensagem atual
+    st.query_params["conversa"] = conversation_id
+    return True
 
 # SIDEBAR - Histórico de Chats
 with st.sidebar:
@@ -287,28 +410,33 @@ with st.sidebar:
     
     st.markdown("### Historico de Chats")
     
-    # Mostrar chat atual se há conversas ativas
-    if st.session_state.historico and st.session_state.chat_atual_id not in [chat["id"] for chat in st.session_state.chats_salvos]:
+    # Mostrar chat atual se ainda não foi salvo (só houve erros)
+    if st.session_state.historico and st.session_state.conversa_id is None:
         st.markdown("**Chat Atual** (nao salvo)")
         st.markdown(f"*{len(st.session_state.historico)} mensagem(s)*")
         st.markdown("---")
     
-    # Mostrar chats salvos
-    if st.session_state.chats_salvos:
-        for chat in reversed(st.session_state.chats_salvos):
+    # Mostrar conversas salvas
+    if st.session_state.conversas:
+        for chat in st.session_state.conversas:
             # Destacar o chat atual
-            if st.session_state.chat_atual_id == chat["id"]:
+            if st.session_state.conversa_id == chat["id"]:
                 button_label = f">> {chat['titulo']}"
                 button_help = "Chat atual"
             else:
                 button_label = f"- {chat['titulo']}"
-                button_help = f"Clique para carregar este chat ({len(chat['historico'])} mensagens)"
+                button_help = f"Clique para carregar este chat ({chat['total_mensagens']} mensagens)"
             
             if st.button(button_label, key=f"chat_{chat['id']}", use_container_width=True, help=button_help):
                 carregar_chat(chat["id"])
         
+        if st.session_state.cursor_conversas:
+            if st.button("Carregar mais conversas", use_container_width=True):
+                st.session_state.conversas += carregar_conversas(before=st.session_state.cursor_conversas)
+                st.rerun()
+        
         st.markdown("---")
-        st.markdown(f"*Total: {len(st.session_state.chats_salvos)} chat(s) salvos*")
+        st.markdown(f"*Total: {len(st.session_state.conversas)} chat(s) salvos*")
     else:
         if not st.session_state.historico:
             st.markdown("*Nenhum chat iniciado*")
@@ -340,7 +468,7 @@ with col4:
         pass
 
 # Área do chat
-if st.session_state.historico:
+if st.session_state.historico or st.session_state.pergunta_pendente:
     st.markdown("---")
     st.markdown("### Conversa")
     
@@ -348,51 +476,30 @@ if st.session_state.historico:
     chat_container = st.container()
     
     with chat_container:
-        for i, item in enumerate(st.session_state.historico):
-            # Mensagem do usuário
-            st.markdown(f"""
-            <div class="chat-message user-message">
-                <div>
-                    <strong>Voce:</strong><br>
-                    {item['pergunta']}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Obter dados do item
-            acao = item.get('acao', 'N/A')
-         
-            # Ícone baseado na ação - usando texto simples para evitar problemas de codificação
-            icone_acao = {
-                'AUTO_RESOLVER': '[OK]',
-                'PEDIR_INFO': '[?]',
-                'ERRO': '[ERRO]'
-            }.get(acao, '[BOT]')
-            
-            # Mensagem do assistente
-            st.markdown(f"""
-            <div class="chat-message assistant-message">
-                <div>
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px;">
-                        <strong>{icone_acao} Assistente</strong>
-                    </div>
-                    {item['resposta']}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        # Só os últimos turnos são renderizados; os anteriores (na memória ou no banco) sob demanda
+        inicio = max(0, len(st.session_state.historico) - st.session_state.turnos_visiveis)
+        if inicio > 0 or st.session_state.antes_id is not None:
+            if st.button("Carregar mensagens anteriores", use_container_width=True):
+                mostrar_turnos_anteriores()
+                st.rerun()
+        
+        visiveis = st.session_state.historico[inicio:]
+        podar_html_turnos(visiveis)
+        for item in visiveis:
+            html, citacoes = fragmento_turno(item)
+            st.markdown(html, unsafe_allow_html=True)
             
             # Citações (se houver)
-            if item["citacoes"]:
+            if citacoes:
                 with st.expander(f"Ver Citacoes ({len(item['citacoes'])})", expanded=False):
-                    for j, cit in enumerate(item["citacoes"]):
-                        relevancia = cit.get('relevancia', f'Fonte {j+1}')
-                        st.markdown(f"""
-                        **{relevancia}** | **{cit['documento']}** | **Pagina {cit['pagina']}**
-                        
-                        > {cit['trecho']}
-                        """)
+                    st.markdown(citacoes)
             
             st.markdown("<br>", unsafe_allow_html=True)
+        
+        # Pergunta recém-enviada: responde em streaming e recarrega com o histórico completo
+        if st.session_state.pergunta_pendente:
+            responder_pergunta_pendente()
+            st.rerun()
 else:
     # Tela inicial quando não há mensagens
     st.markdown("""
@@ -6,9 +6,13 @@ Implementa processamento em lotes otimizado para milhares de documentos
 import asyncio
 import time
 import logging
-from typing import List, Dict, Any, Optional, Callable
+import fnmatch
+import itertools
+from collections import deque
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, AsyncIterator, Tuple, Union
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import datetime
 import json
@@ -17,8 +21,20 @@ from threading import Lock
 import queue
 import threading
 
-from main import processar_pergunta, get_llm, retriever
-from langchain_core.messages import HumanMessage
+from concorrencia_adaptativa import (
+    ControladorConcorrencia, SINAL_SUCESSO, classificar_erro, erro_transitorio, calcular_backoff
+)
+from escritor_resultados import gravar_jsonl, caminho_resumo
+from estagios_cpu import ler_e_preparar, preparar_texto
+from divisor_texto import dividir_em_chunks
+from checkpoint_lote import DiarioCheckpoint, chave_item
+from metricas import metricas
+from rate_limiter import LimitadorEndpoint
+from cache_resultados import CacheResultados, chave_resultado
+from config import BATCH_CONFIG, GENERATION_CONFIG, MODEL_CONFIG
+# O main (LLM, índice FAISS, caches) é importado só dentro dos métodos que o usam:
+# no cpu_mode="processes" os filhos (spawn) reimportam o __main__ do pai, e com
+# uma importação no topo cada processo CPU carregaria tudo isso ao rodar como script
 
 # Configuração de logging específica para batch processing
 batch_logger = logging.getLogger("batch_processor")
@@ -50,29 +66,67 @@ class BatchProcessor:
     def __init__(self, 
                  batch_size: int = 50,
                  max_workers: int = 4,
-                 rate_limit: float = 1.0,  # Requisições por segundo
-                 enable_caching: bool = True):
+                 rate_limit: Optional[float] = None,  # Itens por segundo deste processador (None = sem limite extra)
+                 enable_caching: bool = True,
+                 adaptive_concurrency: bool = True,
+                 checkpoint_path: Optional[str] = None,
+                 cache_path: Optional[str] = None,
+                 cpu_mode: str = "threads",
+                 cpu_workers: Optional[int] = None,
+                 preprocess: Optional[Callable[[str], str]] = None):
         """
         Inicializa o processador em lotes
         
         Args:
             batch_size: Tamanho do lote para processamento
             max_workers: Número máximo de threads
-            rate_limit: Limite de requisições por segundo
+            rate_limit: Itens por segundo deste processador, somado ao limite global de
+                        RATE_LIMIT_CONFIG (que não é alterado e continua valendo para o app)
             enable_caching: Habilitar cache de resultados
+            adaptive_concurrency: Ajustar as requisições simultâneas (AIMD) até max_workers
+            checkpoint_path: Diário JSONL de resultados; itens já concluídos nele são pulados
+            cache_path: SQLite do cache de resultados (None = RESULT_CACHE_CONFIG, "" = só memória)
+            cpu_mode: "threads" ou "processes" para os estágios CPU-bound (leitura de PDF,
+                      decodificação, pré-processamento); chamadas à API sempre usam threads
+            cpu_workers: Processos do modo "processes" (None = núcleos da máquina)
+            preprocess: Função de nível de módulo aplicada ao conteúdo no estágio CPU
+                        (ex.: estagios_cpu.normalizar_conteudo)
         """
         self.batch_size = batch_size
         self.max_workers = max_workers
         self.rate_limit = rate_limit
         self.enable_caching = enable_caching
+        if cpu_mode not in ("threads", "processes"):
+            raise ValueError(f"cpu_mode inválido: {cpu_mode} (use 'threads' ou 'processes')")
+        self.cpu_mode = cpu_mode
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.preprocess = preprocess
         
         # Cache e controle de estado
-        self.cache = {} if enable_caching else None
-        self.cache_lock = Lock()
+        self.cache = CacheResultados.padrao(cache_path) if enable_caching else None
+        
+        # Rate limiting: token buckets por endpoint compartilhados com o main,
+        # aplicados em cada chamada real ao LLM/embeddings (acertos de cache não consomem cota).
+        # rate_limit usa um balde próprio: reconfigurar o global mudaria a cota de todos os usuários
+        from main import limitador
+        self.rate_limiter = limitador
+        self.item_limiter = (LimitadorEndpoint("lote", rps=rate_limit, rajada=max(1.0, rate_limit), tpm=0)
+                             if rate_limit is not None else None)
+        
+        # Concorrência adaptativa: vagas em andamento entre 1 e max_workers
+        self.concurrency = ControladorConcorrencia(
+            limite_inicial=min(BATCH_CONFIG["concorrencia_inicial"], max_workers) if adaptive_concurrency else max_workers,
+            limite_minimo=1 if adaptive_concurrency else max_workers,
+            limite_maximo=max_workers,
+            latencia_alvo=BATCH_CONFIG["latencia_alvo_s"]
+        )
+        
+        # Checkpoint: resultados gravados conforme terminam, para retomar após uma queda
+        self.checkpoint = (DiarioCheckpoint(checkpoint_path, fsync=BATCH_CONFIG["checkpoint_fsync"])
+                           if checkpoint_path else None)
         
-        # Controle de rate limiting
-        self.last_request_time = 0
-        self.rate_lock = Lock()
+        # Itens que falharam definitivamente (erro permanente ou retentativas esgotadas)
+        self.dead_letter: List[Dict[str, Any]] = []
         
         # Estatísticas
         self.stats = {
@@ -80,36 +134,20 @@ class BatchProcessor:
             'successful': 0,
             'failed': 0,
             'cache_hits': 0,
+            'retries': 0,
+            'resumed': 0,
             'total_time': 0.0,
             'start_time': None
         }
-        
-        # Fila de processamento
-        self.processing_queue = queue.Queue()
-        self.results_queue = queue.Queue()
+        self.stats_lock = Lock()
         
         batch_logger.info(f"BatchProcessor inicializado: batch_size={batch_size}, workers={max_workers}")
 
-    def _apply_rate_limit(self):
-        """Aplica rate limiting para evitar sobrecarga da API"""
-        if self.rate_limit <= 0:
-            return
-            
-        with self.rate_lock:
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            min_interval = 1.0 / self.rate_limit
-            
-            if time_since_last < min_interval:
-                sleep_time = min_interval - time_since_last
-                time.sleep(sleep_time)
-            
-            self.last_request_time = time.time()
-
     def _get_cache_key(self, content: str) -> str:
-        """Gera chave única para cache baseada no conteúdo"""
-        import hashlib
-        return hashlib.md5(content.encode()).hexdigest()
+        """Chave do cache: conteúdo + versão do índice, dos prompts e modelo"""
+        from main import versao_indice_atual
+        return chave_resultado(content, versao_indice_atual(), GENERATION_CONFIG["versao_prompt"],
+                               MODEL_CONFIG["triagem_model"])
 
     def _check_cache(self, content: str) -> Optional[Any]:
         """Verifica se resultado está em cache"""
@@ -117,138 +155,339 @@ class BatchProcessor:
             return None
             
         cache_key = self._get_cache_key(content)
-        with self.cache_lock:
-            if cache_key in self.cache:
+        with metricas.medir("cache_lote"):
+            result = self.cache.get(cache_key)
+        if result is not None:
+            metricas.incrementar("lote_cache_hits")
+            with self.stats_lock:
                 self.stats['cache_hits'] += 1
-                batch_logger.debug(f"Cache hit para item: {cache_key[:8]}...")
-                return self.cache[cache_key]
-        return None
+            batch_logger.debug(f"Cache hit para item: {cache_key[:8]}...")
+        return result
 
     def _store_cache(self, content: str, result: Any):
         """Armazena resultado no cache"""
         if not self.enable_caching:
             return
-            
-        cache_key = self._get_cache_key(content)
-        with self.cache_lock:
-            self.cache[cache_key] = result
+        self.cache.set(self._get_cache_key(content), result)
 
-    def _process_single_item(self, item: BatchItem) -> BatchResult:
-        """Processa um único item"""
-        start_time = time.time()
-        
+    def _cached_result(self, item: BatchItem, start_time: float) -> Optional[BatchResult]:
+        """Resultado imediato se o conteúdo já foi processado"""
+        cached_result = self._check_cache(item.content)
+        if cached_result is None:
+            return None
+        return BatchResult(
+            item_id=item.id,
+            success=True,
+            result=cached_result,
+            processing_time=time.time() - start_time,
+            timestamp=datetime.now().isoformat()
+        )
+
+    def _attempt_item(self, item: BatchItem, start_time: float) -> Tuple[Optional[BatchResult], float]:
+        """
+        Executa uma tentativa do item
+        Retorna (resultado final, 0) ou (None, espera em segundos) quando a
+        falha é transitória e ainda há retentativas
+        """
+        import main
+        if self.item_limiter is not None:
+            metricas.observar("espera_cota_lote", self.item_limiter.adquirir())
+        # Aguarda vaga no limite adaptativo (itens de maior prioridade primeiro)
+        with metricas.medir("espera_vaga"):
+            self.concurrency.adquirir(item.priority)
+        inicio_chamada = time.monotonic()
+        result, erro = None, None
         try:
-            # Verificar cache primeiro
-            cached_result = self._check_cache(item.content)
-            if cached_result is not None:
-                return BatchResult(
-                    item_id=item.id,
-                    success=True,
-                    result=cached_result,
-                    processing_time=time.time() - start_time,
-                    timestamp=datetime.now().isoformat()
-                )
-            
-            # Aplicar rate limiting
-            self._apply_rate_limit()
-            
-            # Processar item usando o sistema principal
-            result = processar_pergunta(item.content)
-            
+            # Processar item usando o sistema principal (rate limiting por chamada à API)
+            result = main.processar_pergunta(item.content)
+            if isinstance(result, dict) and result.get("erro"):
+                erro = result["erro"]  # processar_pergunta devolve erros em vez de lançar
+        except Exception as e:
+            erro = e
+        sinal = SINAL_SUCESSO if erro is None else classificar_erro(erro)
+        self.concurrency.liberar(sinal, time.monotonic() - inicio_chamada)
+        
+        if erro is None:
             # Armazenar no cache
             self._store_cache(item.content, result)
-            
             return BatchResult(
                 item_id=item.id,
                 success=True,
                 result=result,
                 processing_time=time.time() - start_time,
                 timestamp=datetime.now().isoformat()
-            )
-            
-        except Exception as e:
-            batch_logger.error(f"Erro ao processar item {item.id}: {str(e)}")
-            return BatchResult(
-                item_id=item.id,
-                success=False,
-                result=None,
-                error=str(e),
-                processing_time=time.time() - start_time,
-                timestamp=datetime.now().isoformat()
-            )
+            ), 0.0
+        
+        if erro_transitorio(sinal) and item.retry_count < item.max_retries:
+            espera = calcular_backoff(item.retry_count, BATCH_CONFIG["backoff_base_s"],
+                                      BATCH_CONFIG["backoff_max_s"], item.priority)
+            item.retry_count += 1
+            metricas.incrementar("lote_retentativas")
+            with self.stats_lock:
+                self.stats['retries'] += 1
+            batch_logger.warning(f"Item {item.id}: falha {sinal} ({erro}), tentativa "
+                                 f"{item.retry_count}/{item.max_retries} em {espera:.1f}s")
+            return None, espera
+        
+        batch_logger.error(f"Erro ao processar item {item.id}: {str(erro)}")
+        failed = BatchResult(
+            item_id=item.id,
+            success=False,
+            result=result,
+            error=str(erro),
+            processing_time=time.time() - start_time,
+            timestamp=datetime.now().isoformat()
+        )
+        with self.stats_lock:
+            self.dead_letter.append({
+                'item_id': item.id,
+                'content': item.content,
+                'metadata': item.metadata,
+                'priority': item.priority,
+                'attempts': item.retry_count + 1,
+                'error_kind': sinal,
+                'error': str(erro),
+                'timestamp': failed.timestamp
+            })
+        return failed, 0.0
 
-    def _process_batch_worker(self, batch: List[BatchItem]) -> List[BatchResult]:
-        """Worker que processa um lote de itens"""
-        results = []
-        
-        for item in batch:
-            result = self._process_single_item(item)
-            results.append(result)
-            
-            # Atualizar estatísticas
+    @staticmethod
+    def _result_to_dict(r: BatchResult) -> Dict[str, Any]:
+        return {
+            'item_id': r.item_id,
+            'success': r.success,
+            'result': r.result,
+            'error': r.error,
+            'processing_time': r.processing_time,
+            'timestamp': r.timestamp
+        }
+
+    def _record_result(self, result: BatchResult, item: Optional[BatchItem] = None):
+        """Atualiza as estatísticas com um resultado final e o grava no checkpoint"""
+        if self.checkpoint is not None and item is not None:
+            self.checkpoint.registrar(chave_item(item.id, item.content), self._result_to_dict(result))
+        metricas.observar("item", result.processing_time)
+        metricas.incrementar("lote_sucessos" if result.success else "lote_falhas")
+        with self.stats_lock:
             self.stats['total_processed'] += 1
             if result.success:
                 self.stats['successful'] += 1
             else:
                 self.stats['failed'] += 1
-                
-            batch_logger.debug(f"Processado item {item.id}: {'✓' if result.success else '✗'}")
+        batch_logger.debug(f"Processado item {result.item_id}: {'✓' if result.success else '✗'}")
+
+    def iter_results(self, items: Iterable[BatchItem]) -> Iterator[BatchResult]:
+        """
+        Processa os itens com uma fila de prioridade e devolve os resultados
+        na ordem em que terminam
+        
+        Cada worker puxa um item por vez (maior prioridade primeiro, FIFO no
+        empate), então um item lento não atrasa os demais. Retentativas voltam
+        para a fila após o backoff sem ocupar um worker durante a espera.
+        Com checkpoint, itens já concluídos com sucesso são pulados (não são devolvidos).
+        
+        Listas entram inteiras na fila; geradores são consumidos sob demanda,
+        com no máximo BATCH_CONFIG["itens_em_voo"] itens entre leitura e consumo.
+        """
+        self.stats['start_time'] = datetime.now()
+        fila: queue.PriorityQueue = queue.PriorityQueue()
+        resultados: queue.Queue = queue.Queue()
+        ordem = itertools.count()
+        parar = threading.Event()
+        em_voo = (None if isinstance(items, (list, tuple))
+                  else threading.BoundedSemaphore(BATCH_CONFIG["itens_em_voo"]))
+        fim_entrada = object()
+        
+        def enfileirar(item: BatchItem, start_time: float):
+            if not parar.is_set():
+                fila.put((-item.priority, next(ordem), item, start_time))
+        
+        def alimentar():
+            """Lê os itens (lazy para geradores) e informa o total ao final"""
+            enviados, retomados = 0, 0
+            try:
+                for item in items:
+                    if self.checkpoint is not None and self.checkpoint.concluido(chave_item(item.id, item.content)):
+                        retomados += 1
+                        continue
+                    if em_voo is not None:
+                        while not em_voo.acquire(timeout=0.5):  # back-pressure
+                            if parar.is_set():
+                                return
+                    if parar.is_set():
+                        return
+                    enfileirar(item, time.time())
+                    enviados += 1
+            except Exception as e:
+                batch_logger.error(f"Erro ao ler itens de entrada: {str(e)}")
+            finally:
+                if retomados:
+                    with self.stats_lock:
+                        self.stats['resumed'] += retomados
+                    batch_logger.info(f"Checkpoint: {retomados} itens já concluídos foram pulados")
+                resultados.put((fim_entrada, enviados))
+        
+        ativos = [self.max_workers]
+        ativos_lock = Lock()
+        
+        def worker():
+            try:
+                processar_fila()
+            finally:
+                # O último worker a sair libera o checkpoint (também quando o consumidor desiste)
+                with ativos_lock:
+                    ativos[0] -= 1
+                    ultimo = ativos[0] == 0
+                if ultimo and self.checkpoint is not None:
+                    self.checkpoint.fechar()
+        
+        def processar_fila():
+            while True:
+                _, _, item, start_time = fila.get()
+                if item is None or parar.is_set():
+                    return
+                try:
+                    result = self._cached_result(item, start_time)
+                    espera = 0.0
+                    if result is None:
+                        result, espera = self._attempt_item(item, start_time)
+                except Exception as e:
+                    batch_logger.error(f"Erro inesperado no item {item.id}: {str(e)}")
+                    result = BatchResult(item_id=item.id, success=False, result=None, error=str(e),
+                                         processing_time=time.time() - start_time,
+                                         timestamp=datetime.now().isoformat())
+                if result is None:
+                    timer = threading.Timer(espera, enfileirar, args=(item, start_time))
+                    timer.daemon = True
+                    timer.start()
+                    continue
+                try:
+                    self._record_result(result, item)
+                except Exception as e:
+                    batch_logger.error(f"Erro ao gravar checkpoint do item {item.id}: {str(e)}")
+                resultados.put(result)
+        
+        alimentador = threading.Thread(target=alimentar, daemon=True, name="batch_feeder")
+        alimentador.start()
+        workers = [threading.Thread(target=worker, daemon=True, name=f"batch_worker_{i}")
+                   for i in range(self.max_workers)]
+        for w in workers:
+            w.start()
         
-        return results
+        try:
+            total, n = None, 0
+            while total is None or n < total:
+                result = resultados.get()
+                if isinstance(result, tuple) and result[0] is fim_entrada:
+                    total = result[1]
+                    continue
+                n += 1
+                if em_voo is not None:
+                    em_voo.release()
+                yield result
+                if n % self.batch_size == 0 or n == total:
+                    batch_logger.info(f"Progresso: {n}/{total if total is not None else '?'} itens concluídos")
+        finally:
+            # Consumidor terminou ou desistiu: sentinelas (prioridade mínima) encerram os workers
+            parar.set()
+            for _ in workers:
+                fila.put((float("inf"), next(ordem), None, 0.0))
+            if self.checkpoint is not None and total is not None and n >= total:
+                self.checkpoint.fechar()  # Tudo já foi gravado: fecha sem esperar os workers
+            self.stats['total_time'] = (datetime.now() - self.stats['start_time']).total_seconds()
 
-    def process_large_document(self, 
-                             document_path: str, 
-                             chunk_size: int = 1000,
-                             processing_function: Optional[Callable] = None) -> Dict[str, Any]:
+    async def aiter_results(self, items: Iterable[BatchItem]) -> AsyncIterator[BatchResult]:
+        """Versão assíncrona de iter_results (async generator em ordem de conclusão)"""
+        iterador = self.iter_results(items)
+        fim = object()
+        try:
+            while True:
+                result = await asyncio.to_thread(next, iterador, fim)
+                if result is fim:
+                    return
+                yield result
+        finally:
+            iterador.close()
+
+    def iter_large_document(self,
+                            document_path: str,
+                            chunk_size: int = 1000,
+                            chunk_overlap: Optional[int] = None,
+                            progress: Optional[Dict[str, int]] = None) -> Iterator[BatchResult]:
         """
-        Processa um documento grande dividindo em chunks
+        Processa um documento grande em streaming: o arquivo é lido em blocos,
+        dividido em fronteiras de parágrafo/frase e cada chunk vai para a fila
+        assim que é lido, então os primeiros resultados saem logo
         
         Args:
             document_path: Caminho para o documento
-            chunk_size: Tamanho de cada chunk em caracteres
-            processing_function: Função customizada de processamento
+            chunk_size: Tamanho máximo de cada chunk em caracteres
+            chunk_overlap: Sobreposição entre chunks (None = BATCH_CONFIG)
+            progress: Dicionário preenchido com 'chunks' e 'characters' lidos
         """
-        
-        batch_logger.info(f"Iniciando processamento de documento grande: {document_path}")
-        
-        # Ler documento
         document_path = Path(document_path)
         if not document_path.exists():
             raise FileNotFoundError(f"Documento não encontrado: {document_path}")
+        overlap = BATCH_CONFIG["sobreposicao_chunk"] if chunk_overlap is None else chunk_overlap
+        overlap = min(overlap, chunk_size // 2)
+        progress = progress if progress is not None else {}
+        progress.update(chunks=0, characters=0)
+        
+        def gerar_chunks() -> Iterator[Tuple[str, int, int]]:
+            chunks = dividir_em_chunks(document_path, chunk_size, overlap)
+            if self.preprocess is None:
+                yield from chunks
+                return
+            # Pré-processamento dos chunks no executor CPU, em ordem e com janela limitada
+            with self._cpu_executor() as executor:
+                tasks = (((inicio, fim), (texto, self.preprocess)) for texto, inicio, fim in chunks)
+                for (inicio, fim), futuro in self._map_ordered(executor, preparar_texto, tasks,
+                                                               self._cpu_window()):
+                    yield futuro.result(), inicio, fim
+        
+        def gerar_itens() -> Iterator[BatchItem]:
+            for numero, (chunk_text, inicio, fim) in enumerate(gerar_chunks(), start=1):
+                progress['chunks'] = numero
+                progress['characters'] = fim
+                yield BatchItem(
+                    id=f"chunk_{numero}",
+                    content=chunk_text,
+                    metadata={
+                        'source_file': str(document_path),
+                        'chunk_start': inicio,
+                        'chunk_end': fim,
+                        'chunk_number': numero
+                    }
+                )
         
-        with open(document_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        batch_logger.info(f"Iniciando processamento de documento grande: {document_path} "
+                          f"(chunks de até {chunk_size} caracteres, sobreposição {overlap})")
+        return self.iter_results(gerar_itens())
+
+    def process_large_document(self, 
+                             document_path: str, 
+                             chunk_size: int = 1000,
+                             processing_function: Optional[Callable] = None,
+                             chunk_overlap: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Processa um documento grande dividindo em chunks
         
-        # Dividir em chunks
-        chunks = []
-        total_chars = len(content)
+        Args:
+            document_path: Caminho para o documento
+            chunk_size: Tamanho máximo de cada chunk em caracteres
+            processing_function: Função customizada de processamento
+            chunk_overlap: Sobreposição entre chunks (None = BATCH_CONFIG)
+        """
+        progress: Dict[str, int] = {}
+        results = list(self.iter_large_document(document_path, chunk_size, chunk_overlap, progress))
         
-        for i in range(0, total_chars, chunk_size):
-            chunk_text = content[i:i + chunk_size]
-            chunk_id = f"chunk_{i//chunk_size + 1}"
-            
-            chunks.append(BatchItem(
-                id=chunk_id,
-                content=chunk_text,
-                metadata={
-                    'source_file': str(document_path),
-                    'chunk_start': i,
-                    'chunk_end': min(i + chunk_size, total_chars),
-                    'chunk_number': i//chunk_size + 1,
-                    'total_chunks': (total_chars + chunk_size - 1) // chunk_size
-                }
-            ))
-        
-        batch_logger.info(f"Documento dividido em {len(chunks)} chunks de ~{chunk_size} caracteres")
-        
-        # Processar chunks em lotes
-        results = self.process_batch(chunks, processing_function)
+        batch_logger.info(f"Documento dividido em {progress['chunks']} chunks de até {chunk_size} caracteres")
         
         # Compilar resultado final
         return {
             'document_path': str(document_path),
-            'total_chunks': len(chunks),
-            'total_characters': total_chars,
+            'total_chunks': progress['chunks'],
+            'total_characters': progress['characters'],
             'chunk_size': chunk_size,
             'results': results,
             'summary': self.get_processing_summary()
@@ -258,106 +497,155 @@ class BatchProcessor:
                      items: List[BatchItem], 
                      processing_function: Optional[Callable] = None) -> List[BatchResult]:
         """
-        Processa uma lista de itens em lotes
+        Processa uma lista de itens pela fila de prioridade (resultados em ordem de conclusão)
         
         Args:
             items: Lista de itens para processar
             processing_function: Função customizada de processamento
         """
         
-        self.stats['start_time'] = datetime.now()
-        batch_logger.info(f"Iniciando processamento em lotes: {len(items)} itens")
-        
-        # Dividir em lotes
-        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
-        batch_logger.info(f"Criados {len(batches)} lotes de até {self.batch_size} itens")
+        batch_logger.info(f"Iniciando processamento em fila de prioridade: {len(items)} itens, "
+                          f"{self.max_workers} workers")
         
-        all_results = []
+        all_results = list(self.iter_results(items))
         
-        # Processar lotes em paralelo
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submeter todos os lotes
-            future_to_batch = {
-                executor.submit(self._process_batch_worker, batch): i 
-                for i, batch in enumerate(batches)
-            }
-            
-            # Coletar resultados conforme completam
-            for future in as_completed(future_to_batch):
-                batch_num = future_to_batch[future]
-                try:
-                    batch_results = future.result()
-                    all_results.extend(batch_results)
-                    
-                    batch_logger.info(f"Lote {batch_num + 1}/{len(batches)} concluído "
-                                    f"({len(batch_results)} itens)")
-                    
-                except Exception as e:
-                    batch_logger.error(f"Erro no lote {batch_num}: {str(e)}")
-        
-        self.stats['total_time'] = (datetime.now() - self.stats['start_time']).total_seconds()
         batch_logger.info(f"Processamento concluído: {len(all_results)} resultados")
         
         return all_results
 
-    def process_directory(self, 
-                         directory_path: str, 
-                         file_pattern: str = "*.txt",
-                         max_files: Optional[int] = None) -> Dict[str, Any]:
+    @staticmethod
+    def _iter_files(directory: Path, patterns: List[str], recursive: bool) -> Iterator[Path]:
+        """Enumera os arquivos em ordem estável, sem listar o diretório inteiro antes"""
+        for raiz, subdirs, nomes in os.walk(directory):
+            subdirs.sort()
+            if not recursive:
+                subdirs.clear()
+            for nome in sorted(nomes):
+                if any(fnmatch.fnmatch(nome, padrao) for padrao in patterns):
+                    yield Path(raiz) / nome
+
+    def _cpu_executor(self):
+        """Executor dos estágios CPU-bound conforme cpu_mode"""
+        if self.cpu_mode == "processes":
+            # spawn: filhos limpos, sem herdar threads/locks do processo principal; o custo de
+            # iniciar os processos compensa em PDFs grandes e diretórios com muitos arquivos
+            return ProcessPoolExecutor(max_workers=self.cpu_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=BATCH_CONFIG["leitores_arquivo"], thread_name_prefix="batch_reader")
+
+    def _cpu_window(self) -> int:
+        """Tarefas CPU pendentes: o suficiente para manter todos os processos ocupados"""
+        if self.cpu_mode == "processes":
+            return max(BATCH_CONFIG["arquivos_em_leitura"], self.cpu_workers * 2)
+        return BATCH_CONFIG["arquivos_em_leitura"]
+
+    @staticmethod
+    def _map_ordered(executor, func: Callable, tasks: Iterable[Tuple[Any, tuple]],
+                     window: int) -> Iterator[Tuple[Any, Any]]:
         """
-        Processa todos os arquivos de um diretório
+        Submete func(*args) para cada (chave, args) mantendo no máximo `window`
+        tarefas pendentes e devolve (chave, futuro) na ordem de entrada
+        """
+        tasks = iter(tasks)
+        pendentes: deque = deque()
+        while True:
+            while len(pendentes) < window:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                chave, args = task
+                pendentes.append((chave, executor.submit(func, *args)))
+            if not pendentes:
+                return
+            yield pendentes.popleft()
+
+    def iter_directory(self,
+                       directory_path: str,
+                       file_pattern: Union[str, List[str]] = "*.txt",
+                       max_files: Optional[int] = None,
+                       recursive: bool = True,
+                       progress: Optional[Dict[str, int]] = None) -> Iterator[BatchResult]:
+        """
+        Processa os arquivos de um diretório em pipeline: enumeração lazy,
+        leitura/decodificação em um pool de threads e envio à fila conforme
+        cada arquivo fica pronto. No máximo BATCH_CONFIG["arquivos_em_leitura"]
+        arquivos são lidos à frente do processamento.
         
         Args:
             directory_path: Caminho do diretório
-            file_pattern: Padrão de arquivos para processar
+            file_pattern: Padrão ou lista de padrões (ex.: ["*.txt", "*.md", "*.pdf"])
             max_files: Número máximo de arquivos (None = todos)
+            recursive: Incluir subdiretórios
+            progress: Dicionário preenchido com 'files_found' e 'files_processed'
         """
-        
         directory = Path(directory_path)
         if not directory.exists():
             raise FileNotFoundError(f"Diretório não encontrado: {directory}")
+        patterns = [file_pattern] if isinstance(file_pattern, str) else list(file_pattern)
+        progress = progress if progress is not None else {}
+        progress.update(files_found=0, files_processed=0)
+        
+        def tarefas() -> Iterator[Tuple[Path, tuple]]:
+            for file_path in itertools.islice(self._iter_files(directory, patterns, recursive), max_files):
+                progress['files_found'] += 1
+                yield file_path, (file_path, self.preprocess)
+        
+        def gerar_itens() -> Iterator[BatchItem]:
+            # Janela de leitura limitada: só avança quando o consumidor pede
+            with self._cpu_executor() as leitores:
+                for numero, (file_path, futuro) in enumerate(self._map_ordered(
+                        leitores, ler_e_preparar, tarefas(), self._cpu_window()), start=1):
+                    try:
+                        content = futuro.result()
+                    except Exception as e:
+                        batch_logger.error(f"Erro ao ler arquivo {file_path}: {str(e)}")
+                        continue
+                    progress['files_processed'] += 1
+                    yield BatchItem(
+                        id=f"file_{file_path.relative_to(directory).as_posix()}",
+                        content=content,
+                        metadata={
+                            'source_file': str(file_path),
+                            'file_size': file_path.stat().st_size,
+                            'file_number': numero
+                        }
+                    )
+        
+        batch_logger.info(f"Processando diretório {directory} ({', '.join(patterns)}"
+                          f"{', recursivo' if recursive else ''}, leitura em {self.cpu_mode})")
+        return self.iter_results(gerar_itens())
+
+    def process_directory(self, 
+                         directory_path: str, 
+                         file_pattern: Union[str, List[str]] = "*.txt",
+                         max_files: Optional[int] = None,
+                         recursive: bool = True) -> Dict[str, Any]:
+        """
+        Processa todos os arquivos de um diretório
         
-        # Encontrar arquivos
-        files = list(directory.glob(file_pattern))
-        if max_files:
-            files = files[:max_files]
-        
-        batch_logger.info(f"Encontrados {len(files)} arquivos para processar")
-        
-        # Criar itens de lote
-        items = []
-        for i, file_path in enumerate(files):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                items.append(BatchItem(
-                    id=f"file_{i+1}_{file_path.name}",
-                    content=content,
-                    metadata={
-                        'source_file': str(file_path),
-                        'file_size': file_path.stat().st_size,
-                        'file_number': i + 1,
-                        'total_files': len(files)
-                    }
-                ))
-            except Exception as e:
-                batch_logger.error(f"Erro ao ler arquivo {file_path}: {str(e)}")
+        Args:
+            directory_path: Caminho do diretório
+            file_pattern: Padrão ou lista de padrões de arquivos para processar
+            max_files: Número máximo de arquivos (None = todos)
+            recursive: Incluir subdiretórios
+        """
+        progress: Dict[str, int] = {}
+        results = list(self.iter_directory(directory_path, file_pattern, max_files, recursive, progress))
         
-        # Processar arquivos
-        results = self.process_batch(items)
+        batch_logger.info(f"Encontrados {progress['files_found']} arquivos, {progress['files_processed']} lidos")
         
         return {
-            'directory_path': str(directory),
+            'directory_path': str(Path(directory_path)),
             'file_pattern': file_pattern,
-            'files_found': len(files),
-            'files_processed': len(items),
+            'files_found': progress['files_found'],
+            'files_processed': progress['files_processed'],
             'results': results,
             'summary': self.get_processing_summary()
         }
 
     def get_processing_summary(self) -> Dict[str, Any]:
         """Retorna resumo das estatísticas de processamento"""
+        import main
         return {
             'total_processed': self.stats['total_processed'],
             'successful': self.stats['successful'],
@@ -365,34 +653,88 @@ class BatchProcessor:
             'success_rate': (self.stats['successful'] / max(self.stats['total_processed'], 1)) * 100,
             'cache_hits': self.stats['cache_hits'],
             'cache_hit_rate': (self.stats['cache_hits'] / max(self.stats['total_processed'], 1)) * 100,
+            'retries': self.stats['retries'],
+            'resumed': self.stats['resumed'],
+            'checkpoint': self.checkpoint.get_stats() if self.checkpoint is not None else None,
+            'dead_letter': len(self.dead_letter),
+            'concurrency': self.concurrency.get_stats(),
+            'result_cache': self.cache.get_stats() if self.cache is not None else None,
             'total_time': self.stats['total_time'],
             'avg_time_per_item': self.stats['total_time'] / max(self.stats['total_processed'], 1),
-            'items_per_second': self.stats['total_processed'] / max(self.stats['total_time'], 0.001)
+            'items_per_second': self.stats['total_processed'] / max(self.stats['total_time'], 0.001),
+            'latencies': metricas.snapshot()['latencias'],
+            'embedding_cache': main.estatisticas_cache_embeddings(),
+            'response_cache': main.estatisticas_cache_respostas(),
+            'concisao': main.estatisticas_concisao(),
+            'llm_pool': main.pool_llm.get_stats(),
+            'rate_limit': dict(self.rate_limiter.get_stats(),
+                               **({'lote': self.item_limiter.get_stats()} if self.item_limiter is not None else {}))
         }
 
-    def save_results(self, results: List[BatchResult], output_path: str):
-        """Salva resultados em arquivo JSON"""
-        output_data = {
-            'timestamp': datetime.now().isoformat(),
-            'summary': self.get_processing_summary(),
-            'results': [
-                {
-                    'item_id': r.item_id,
-                    'success': r.success,
-                    'result': r.result,
-                    'error': r.error,
-                    'processing_time': r.processing_time,
-                    'timestamp': r.timestamp
-                }
-                for r in results
-            ]
-        }
+    def iter_checkpoint_results(self) -> Iterator[BatchResult]:
+        """Todos os resultados do diário (execuções anteriores e atual), lidos em streaming"""
+        if self.checkpoint is None:
+            return
+        for registro in self.checkpoint.iterar():
+            registro.pop('chave', None)
+            yield BatchResult(**registro)
+
+    def save_results(self, results: Optional[List[BatchResult]], output_path: str):
+        """
+        Salva resultados em arquivo JSON
+        Com results=None o relatório é montado a partir do checkpoint em streaming
+        """
+        if results is None:
+            results = self.iter_checkpoint_results()
         
         with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+            # Escrita incremental: os resultados nunca ficam todos em memória
+            f.write('{\n  "timestamp": ' + json.dumps(datetime.now().isoformat()) + ',\n')
+            f.write('  "summary": ' + json.dumps(self.get_processing_summary(), ensure_ascii=False, default=str) + ',\n')
+            f.write('  "results": [')
+            for n, r in enumerate(results):
+                f.write((',' if n else '') + '\n    ' + json.dumps(self._result_to_dict(r), ensure_ascii=False, default=str))
+            f.write('\n  ]\n}\n')
         
         batch_logger.info(f"Resultados salvos em: {output_path}")
 
+    def save_results_jsonl(self,
+                           results: Optional[Iterable[BatchResult]],
+                           output_path: str,
+                           compression: Optional[str] = None) -> int:
+        """
+        Salva resultados em JSONL (um por linha) em memória constante
+        
+        Args:
+            results: Iterável de resultados (ex.: iter_results(items)); None = checkpoint
+            output_path: Arquivo de saída (.jsonl, .jsonl.gz, .jsonl.zst)
+            compression: None, "gzip" ou "zstd"
+        
+        O resumo vai para o arquivo lateral <nome>.summary.json, gerado ao final
+        """
+        if results is None:
+            results = self.iter_checkpoint_results()
+        total = gravar_jsonl((self._result_to_dict(r) for r in results), output_path, compression,
+                             resumo=lambda: dict(timestamp=datetime.now().isoformat(),
+                                                 summary=self.get_processing_summary()))
+        batch_logger.info(f"Resultados salvos em: {output_path} (resumo em {caminho_resumo(output_path)})")
+        return total
+
+    def export_metrics(self, output_path: str, fmt: str = "json"):
+        """Exporta contadores e latências por estágio (p50/p95/p99) em JSON ou texto Prometheus"""
+        if fmt not in ("json", "prometheus"):
+            raise ValueError(f"Formato inválido: {fmt} (use 'json' ou 'prometheus')")
+        conteudo = metricas.para_json() if fmt == "json" else metricas.para_prometheus()
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+        batch_logger.info(f"Métricas exportadas em: {output_path}")
+
+    def save_dead_letter(self, output_path: str):
+        """Salva os itens que falharam definitivamente para reprocessamento posterior"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(self.dead_letter, f, indent=2, ensure_ascii=False)
+        batch_logger.info(f"{len(self.dead_letter)} itens em dead-letter salvos em: {output_path}")
+
 
 # Exemplo de uso e demonstração
 def demonstrar_batch_processing():
@@ -0,0 +1,121 @@
+"""
+Recuperação híbrida: busca densa (FAISS) + esparsa (BM25) fundidas por
+reciprocal-rank fusion (RRF)
+As duas buscas rodam em paralelo e cada chunk devolvido carrega as
+pontuações de cada fonte em metadata["scores_busca"]
+"""
+
+import math
+import atexit
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Executor compartilhado, criado na primeira busca: FAISS libera o GIL durante a busca
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def executor_busca() -> ThreadPoolExecutor:
+    """Executor das buscas paralelas (encerrado automaticamente ao sair)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="busca_hibrida")
+                atexit.register(_executor.shutdown, wait=False)
+    return _executor
+
+
+def _id_chunk(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or str(hash(doc.page_content))
+
+
+def funcao_relevancia(vectorstore) -> Callable[[float], float]:
+    """
+    Converte a distância do FAISS em relevância 0-1 pelos parâmetros públicos
+    do índice (relevance_score_fn, distance_strategy), como o langchain faz
+    """
+    if vectorstore.override_relevance_score_fn is not None:
+        return vectorstore.override_relevance_score_fn
+    estrategia = getattr(vectorstore.distance_strategy, "value", vectorstore.distance_strategy)
+    if estrategia == "MAX_INNER_PRODUCT":
+        return lambda distancia: 1.0 - distancia if distancia > 0 else -distancia
+    if estrategia == "COSINE":
+        return lambda distancia: 1.0 - distancia
+    return lambda distancia: 1.0 - distancia / math.sqrt(2)  # Euclidiana (padrão)
+
+
+def buscar_denso(vectorstore, vetor: List[float], k: int, score_minimo: float) -> List[Tuple[Document, float]]:
+    """Similaridade no FAISS com pontuação de relevância normalizada (0-1)"""
+    if vectorstore is None or vetor is None:
+        return []
+    relevancia = funcao_relevancia(vectorstore)
+    pares = vectorstore.similarity_search_with_score_by_vector(vetor, k=k)
+    pontuados = ((doc, relevancia(distancia)) for doc, distancia in pares)
+    return [(doc, score) for doc, score in pontuados if score >= score_minimo]
+
+
+def buscar_esparso(indice_lexico, consulta: str, k: int,
+                   termos_extras: Optional[List[str]] = None) -> List[Tuple[Document, float]]:
+    """BM25 sobre os chunks; termos extras entram na consulta sem custo de embedding"""
+    if indice_lexico is None:
+        return []
+    return indice_lexico.buscar(consulta, k=k, termos_extras=termos_extras)
+
+
+def fundir_rrf(resultados: Dict[str, List[Tuple[Document, float]]],
+               k: int,
+               k_rrf: int = 60,
+               pesos: Optional[Dict[str, float]] = None) -> List[Document]:
+    """
+    Funde rankings por RRF ponderado: score = Σ peso / (k_rrf + posição)
+    Empates são desfeitos pelo chunk_id, então a ordem é estável entre execuções
+    """
+    pesos = pesos or {}
+    fundidos: Dict[str, Dict] = {}
+    for fonte, pares in resultados.items():
+        peso = pesos.get(fonte, 1.0)
+        for posicao, (doc, score) in enumerate(pares, start=1):
+            cid = _id_chunk(doc)
+            item = fundidos.setdefault(cid, {"doc": doc, "rrf": 0.0, "scores": {}})
+            item["rrf"] += peso / (k_rrf + posicao)
+            item["scores"][fonte] = round(float(score), 4)
+            item["scores"][f"posicao_{fonte}"] = posicao
+
+    ordenados = sorted(fundidos.items(), key=lambda par: (-par[1]["rrf"], par[0]))[:k]
+    docs = []
+    for _, item in ordenados:
+        # Cópia: os documentos do FAISS são os próprios objetos do docstore
+        metadata = dict(item["doc"].metadata)
+        metadata["scores_busca"] = dict(item["scores"], rrf=round(item["rrf"], 6))
+        docs.append(Document(page_content=item["doc"].page_content, metadata=metadata))
+    return docs
+
+
+def busca_hibrida(vectorstore, indice_lexico, consulta: str, vetor: List[float],
+                  config: Dict, termos_extras: Optional[List[str]] = None) -> List[Document]:
+    """Executa as buscas densa e esparsa em paralelo e devolve o top-k fundido"""
+    executor = executor_busca()
+    futuro_denso = executor.submit(buscar_denso, vectorstore, vetor, config["k_denso"], config["score_minimo"])
+    futuro_esparso = executor.submit(buscar_esparso, indice_lexico, consulta, config["k_lexical"], termos_extras)
+    resultados = {"denso": futuro_denso.result(), "lexical": futuro_esparso.result()}
+    logger.info(f"[BUSCA_HIBRIDA] denso={len(resultados['denso'])} lexical={len(resultados['lexical'])}")
+    return fundir_rrf(resultados, config["k"], config["k_rrf"], config.get("pesos"))
+
+
+async def abusca_hibrida(vectorstore, indice_lexico, consulta: str, vetor: List[float],
+                         config: Dict, termos_extras: Optional[List[str]] = None) -> List[Document]:
+    """Versão assíncrona de busca_hibrida (buscas fora do event loop)"""
+    denso, esparso = await asyncio.gather(
+        asyncio.to_thread(buscar_denso, vectorstore, vetor, config["k_denso"], config["score_minimo"]),
+        asyncio.to_thread(buscar_esparso, indice_lexico, consulta, config["k_lexical"], termos_extras)
+    )
+    logger.info(f"[BUSCA_HIBRIDA] denso={len(denso)} lexical={len(esparso)}")
+    return fundir_rrf({"denso": denso, "lexical": esparso}, config["k"], config["k_rrf"], config.get("pesos"))
@@ -0,0 +1,303 @@
+"""
+Cache de embeddings endereçado por conteúdo
+Envolve qualquer modelo de embeddings do LangChain com um LRU em memória
+na frente de um backend SQLite persistente, chaveado por
+(modelo, tipo de tarefa, hash do texto normalizado)
+"""
+
+import re
+import math
+import asyncio
+import inspect
+import sqlite3
+import hashlib
+import logging
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import EMBEDDING_CACHE_CONFIG
+from rate_limiter import estimar_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza unicode e espaços para que variações triviais compartilhem a chave"""
+    texto = unicodedata.normalize("NFC", texto or "")
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def chave_embedding(modelo: str, tipo: str, texto: str) -> str:
+    """Chave do cache: modelo + tipo (query/documento) + hash do texto normalizado"""
+    base = f"{modelo}\n{tipo}\n{normalizar_texto(texto)}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+class CacheLRU:
+    """LRU em memória thread-safe"""
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self._dados: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.evicoes = 0
+
+    def get(self, chave):
+        with self._lock:
+            if chave not in self._dados:
+                return None
+            self._dados.move_to_end(chave)
+            return self._dados[chave]
+
+    def set(self, chave, valor):
+        if self.max_itens <= 0:
+            return
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+                self.evicoes += 1
+
+    def remover(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dados)
+
+
+class BancoSQLite:
+    """Conexão SQLite em WAL (compartilhada entre processos) usada pelos backends de cache"""
+
+    def __init__(self, caminho: str, *ddl: str):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(self.caminho), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for comando in ddl:
+            self._conn.execute(comando)
+        self._conn.commit()
+
+
+class BackendSQLite(BancoSQLite):
+    """Armazena vetores float32 em SQLite, compartilhado entre processos"""
+
+    def __init__(self, caminho: str):
+        super().__init__(
+            caminho, "CREATE TABLE IF NOT EXISTS embeddings (chave TEXT PRIMARY KEY, dim INTEGER, vetor BLOB)"
+        )
+
+    def get_many(self, chaves: List[str]) -> Dict[str, List[float]]:
+        encontrados = {}
+        with self._lock:
+            # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+            for i in range(0, len(chaves), 500):
+                bloco = chaves[i:i + 500]
+                marcadores = ",".join("?" * len(bloco))
+                linhas = self._conn.execute(
+                    f"SELECT chave, vetor FROM embeddings WHERE chave IN ({marcadores})", bloco
+                ).fetchall()
+                for chave, blob in linhas:
+                    encontrados[chave] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return encontrados
+
+    def set_many(self, itens: Dict[str, List[float]]):
+        if not itens:
+            return
+        linhas = [
+            (chave, len(vetor), np.asarray(vetor, dtype=np.float32).tobytes())
+            for chave, vetor in itens.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (chave, dim, vetor) VALUES (?, ?, ?)", linhas
+            )
+            self._conn.commit()
+
+
+class EmbeddingsEmCache(Embeddings):
+    """
+    Wrapper de Embeddings com cache em dois níveis (LRU em memória + SQLite)
+    Textos repetidos nunca pagam duas chamadas à API de embeddings
+    """
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 modelo: str,
+                 caminho_db: Optional[str] = None,
+                 max_memoria: Optional[int] = None,
+                 limitador=None,
+                 textos_por_requisicao: int = 100):
+        self.embeddings = embeddings
+        self.modelo = modelo
+        # Limitador de taxa do endpoint de embeddings (só chamadas reais à API consomem cota)
+        self.limitador = limitador
+        self.textos_por_requisicao = max(1, textos_por_requisicao)
+        self.memoria = CacheLRU(max_memoria if max_memoria is not None else EMBEDDING_CACHE_CONFIG["max_memoria"])
+        caminho_db = caminho_db if caminho_db is not None else EMBEDDING_CACHE_CONFIG["db_path"]
+        self.backend = None
+        if caminho_db:
+            try:
+                self.backend = BackendSQLite(caminho_db)
+            except sqlite3.Error as e:
+                logger.warning(f"[CACHE_EMB] Backend persistente indisponível ({e}), usando apenas memória")
+        self.stats = {'hits_memoria': 0, 'hits_disco': 0, 'misses': 0}
+        self.stats_lock = Lock()
+
+    def _buscar(self, tipo: str, textos: List[str]):
+        """Devolve (vetores encontrados por índice, chaves por índice)"""
+        chaves = [chave_embedding(self.modelo, tipo, t) for t in textos]
+        vetores: Dict[int, List[float]] = {}
+        faltantes = []
+        for i, chave in enumerate(chaves):
+            vetor = self.memoria.get(chave)
+            if vetor is not None:
+                vetores[i] = vetor
+            else:
+                faltantes.append(i)
+        hits_memoria = len(vetores)
+
+        hits_disco = 0
+        if faltantes and self.backend is not None:
+            try:
+                do_disco = self.backend.get_many(list({chaves[i] for i in faltantes}))
+            except sqlite3.Error as e:
+                logger.warning(f"[CACHE_EMB] Erro ao ler cache persistente: {e}")
+                do_disco = {}
+            for i in faltantes:
+                if chaves[i] in do_disco:
+                    vetores[i] = do_disco[chaves[i]]
+                    self.memoria.set(chaves[i], vetores[i])
+                    hits_disco += 1
+
+        with self.stats_lock:
+            self.stats['hits_memoria'] += hits_memoria
+            self.stats['hits_disco'] += hits_disco
+            self.stats['misses'] += len(textos) - hits_memoria - hits_disco
+        return vetores, chaves
+
+    def _armazenar(self, chaves: List[str], indices: List[int], novos: List[List[float]],
+                   vetores: Dict[int, List[float]]):
+        para_disco = {}
+        for i, vetor in zip(indices, novos):
+            vetores[i] = vetor
+            self.memoria.set(chaves[i], vetor)
+            para_disco[chaves[i]] = vetor
+        if self.backend is not None:
+            try:
+                self.backend.set_many(para_disco)
+            except sqlite3.Error as e:
+                logger.warning(f"[CACHE_EMB] Erro ao gravar cache persistente: {e}")
+
+    def _custo(self, textos: List[str]):
+        return {
+            "tokens": sum(estimar_tokens(t) for t in textos),
+            "requisicoes": math.ceil(len(textos) / self.textos_por_requisicao)
+        }
+
+    def _reservar_cota(self, textos: List[str]):
+        if self.limitador is not None:
+            self.limitador.adquirir(**self._custo(textos))
+
+    async def _areservar_cota(self, textos: List[str]):
+        if self.limitador is not None:
+            await self.limitador.aadquirir(**self._custo(textos))
+
+    @staticmethod
+    def _pendentes_unicos(textos: List[str], chaves: List[str], vetores: Dict[int, List[float]]):
+        """Índices ainda sem vetor, sem repetir textos com a mesma chave"""
+        vistos = {}
+        for i, chave in enumerate(chaves):
+            if i not in vetores and chave not in vistos:
+                vistos[chave] = i
+        return list(vistos.values())
+
+    @staticmethod
+    def _propagar(chaves: List[str], vetores: Dict[int, List[float]]) -> List[List[float]]:
+        por_chave = {chaves[i]: v for i, v in vetores.items()}
+        return [por_chave[c] for c in chaves]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vetores, chaves = self._buscar("documento", texts)
+        pendentes = self._pendentes_unicos(texts, chaves, vetores)
+        if pendentes:
+            textos = [texts[i] for i in pendentes]
+            self._reservar_cota(textos)
+            novos = self.embeddings.embed_documents(textos)
+            self._armazenar(chaves, pendentes, novos, vetores)
+        return self._propagar(chaves, vetores)
+
+    def embed_query(self, text: str) -> List[float]:
+        vetores, chaves = self._buscar("query", [text])
+        if 0 not in vetores:
+            self._reservar_cota([text])
+            self._armazenar(chaves, [0], [self.embeddings.embed_query(text)], vetores)
+        return vetores[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeda várias consultas; as que faltam no cache vão numa única requisição"""
+        vetores, chaves = self._buscar("query", texts)
+        pendentes = self._pendentes_unicos(texts, chaves, vetores)
+        if pendentes:
+            textos = [texts[i] for i in pendentes]
+            self._reservar_cota(textos)
+            novos = self._embed_queries_lote(textos)
+            self._armazenar(chaves, pendentes, novos, vetores)
+        return self._propagar(chaves, vetores)
+
+    def _embed_queries_lote(self, textos: List[str]) -> List[List[float]]:
+        # GoogleGenerativeAIEmbeddings aceita task_type no lote, produzindo os
+        # mesmos vetores de embed_query; outros modelos caem no laço simples
+        if "task_type" in inspect.signature(self.embeddings.embed_documents).parameters:
+            return self.embeddings.embed_documents(textos, task_type="RETRIEVAL_QUERY")
+        return [self.embeddings.embed_query(t) for t in textos]
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_queries"""
+        vetores, chaves = self._buscar("query", texts)
+        pendentes = self._pendentes_unicos(texts, chaves, vetores)
+        if pendentes:
+            textos = [texts[i] for i in pendentes]
+            await self._areservar_cota(textos)
+            if "task_type" in inspect.signature(self.embeddings.embed_documents).parameters:
+                # O aembed_documents do Google não aceita task_type: lote síncrono fora do loop
+                novos = await asyncio.to_thread(self._embed_queries_lote, textos)
+            else:
+                novos = list(await asyncio.gather(*(self.embeddings.aembed_query(t) for t in textos)))
+            self._armazenar(chaves, pendentes, novos, vetores)
+        return self._propagar(chaves, vetores)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vetores, chaves = self._buscar("documento", texts)
+        pendentes = self._pendentes_unicos(texts, chaves, vetores)
+        if pendentes:
+            textos = [texts[i] for i in pendentes]
+            await self._areservar_cota(textos)
+            novos = await self.embeddings.aembed_documents(textos)
+            self._armazenar(chaves, pendentes, novos, vetores)
+        return self._propagar(chaves, vetores)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vetores, chaves = self._buscar("query", [text])
+        if 0 not in vetores:
+            await self._areservar_cota([text])
+            self._armazenar(chaves, [0], [await self.embeddings.aembed_query(text)], vetores)
+        return vetores[0]
+
+    def get_stats(self) -> Dict[str, float]:
+        """Estatísticas de acerto do cache"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        total = stats['hits_memoria'] + stats['hits_disco'] + stats['misses']
+        stats['hit_rate'] = ((stats['hits_memoria'] + stats['hits_disco']) / max(total, 1)) * 100
+        stats['itens_memoria'] = len(self.memoria)
+        return stats
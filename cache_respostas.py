@@ -0,0 +1,243 @@
+"""
+Cache semântico de respostas do RAG
+Dois níveis de acerto:
+  1. Exato: pergunta normalizada + versão do índice
+  2. Semântico: cosseno entre embeddings de perguntas acima do limiar,
+     desde que o contexto recuperado (IDs dos chunks) seja o mesmo
+Toda entrada carrega a versão do índice e a impressão digital do contexto,
+então respostas ficam obsoletas automaticamente quando docs/ muda
+"""
+
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import unicodedata
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from cache_embeddings import CacheLRU
+from config import RESPONSE_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Minúsculas, sem acentos, sem pontuação e com espaços colapsados"""
+    texto = unicodedata.normalize("NFKD", (pergunta or "").lower())
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    texto = re.sub(r"[^\w\s.]", " ", texto)
+    texto = re.sub(r"\.(?!\w)", " ", texto)  # mantém pontos de identificadores como int.sp_x
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def impressao_contexto(chunk_ids: List[str], versao_indice: Optional[str]) -> str:
+    """Impressão digital do contexto: versão do índice + IDs dos chunks usados"""
+    base = f"{versao_indice}|" + ",".join(sorted(chunk_ids))
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:32]
+
+
+class CacheRespostas:
+    """Cache de respostas com LRU em memória, SQLite persistente, TTL e métricas"""
+
+    def __init__(self,
+                 caminho_db: Optional[str] = None,
+                 ttl_segundos: Optional[float] = None,
+                 max_entradas: Optional[int] = None,
+                 limiar_similaridade: Optional[float] = None):
+        cfg = RESPONSE_CACHE_CONFIG
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else cfg["ttl_segundos"]
+        self.max_entradas = max_entradas if max_entradas is not None else cfg["max_entradas"]
+        self.limiar_similaridade = (limiar_similaridade if limiar_similaridade is not None
+                                    else cfg["limiar_similaridade"])
+        self.memoria = CacheLRU(cfg["max_memoria"])
+        self._lock = Lock()
+        self.stats = {
+            'hits_exatos': 0,
+            'hits_semanticos': 0,
+            'misses_exatos': 0,
+            'misses_semanticos': 0,
+            'expirados': 0,
+            'armazenados': 0
+        }
+
+        caminho_db = caminho_db if caminho_db is not None else cfg["db_path"]
+        self._conn = None
+        if caminho_db:
+            try:
+                Path(caminho_db).parent.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(caminho_db, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS respostas (
+                        chave TEXT PRIMARY KEY,
+                        pergunta_norm TEXT,
+                        versao_indice TEXT,
+                        impressao TEXT,
+                        vetor BLOB,
+                        resultado TEXT,
+                        criado_em REAL,
+                        acessado_em REAL
+                    )""")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_impressao ON respostas (impressao)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em)")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[CACHE_RESP] Backend persistente indisponível ({e}), usando apenas memória")
+                self._conn = None
+        # Sem SQLite, o nível semântico consulta as entradas em memória
+        self._entradas_memoria: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _chave(pergunta_norm: str, versao_indice: Optional[str]) -> str:
+        return hashlib.sha256(f"{pergunta_norm}|{versao_indice}".encode("utf-8")).hexdigest()
+
+    def _expirada(self, criado_em: float) -> bool:
+        return self.ttl_segundos > 0 and time.time() - criado_em > self.ttl_segundos
+
+    def _contar(self, campo: str):
+        with self._lock:
+            self.stats[campo] += 1
+
+    def buscar_exata(self, pergunta: str, versao_indice: Optional[str]) -> Optional[Dict]:
+        """Nível 1: mesma pergunta normalizada sobre a mesma versão do índice"""
+        chave = self._chave(normalizar_pergunta(pergunta), versao_indice)
+        entrada = self.memoria.get(chave)
+        if entrada is None and self._conn is not None:
+            with self._lock:
+                linha = self._conn.execute(
+                    "SELECT resultado, criado_em FROM respostas WHERE chave = ?", (chave,)
+                ).fetchone()
+            if linha:
+                entrada = {"resultado": json.loads(linha[0]), "criado_em": linha[1]}
+        elif entrada is None:
+            entrada = self._entradas_memoria.get(chave)
+
+        if entrada is None:
+            self._contar('misses_exatos')
+            return None
+        if self._expirada(entrada["criado_em"]):
+            self._contar('expirados')
+            self._contar('misses_exatos')
+            self._remover(chave)
+            return None
+        self.memoria.set(chave, entrada)
+        self._tocar(chave)
+        self._contar('hits_exatos')
+        return dict(entrada["resultado"], cache="exato")
+
+    def buscar_semelhante(self, vetor: List[float], impressao: str) -> Optional[Dict]:
+        """Nível 2: pergunta parecida (cosseno >= limiar) com o mesmo contexto recuperado"""
+        if self._conn is not None:
+            with self._lock:
+                linhas = self._conn.execute(
+                    "SELECT chave, vetor, resultado, criado_em FROM respostas WHERE impressao = ?", (impressao,)
+                ).fetchall()
+            candidatos = [(c, np.frombuffer(v, dtype=np.float32), r, t) for c, v, r, t in linhas]
+        else:
+            candidatos = [(c, e["vetor"], e["resultado"], e["criado_em"])
+                          for c, e in self._entradas_memoria.items() if e["impressao"] == impressao]
+
+        consulta = np.asarray(vetor, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        melhor, melhor_sim = None, -1.0
+        for chave, vetor_entrada, resultado, criado_em in candidatos:
+            if self._expirada(criado_em):
+                continue
+            sim = float(np.dot(consulta, vetor_entrada) / max(norma * np.linalg.norm(vetor_entrada), 1e-12))
+            if sim > melhor_sim:
+                melhor, melhor_sim = (chave, resultado), sim
+
+        if melhor is None or melhor_sim < self.limiar_similaridade:
+            self._contar('misses_semanticos')
+            return None
+        chave, resultado = melhor
+        if isinstance(resultado, str):
+            resultado = json.loads(resultado)
+        self._tocar(chave)
+        self._contar('hits_semanticos')
+        logger.info(f"[CACHE_RESP] Hit semântico (similaridade {melhor_sim:.3f})")
+        return dict(resultado, cache="semantico")
+
+    def armazenar(self, pergunta: str, vetor: List[float], impressao: str,
+                  versao_indice: Optional[str], resultado: Dict):
+        """Guarda a resposta do RAG para os dois níveis de busca"""
+        pergunta_norm = normalizar_pergunta(pergunta)
+        chave = self._chave(pergunta_norm, versao_indice)
+        agora = time.time()
+        self.memoria.set(chave, {"resultado": resultado, "criado_em": agora})
+        if self._conn is not None:
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (chave, pergunta_norm, versao_indice, impressao,
+                         np.asarray(vetor, dtype=np.float32).tobytes(),
+                         json.dumps(resultado, ensure_ascii=False), agora, agora)
+                    )
+                    self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[CACHE_RESP] Erro ao gravar cache persistente: {e}")
+        else:
+            self._entradas_memoria[chave] = {
+                "impressao": impressao, "vetor": np.asarray(vetor, dtype=np.float32),
+                "resultado": resultado, "criado_em": agora, "acessado_em": agora
+            }
+        self._contar('armazenados')
+        self._podar()
+
+    def _tocar(self, chave: str):
+        agora = time.time()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+                self._conn.commit()
+        elif chave in self._entradas_memoria:
+            self._entradas_memoria[chave]["acessado_em"] = agora
+
+    def _remover(self, chave: str):
+        self.memoria.remover(chave)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                self._conn.commit()
+        self._entradas_memoria.pop(chave, None)
+
+    def _podar(self):
+        """Remove entradas expiradas (TTL) e as menos acessadas acima do limite (LRU)"""
+        limite_ttl = time.time() - self.ttl_segundos if self.ttl_segundos > 0 else None
+        if self._conn is not None:
+            with self._lock:
+                if limite_ttl is not None:
+                    self._conn.execute("DELETE FROM respostas WHERE criado_em < ?", (limite_ttl,))
+                self._conn.execute(
+                    "DELETE FROM respostas WHERE chave IN ("
+                    " SELECT chave FROM respostas ORDER BY acessado_em DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entradas,)
+                )
+                self._conn.commit()
+            return
+        if limite_ttl is not None:
+            for chave in [c for c, e in self._entradas_memoria.items() if e["criado_em"] < limite_ttl]:
+                del self._entradas_memoria[chave]
+        excesso = len(self._entradas_memoria) - self.max_entradas
+        if excesso > 0:
+            antigas = sorted(self._entradas_memoria, key=lambda c: self._entradas_memoria[c]["acessado_em"])
+            for chave in antigas[:excesso]:
+                del self._entradas_memoria[chave]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de acerto do cache"""
+        with self._lock:
+            stats = dict(self.stats)
+        # Toda consulta passa pelo nível exato; só parte delas chega ao semântico
+        consultas = stats['hits_exatos'] + stats['misses_exatos']
+        hits = stats['hits_exatos'] + stats['hits_semanticos']
+        stats['misses'] = consultas - hits
+        stats['hit_rate'] = (hits / max(consultas, 1)) * 100
+        return stats
@@ -0,0 +1,187 @@
+"""
+Cache de resultados do processamento em lote
+LRU em memória com TTL na frente de um backend plugável (SQLite por padrão),
+compartilhado entre execuções e processos. Reaproveita o CacheLRU e a conexão
+SQLite do cache de embeddings. A chave inclui a versão do índice, a versão
+dos prompts e o modelo, então qualquer mudança neles invalida os resultados
+antigos sem precisar limpar o cache.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from cache_embeddings import BancoSQLite, CacheLRU
+from config import RESULT_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def chave_resultado(conteudo: str, versao_indice: Optional[str], versao_prompt: Any, modelo: str) -> str:
+    """Chave do resultado: conteúdo + tudo que altera a resposta gerada"""
+    base = f"{versao_indice}|{versao_prompt}|{modelo}|{conteudo}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+class BackendResultadosSQLite(BancoSQLite):
+    """
+    Backend persistente em SQLite (WAL, seguro entre processos)
+
+    Qualquer objeto com get(chave) -> (valor, criado_em) | None, set(chave, valor),
+    remover(chave), podar(max_entradas, ttl_segundos) e __len__ serve de backend.
+    """
+
+    def __init__(self, caminho: str):
+        super().__init__(
+            caminho,
+            "CREATE TABLE IF NOT EXISTS resultados (chave TEXT PRIMARY KEY, valor TEXT, criado_em REAL, acessado_em REAL)",
+            "CREATE INDEX IF NOT EXISTS idx_resultados_acesso ON resultados (acessado_em)"
+        )
+
+    def get(self, chave: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT valor, criado_em FROM resultados WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            self._conn.execute("UPDATE resultados SET acessado_em = ? WHERE chave = ?", (time.time(), chave))
+            self._conn.commit()
+        return json.loads(linha[0]), linha[1]
+
+    def set(self, chave: str, valor: Any):
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?)",
+                (chave, json.dumps(valor, ensure_ascii=False, default=str), agora, agora)
+            )
+            self._conn.commit()
+
+    def remover(self, chave: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM resultados WHERE chave = ?", (chave,))
+            self._conn.commit()
+
+    def podar(self, max_entradas: int, ttl_segundos: float) -> int:
+        """Remove expirados e os menos acessados acima do limite; devolve quantos saíram"""
+        with self._lock:
+            removidos = 0
+            if ttl_segundos > 0:
+                removidos += self._conn.execute(
+                    "DELETE FROM resultados WHERE criado_em < ?", (time.time() - ttl_segundos,)
+                ).rowcount
+            if max_entradas > 0:
+                removidos += self._conn.execute(
+                    "DELETE FROM resultados WHERE chave IN (SELECT chave FROM resultados "
+                    "ORDER BY acessado_em DESC LIMIT -1 OFFSET ?)", (max_entradas,)
+                ).rowcount
+            self._conn.commit()
+        return removidos
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+
+class CacheResultados:
+    """LRU + TTL em memória, thread-safe, com backend persistente opcional"""
+
+    def __init__(self,
+                 max_memoria: Optional[int] = None,
+                 ttl_segundos: Optional[float] = None,
+                 max_entradas: Optional[int] = None,
+                 backend=None):
+        cfg = RESULT_CACHE_CONFIG
+        self.max_memoria = max_memoria if max_memoria is not None else cfg["max_memoria"]
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else cfg["ttl_segundos"]
+        self.max_entradas = max_entradas if max_entradas is not None else cfg["max_entradas"]
+        self.backend = backend
+        self.memoria = CacheLRU(self.max_memoria)  # chave -> (valor, criado_em)
+        self._lock = Lock()
+        self._gravacoes = 0
+        self.stats = {
+            'hits_memoria': 0,
+            'hits_disco': 0,
+            'misses': 0,
+            'expirados': 0,
+            'evicoes': 0,
+            'armazenados': 0
+        }
+
+    @classmethod
+    def padrao(cls, caminho_db: Optional[str] = None) -> "CacheResultados":
+        """Cache configurado por RESULT_CACHE_CONFIG; caminho vazio = só memória"""
+        caminho_db = caminho_db if caminho_db is not None else RESULT_CACHE_CONFIG["db_path"]
+        backend = None
+        if caminho_db:
+            try:
+                backend = BackendResultadosSQLite(caminho_db)
+            except sqlite3.Error as e:
+                logger.warning(f"[CACHE_RES] Backend persistente indisponível ({e}), usando apenas memória")
+        return cls(backend=backend)
+
+    def _expirado(self, criado_em: float) -> bool:
+        return self.ttl_segundos > 0 and time.time() - criado_em > self.ttl_segundos
+
+    def get(self, chave: str) -> Optional[Any]:
+        entrada = self.memoria.get(chave)
+        if entrada is not None:
+            if not self._expirado(entrada[1]):
+                with self._lock:
+                    self.stats['hits_memoria'] += 1
+                return entrada[0]
+            self.memoria.remover(chave)
+            with self._lock:
+                self.stats['expirados'] += 1
+
+        if self.backend is not None:
+            try:
+                entrada = self.backend.get(chave)
+            except Exception as e:
+                logger.warning(f"[CACHE_RES] Erro ao ler cache persistente: {e}")
+                entrada = None
+            if entrada is not None:
+                valor, criado_em = entrada
+                if not self._expirado(criado_em):
+                    self.memoria.set(chave, (valor, criado_em))
+                    with self._lock:
+                        self.stats['hits_disco'] += 1
+                    return valor
+                with self._lock:
+                    self.stats['expirados'] += 1
+                self.backend.remover(chave)
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, chave: str, valor: Any):
+        self.memoria.set(chave, (valor, time.time()))
+        with self._lock:
+            self.stats['armazenados'] += 1
+            self._gravacoes += 1
+            podar = self._gravacoes % RESULT_CACHE_CONFIG["podar_a_cada"] == 0
+        if self.backend is not None:
+            try:
+                self.backend.set(chave, valor)
+                if podar:
+                    removidos = self.backend.podar(self.max_entradas, self.ttl_segundos)
+                    with self._lock:
+                        self.stats['evicoes'] += removidos
+            except Exception as e:
+                logger.warning(f"[CACHE_RES] Erro ao gravar cache persistente: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['evicoes'] += self.memoria.evicoes
+        stats['em_memoria'] = len(self.memoria)
+        hits = stats['hits_memoria'] + stats['hits_disco']
+        stats['hit_rate'] = (hits / max(hits + stats['misses'], 1)) * 100  # Percentual, como nos outros caches
+        stats['persistente'] = self.backend is not None
+        return stats
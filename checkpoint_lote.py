@@ -0,0 +1,132 @@
+"""
+Diário de checkpoint do processamento em lote
+Cada resultado é anexado a um JSONL assim que termina (append-only, com
+flush/fsync por linha), chaveado por id do item + hash do conteúdo. Ao
+reiniciar uma execução interrompida, os itens já concluídos são pulados e
+o relatório final é lido do diário em streaming, sem manter tudo em memória.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def chave_item(item_id: str, conteudo: str) -> str:
+    """Chave estável do item: o mesmo id com conteúdo diferente é reprocessado"""
+    return f"{item_id}:{hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16]}"
+
+
+class DiarioCheckpoint:
+    """
+    Journal JSONL de resultados concluídos
+
+    - Uma linha por resultado: {"chave", "item_id", "success", "result", ...}
+    - A última linha de uma chave prevalece (falha seguida de sucesso no resume)
+    - Linha final truncada por queda do processo é descartada; uma linha
+      corrompida no meio do arquivo é só ignorada (os registros seguintes valem)
+    - fechar() libera o arquivo; um registrar() posterior o reabre
+    """
+
+    def __init__(self, caminho: str, fsync: bool = True):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self._lock = Lock()
+        self._sucessos: set = set()
+        self._ultima_linha: Dict[str, int] = {}  # chave -> número da última linha
+        self._linhas = 0
+        self._carregar()
+        self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+
+    def _carregar(self):
+        """Lê só as chaves do diário existente e corta uma eventual linha final incompleta"""
+        if not self.caminho.exists():
+            return
+        posicao, inicio_invalida, ultima = 0, None, b""
+        with open(self.caminho, 'rb') as f:
+            for linha in f:
+                if inicio_invalida is not None:
+                    # A linha inválida não era a última: não é escrita interrompida, só é pulada
+                    logger.warning(f"[CHECKPOINT] Linha {self._linhas} corrompida em {self.caminho}, ignorada")
+                    inicio_invalida = None
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    inicio_invalida = posicao
+                    self._linhas += 1  # Mantém a numeração usada por iterar()
+                else:
+                    self._indexar(registro)
+                posicao += len(linha)
+                ultima = linha
+        if inicio_invalida is not None:
+            logger.warning(f"[CHECKPOINT] Linha incompleta no fim de {self.caminho}, descartada")
+            with open(self.caminho, 'r+b') as f:
+                f.truncate(inicio_invalida)
+            self._linhas -= 1
+        elif ultima and not ultima.endswith(b"\n"):
+            with open(self.caminho, 'ab') as f:
+                f.write(b"\n")  # O próximo registro começa em linha própria
+        if self._linhas:
+            logger.info(f"[CHECKPOINT] {len(self._sucessos)} itens concluídos em {self.caminho}")
+
+    def _indexar(self, registro: Dict[str, Any]):
+        chave = registro["chave"]
+        self._ultima_linha[chave] = self._linhas
+        if registro.get("success"):
+            self._sucessos.add(chave)
+        else:
+            self._sucessos.discard(chave)
+        self._linhas += 1
+
+    def concluido(self, chave: str) -> bool:
+        """Item já processado com sucesso em uma execução anterior (ou nesta)"""
+        with self._lock:
+            return chave in self._sucessos
+
+    def registrar(self, chave: str, registro: Dict[str, Any]):
+        """Anexa o resultado e o torna durável antes de retornar"""
+        registro = dict(registro, chave=chave)
+        linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._arquivo.closed:
+                self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+            self._arquivo.write(linha)
+            self._arquivo.flush()
+            if self.fsync:
+                os.fsync(self._arquivo.fileno())
+            self._indexar(registro)
+
+    def iterar(self) -> Iterator[Dict[str, Any]]:
+        """Registros finais (um por chave) lidos do disco em streaming"""
+        with self._lock:
+            if not self._arquivo.closed:
+                self._arquivo.flush()
+            ultima_linha = dict(self._ultima_linha)
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            for numero, linha in enumerate(f):
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue  # Já registrada como corrompida no carregamento
+                if ultima_linha.get(registro["chave"]) == numero:
+                    yield registro
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'caminho': str(self.caminho),
+                'registros': self._linhas,
+                'itens': len(self._ultima_linha),
+                'concluidos': len(self._sucessos)
+            }
+
+    def fechar(self):
+        with self._lock:
+            if not self._arquivo.closed:
+                self._arquivo.close()
@@ -0,0 +1,131 @@
+"""
+Controle adaptativo de concorrência (AIMD) e retentativas com backoff
+O limite de chamadas simultâneas cresce aditivamente enquanto a API responde
+rápido e sem erros, e cai pela metade diante de 429/5xx ou latência alta.
+Vagas liberadas vão primeiro para os itens de maior prioridade.
+"""
+
+import re
+import time
+import heapq
+import random
+import itertools
+import logging
+from threading import Condition
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SINAL_SUCESSO = "sucesso"
+SINAL_THROTTLE = "throttle"      # 429 / cota esgotada
+SINAL_SERVIDOR = "servidor"      # 5xx / indisponível / timeout
+SINAL_PERMANENTE = "permanente"  # erro do próprio item: não adianta repetir
+
+_PADRAO_THROTTLE = re.compile(r"\b429\b|resource.?exhausted|quota|rate.?limit|too many requests", re.I)
+_PADRAO_SERVIDOR = re.compile(
+    r"\b50[0-4]\b|unavailable|deadline.?exceeded|internal.?server|timed? ?out|timeout|connection", re.I
+)
+
+
+def classificar_erro(erro: Union[BaseException, str, None]) -> str:
+    """Classifica a falha pelo tipo/mensagem: throttle, servidor (transitórias) ou permanente"""
+    texto = f"{type(erro).__name__}: {erro}" if isinstance(erro, BaseException) else str(erro or "")
+    if _PADRAO_THROTTLE.search(texto):
+        return SINAL_THROTTLE
+    if _PADRAO_SERVIDOR.search(texto):
+        return SINAL_SERVIDOR
+    return SINAL_PERMANENTE
+
+
+def erro_transitorio(sinal: str) -> bool:
+    return sinal in (SINAL_THROTTLE, SINAL_SERVIDOR)
+
+
+def calcular_backoff(tentativa: int, base: float, maximo: float, prioridade: int = 1) -> float:
+    """Backoff exponencial com jitter completo; prioridade alta encurta a espera"""
+    teto = min(maximo, base * (2 ** tentativa)) / max(prioridade, 1)
+    return random.uniform(0, teto)
+
+
+class ControladorConcorrencia:
+    """
+    Limite de requisições em andamento ajustado por AIMD
+
+    - Sucesso com latência abaixo do alvo: limite += 1 / limite (≈ +1 por janela)
+    - Throttle, erro 5xx ou latência acima do alvo: limite *= fator_reducao,
+      no máximo uma redução por janela de latência para não despencar em rajada
+    """
+
+    def __init__(self,
+                 limite_inicial: float,
+                 limite_minimo: float = 1,
+                 limite_maximo: float = 16,
+                 latencia_alvo: float = 10.0,
+                 fator_reducao: float = 0.5):
+        self.limite_minimo = max(1.0, limite_minimo)
+        self.limite_maximo = max(self.limite_minimo, limite_maximo)
+        self.limite = min(max(limite_inicial, self.limite_minimo), self.limite_maximo)
+        self.latencia_alvo = latencia_alvo
+        self.fator_reducao = fator_reducao
+        self.em_andamento = 0
+        self._ultima_reducao = 0.0
+        self._espera: list = []  # heap de (-prioridade, ordem de chegada)
+        self._sequencia = itertools.count()
+        self._cond = Condition()
+        self.stats = {
+            'aumentos': 0,
+            'reducoes': 0,
+            'throttles': 0,
+            'erros_servidor': 0,
+            'pico_em_andamento': 0,
+            'espera_vaga_total_s': 0.0
+        }
+
+    def adquirir(self, prioridade: int = 1):
+        """Bloqueia até haver vaga; entre os que esperam, maior prioridade primeiro"""
+        inicio = time.monotonic()
+        with self._cond:
+            entrada = (-prioridade, next(self._sequencia))
+            heapq.heappush(self._espera, entrada)
+            while self._espera[0] != entrada or self.em_andamento >= int(self.limite):
+                self._cond.wait()
+            heapq.heappop(self._espera)
+            self.em_andamento += 1
+            self.stats['pico_em_andamento'] = max(self.stats['pico_em_andamento'], self.em_andamento)
+            self.stats['espera_vaga_total_s'] += time.monotonic() - inicio
+            self._cond.notify_all()  # o próximo da fila pode caber no limite
+
+    def liberar(self, sinal: str, latencia: Optional[float] = None):
+        """Devolve a vaga e ajusta o limite conforme o resultado observado"""
+        with self._cond:
+            self.em_andamento -= 1
+            if sinal == SINAL_THROTTLE:
+                self.stats['throttles'] += 1
+            elif sinal == SINAL_SERVIDOR:
+                self.stats['erros_servidor'] += 1
+
+            lento = latencia is not None and latencia > self.latencia_alvo
+            if erro_transitorio(sinal) or lento:
+                self._reduzir()
+            elif sinal == SINAL_SUCESSO and self.limite < self.limite_maximo:
+                self.limite = min(self.limite_maximo, self.limite + 1.0 / self.limite)
+                self.stats['aumentos'] += 1
+            self._cond.notify_all()
+
+    def _reduzir(self):
+        agora = time.monotonic()
+        if agora - self._ultima_reducao < self.latencia_alvo:
+            return
+        self._ultima_reducao = agora
+        anterior = self.limite
+        self.limite = max(self.limite_minimo, self.limite * self.fator_reducao)
+        self.stats['reducoes'] += 1
+        logger.info(f"[CONCORRENCIA] Limite reduzido de {anterior:.1f} para {self.limite:.1f}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self.stats)
+            stats['limite_atual'] = round(self.limite, 2)
+            stats['em_andamento'] = self.em_andamento
+            stats['aguardando'] = len(self._espera)
+        return stats
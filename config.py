@@ -8,6 +8,93 @@ MODEL_CONFIG = {
     "max_tokens": 1024  # Reduzido para forçar concisão
 }
 
+# Pool de clientes LLM reutilizáveis
+LLM_POOL_CONFIG = {
+    "max_clientes_por_config": 4  # Clientes mantidos por (modelo, temperatura, opções)
+}
+
+# Índice vetorial persistido (FAISS + docstore + manifesto)
+INDEX_CONFIG = {
+    "docs_dir": "docs",
+    "index_dir": ".indice_faiss",
+    "embedding_model": "models/gemma-3-27b-it",
+    "chunk_size": 800,
+    "chunk_overlap": 100,
+    "separators": ["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""]
+}
+
+# Limites de taxa por endpoint (ajuste para a cota da conta; 0 desativa o orçamento)
+RATE_LIMIT_CONFIG = {
+    "llm": {"rps": 1.0, "rajada": 4, "tpm": 1_000_000},
+    "embeddings": {"rps": 5.0, "rajada": 10, "tpm": 1_000_000, "textos_por_requisicao": 100}
+}
+
+# Processamento em lote: concorrência adaptativa (AIMD) e retentativas
+BATCH_CONFIG = {
+    "concorrencia_inicial": 2,
+    "latencia_alvo_s": 15.0,  # Acima disso a concorrência é reduzida
+    "backoff_base_s": 1.0,
+    "backoff_max_s": 60.0,
+    "checkpoint_fsync": True,  # fsync por resultado: sobrevive também a queda da máquina
+    "itens_em_voo": 1000,  # Itens lidos de um gerador e ainda não consumidos (memória limitada)
+    "sobreposicao_chunk": 100,  # Caracteres repetidos entre chunks de process_large_document
+    "leitores_arquivo": 4,  # Threads que leem/decodificam arquivos em process_directory
+    "arquivos_em_leitura": 16  # Arquivos lidos à frente do processamento (back-pressure)
+}
+
+# Índice lexical BM25 (persistido na mesma pasta do índice vetorial)
+LEXICAL_CONFIG = {
+    "arquivo": "lexico.json",
+    "k1": 1.5,
+    "b": 0.75,
+    "max_resultados": 6
+}
+
+# Cache de embeddings (LRU em memória + SQLite persistente)
+EMBEDDING_CACHE_CONFIG = {
+    "db_path": ".cache/embeddings.sqlite",
+    "max_memoria": 10000  # Vetores mantidos no LRU em memória
+}
+
+# Configurações do cache de respostas do RAG
+RESPONSE_CACHE_CONFIG = {
+    "db_path": ".cache/respostas.sqlite",
+    "ttl_segundos": 7 * 24 * 3600,  # Respostas expiram após 7 dias
+    "max_entradas": 2000,  # Limite LRU no disco
+    "max_memoria": 500,  # Respostas mantidas no LRU em memória
+    "limiar_similaridade": 0.95  # Cosseno mínimo para reaproveitar pergunta parecida
+}
+
+# Cache de resultados do BatchProcessor (LRU + TTL em memória, SQLite compartilhado)
+RESULT_CACHE_CONFIG = {
+    "db_path": ".cache/resultados_lote.sqlite",  # "" = apenas memória
+    "ttl_segundos": 7 * 24 * 3600,
+    "max_memoria": 1000,  # Resultados mantidos no LRU em memória
+    "max_entradas": 100000,  # Limite LRU no disco
+    "podar_a_cada": 500  # Gravações entre podas do disco
+}
+
+# Banco do histórico de chat (DATABASE_URL tem precedência sobre url_padrao)
+DB_CONFIG = {
+    "url_padrao": "sqlite:///.cache/chat.sqlite",  # Desenvolvimento/testes sem Postgres
+    "pool_size": 5,  # Conexões mantidas abertas por processo
+    "max_overflow": 10,  # Conexões extras em picos de sessões simultâneas
+    "pool_timeout": 30,  # Segundos aguardando uma conexão livre
+    "pool_recycle": 1800,  # Renova conexões antes do timeout de ociosidade do servidor
+    "pool_pre_ping": True,  # Descarta conexões mortas antes de usar
+    "echo": False
+}
+
+# Gravação assíncrona (write-behind) do histórico de chat
+CHAT_WRITER_CONFIG = {
+    "max_fila": 10000,  # Acima disso os registros vão direto para o arquivo de pendentes
+    "tamanho_lote": 50,  # Registros por INSERT multi-linha
+    "intervalo_s": 1.0,  # Tempo máximo até gravar um lote incompleto
+    "max_tentativas": 3,  # Tentativas por lote antes de gravar no arquivo de pendentes
+    "backoff_base_s": 0.5,
+    "arquivo_pendentes": ".cache/chat_pendente.jsonl"  # Reenviado quando o banco volta
+}
+
 # Estratégia: MÁXIMA CONCISÃO
 STRATEGY_CONFIG = {
     "role": "Integrador de dados",
@@ -15,7 +102,8 @@ STRATEGY_CONFIG = {
     "ideal_response_words": 50,
     "avoid_introductions": True,
     "technical_language": True,
-    "direct_answers_only": True
+    "direct_answers_only": True,
+    "janela_historico": 5  # Turnos mais recentes usados para contextualizar a pergunta
 }
 
 # Thresholds de concisão (mais rigorosos)
@@ -26,6 +114,15 @@ CONCISENESS_THRESHOLDS = {
     "too_long": 150   # >150 palavras = penalizado
 }
 
+# Geração governada por tamanho: limites aplicados na própria chamada ao LLM
+GENERATION_CONFIG = {
+    # ~2 tokens por palavra em português: teto de tokens equivalente ao limite "too_long"
+    "max_output_tokens": CONCISENESS_THRESHOLDS["too_long"] * 2,
+    "stop_sequences": ["\nPERGUNTA:", "\nCONTEXTO DISPONÍVEL:"],  # Modelo repetindo o prompt
+    "reescrita_llm": False,  # Opt-in: resumir com segunda chamada ao LLM em vez de aparar localmente
+    "versao_prompt": 1  # Incremente ao alterar os prompts: invalida os resultados em cache do batch
+}
+
 # Categorias e palavras-chave
 CATEGORIES = {
     "RH": ["férias", "salário", "benefício", "contrato", "demissão", "admissão"],
@@ -55,7 +152,8 @@ UI_CONFIG = {
     "show_confidence": True,
     "show_citations": True,
     "show_metrics": True,
-    "max_chat_history": 50,
+    "max_chat_history": 50,  # Mensagens por página lida do banco
+    "turnos_visiveis": 10,  # Turnos renderizados; os anteriores aparecem sob demanda
     "auto_save_chats": True
 }
 
@@ -0,0 +1,88 @@
+"""
+Divisão de documentos grandes em chunks por streaming
+O arquivo é lido em blocos (memória constante) e cada chunk termina, sempre
+que possível, em fim de parágrafo, de frase ou entre palavras, com
+sobreposição configurável. Os chunks são gerados sob demanda.
+"""
+
+import re
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
+_PARAGRAFO = re.compile(r"\n\s*\n")
+_FRASE = re.compile(r"[.!?;:]\s")
+_ESPACO = re.compile(r"\s")
+
+# Fronteiras anteriores a esta fração do chunk são ignoradas (evita chunks minúsculos)
+FRACAO_MINIMA = 0.5
+
+
+def _ultimo_corte(padrao: re.Pattern, texto: str, minimo: int) -> int:
+    """Posição logo após a última ocorrência do padrão a partir de `minimo` (-1 se não houver)"""
+    corte = -1
+    for m in padrao.finditer(texto, minimo):
+        corte = m.end()
+    return corte
+
+
+def encontrar_corte(texto: str, tamanho: int) -> int:
+    """Melhor ponto de corte até `tamanho`: parágrafo > frase > palavra > corte seco"""
+    if len(texto) <= tamanho:
+        return len(texto)
+    janela = texto[:tamanho + 1]  # +1: um separador logo após o limite também serve
+    minimo = int(tamanho * FRACAO_MINIMA)
+    for padrao in (_PARAGRAFO, _FRASE, _ESPACO):
+        corte = _ultimo_corte(padrao, janela, minimo)
+        if corte > 0:
+            return min(corte, tamanho)
+    return tamanho
+
+
+def _inicio_sobreposicao(texto: str, corte: int, sobreposicao: int) -> int:
+    """
+    Início do próximo chunk: `sobreposicao` caracteres antes do corte, avançando
+    até o início de uma palavra (nunca recua mais que a sobreposição)
+    """
+    if sobreposicao <= 0:
+        return corte
+    inicio = max(0, corte - sobreposicao)
+    if inicio == 0 or texto[inicio - 1].isspace():
+        return inicio
+    espaco = _ESPACO.search(texto, inicio, corte)
+    return espaco.end() if espaco else corte
+
+
+def dividir_em_chunks(caminho: Union[str, Path],
+                      tamanho: int = 1000,
+                      sobreposicao: int = 0,
+                      tamanho_leitura: int = 1 << 20) -> Iterator[Tuple[str, int, int]]:
+    """
+    Gera (texto, inicio, fim) com posições em caracteres no documento
+
+    Apenas o bloco em leitura e o restante do chunk atual ficam em memória.
+    """
+    if sobreposicao >= tamanho:
+        raise ValueError("A sobreposição deve ser menor que o tamanho do chunk")
+    tamanho_leitura = max(tamanho_leitura, tamanho * 2)
+    # Chunks que cortam antes do limite encolhem a sobreposição: cada passo avança
+    # pelo menos metade de (tamanho - sobreposicao), então o total de chunks fica
+    # limitado a ~2x len(texto) / (tamanho - sobreposicao)
+    passo_minimo = max(1, (tamanho - sobreposicao) // 2)
+    # pos percorre o buffer; ele só é compactado quando um novo bloco é lido
+    buffer, pos, deslocamento, fim_arquivo = "", 0, 0, False
+
+    with open(caminho, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        while True:
+            if not fim_arquivo and len(buffer) - pos < tamanho + 1:
+                bloco = f.read(tamanho_leitura)
+                fim_arquivo = not bloco
+                buffer, deslocamento, pos = buffer[pos:] + bloco, deslocamento + pos, 0
+                continue
+            janela = buffer[pos:pos + tamanho + 1]
+            corte = encontrar_corte(janela, tamanho)
+            texto = janela[:corte]
+            if texto.strip():
+                yield texto, deslocamento + pos, deslocamento + pos + corte
+            if fim_arquivo and pos + corte >= len(buffer):
+                return
+            pos += max(min(passo_minimo, corte), _inicio_sobreposicao(janela, corte, min(sobreposicao, corte - passo_minimo)))
@@ -0,0 +1,129 @@
+"""
+Gravação de resultados em JSONL por streaming
+Os registros são serializados pelo chamador e gravados por uma thread
+escritora através de uma fila limitada, então a memória fica constante
+independente do número de itens. Compressão opcional gzip ou zstd
+(pacote zstandard) e resumo em um arquivo lateral pequeno.
+"""
+
+import gzip
+import json
+import queue
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSOES = {None: "", "gzip": ".gz", "zstd": ".zst"}  # Compressão -> sufixo do arquivo
+
+_FIM = object()
+
+
+def caminho_resumo(caminho: str) -> Path:
+    """Arquivo lateral do resumo: resultados.jsonl.gz -> resultados.summary.json"""
+    caminho = Path(caminho)
+    nome = caminho.name
+    for sufixo in [s for s in COMPRESSOES.values() if s] + [".jsonl"]:
+        if nome.endswith(sufixo):
+            nome = nome[:-len(sufixo)]
+    return caminho.with_name(f"{nome}.summary.json")
+
+
+def _abrir(caminho: Path, compressao: Optional[str]):
+    if compressao not in COMPRESSOES:
+        raise ValueError(f"Compressão não suportada: {compressao} (use {', '.join(str(c) for c in COMPRESSOES)})")
+    if compressao is not None and caminho.suffix != COMPRESSOES[compressao]:
+        logger.warning(f"[ESCRITOR] {caminho.name} será gravado com {compressao}; "
+                       f"o sufixo esperado é {COMPRESSOES[compressao]}")
+    if compressao is None:
+        return open(caminho, 'wb')
+    if compressao == "gzip":
+        return gzip.open(caminho, 'wb', compresslevel=6)
+    if compressao == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard não instalado. Instale com: pip install zstandard")
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(caminho, 'wb'), closefd=True)
+
+
+class EscritorJSONL:
+    """
+    Escritor JSONL com thread dedicada e fila limitada
+
+    escrever() bloqueia quando a fila enche (back-pressure), de modo que no
+    máximo max_pendentes linhas ficam em memória. Use como context manager.
+    """
+
+    def __init__(self, caminho: str, compressao: Optional[str] = None, max_pendentes: int = 1000):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._arquivo = _abrir(self.caminho, compressao)
+        self._fila: queue.Queue = queue.Queue(maxsize=max_pendentes)
+        self._erro: Optional[BaseException] = None
+        self.registros = 0
+        self._thread = threading.Thread(target=self._gravar, daemon=True, name="escritor_jsonl")
+        self._thread.start()
+
+    def _gravar(self):
+        try:
+            while True:
+                linha = self._fila.get()
+                if linha is _FIM:
+                    break
+                if self._erro is None:
+                    self._arquivo.write(linha)
+        except BaseException as e:
+            self._erro = e
+            # Continua drenando para não travar o produtor na fila cheia
+            while self._fila.get() is not _FIM:
+                pass
+        finally:
+            self._arquivo.close()
+
+    def escrever(self, registro: Dict[str, Any]):
+        if self._erro is not None:
+            raise self._erro
+        linha = (json.dumps(registro, ensure_ascii=False, default=str) + "\n").encode('utf-8')
+        self._fila.put(linha)
+        self.registros += 1
+
+    def fechar(self):
+        """Espera a fila esvaziar e fecha o arquivo; repassa erro de gravação"""
+        if self._thread.is_alive():
+            self._fila.put(_FIM)
+            self._thread.join()
+        if self._erro is not None:
+            raise self._erro
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def gravar_jsonl(registros: Iterable[Dict[str, Any]],
+                 caminho: str,
+                 compressao: Optional[str] = None,
+                 resumo: Optional[Union[Dict[str, Any], Callable[[], Dict[str, Any]]]] = None,
+                 max_pendentes: int = 1000) -> int:
+    """
+    Grava os registros conforme o iterável os produz; devolve quantos foram gravados
+    resumo pode ser uma função, avaliada só depois de consumir os registros
+    """
+    with EscritorJSONL(caminho, compressao, max_pendentes) as escritor:
+        for registro in registros:
+            escritor.escrever(registro)
+    if resumo is not None:
+        resumo = resumo() if callable(resumo) else resumo
+        with open(caminho_resumo(caminho), 'w', encoding='utf-8') as f:
+            json.dump(dict(resumo, registros=escritor.registros, arquivo=str(caminho)),
+                      f, indent=2, ensure_ascii=False, default=str)
+    logger.info(f"[ESCRITOR] {escritor.registros} registros gravados em {caminho}")
+    return escritor.registros
@@ -0,0 +1,46 @@
+"""
+Estágios CPU-bound do processamento em lote
+Funções de nível de módulo (serializáveis por pickle) que podem rodar em um
+ProcessPoolExecutor, fora do GIL do processo principal. Este módulo não
+importa o main: cada processo filho carrega só o necessário para ler,
+decodificar e normalizar texto.
+"""
+
+import re
+import unicodedata
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+_CONTROLE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_ESPACOS = re.compile(r"[ \t\u00a0]+")
+_LINHAS_VAZIAS = re.compile(r"\n{3,}")
+
+
+def ler_arquivo(caminho: Union[str, Path]) -> str:
+    """Lê o texto do arquivo: PDF/Markdown pelos loaders do índice, demais como texto"""
+    caminho = Path(caminho)
+    if caminho.suffix.lower() in (".pdf", ".md"):
+        import indice_vetorial  # Só paga a importação do LangChain/PyMuPDF quando precisa
+        return "\n\n".join(doc.page_content for doc in indice_vetorial.carregar_arquivo(caminho))
+    dados = caminho.read_bytes()
+    try:
+        return dados.decode('utf-8')
+    except UnicodeDecodeError:
+        return dados.decode('latin-1')  # Exportações antigas do ERP
+
+
+def normalizar_conteudo(texto: str) -> str:
+    """NFC, sem caracteres de controle, espaços e linhas em branco colapsados"""
+    texto = unicodedata.normalize("NFC", texto.replace("\r\n", "\n").replace("\r", "\n"))
+    texto = _CONTROLE.sub("", texto)
+    texto = _ESPACOS.sub(" ", texto)
+    return _LINHAS_VAZIAS.sub("\n\n", texto).strip()
+
+
+def preparar_texto(texto: str, preprocess: Optional[Callable[[str], str]] = None) -> str:
+    return preprocess(texto) if preprocess is not None else texto
+
+
+def ler_e_preparar(caminho: Union[str, Path], preprocess: Optional[Callable[[str], str]] = None) -> str:
+    """Leitura + pré-processamento em uma única ida ao processo filho"""
+    return preparar_texto(ler_arquivo(caminho), preprocess)
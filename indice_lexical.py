@@ -0,0 +1,247 @@
+"""
+Índice lexical BM25 sobre os mesmos chunks do índice vetorial
+Índice invertido em português (minúsculas, sem acentos, sem stopwords,
+plural simples removido), persistido ao lado do FAISS e atualizado
+incrementalmente pelo hash de cada arquivo de docs/. Não depende da API
+de embeddings, então atende a busca textual mesmo sem API_KEY.
+"""
+
+import os
+import re
+import json
+import math
+import heapq
+import logging
+import unicodedata
+from pathlib import Path
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+import indice_vetorial
+from config import INDEX_CONFIG, LEXICAL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+VERSAO_FORMATO = 1
+
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "em", "no", "na", "nos", "nas", "por", "pelo", "pela", "pelos", "pelas", "para",
+    "pra", "com", "sem", "sob", "e", "ou", "mas", "que", "se", "como", "qual", "quais",
+    "quando", "onde", "porque", "ao", "aos", "esse", "essa", "isso", "este", "esta",
+    "isto", "ele", "ela", "eles", "elas", "seu", "sua", "seus", "suas", "me", "meu",
+    "minha", "nao", "sim", "ja", "mais", "muito", "ser", "sao", "foi", "tem", "ha",
+    "eh", "voce", "sobre", "entre"
+}
+
+# Identificadores com ponto (int.sp_x) ficam inteiros; as partes também são indexadas
+_TOKEN = re.compile(r"[a-z0-9_]+(?:\.[a-z0-9_]+)*")
+
+
+def dobrar_acentos(texto: str) -> str:
+    """Minúsculas e sem diacríticos (ação -> acao)"""
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+def _radical(token: str) -> str:
+    """Stemming leve: remove o plural regular (dados -> dado, tabelas -> tabela)"""
+    if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Tokens normalizados usados tanto na indexação quanto na consulta"""
+    tokens = []
+    for token in _TOKEN.findall(dobrar_acentos(texto)):
+        if "." in token:
+            tokens.append(token)
+            tokens.extend(_radical(p) for p in token.split(".") if p and p not in STOPWORDS)
+        elif token not in STOPWORDS and len(token) > 1:
+            tokens.append(_radical(token))
+    return tokens
+
+
+class IndiceBM25:
+    """Índice invertido com pontuação BM25 e inclusão/remoção por chunk_id"""
+
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None):
+        self.k1 = k1 if k1 is not None else LEXICAL_CONFIG["k1"]
+        self.b = b if b is not None else LEXICAL_CONFIG["b"]
+        self.chunks: Dict[str, Dict] = {}  # chunk_id -> {texto, metadata, tf, tamanho}
+        self.postings: Dict[str, Dict[str, int]] = {}  # termo -> {chunk_id: frequência}
+        self.tamanho_total = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _indexar(self, chunk_id: str, texto: str, metadata: Dict, tf: Dict[str, int]):
+        if chunk_id in self.chunks:
+            self.remover([chunk_id])
+        tamanho = sum(tf.values())
+        self.chunks[chunk_id] = {"texto": texto, "metadata": metadata, "tf": tf, "tamanho": tamanho}
+        for termo, freq in tf.items():
+            self.postings.setdefault(termo, {})[chunk_id] = freq
+        self.tamanho_total += tamanho
+
+    def adicionar(self, chunks: List[Document]):
+        """Indexa chunks que já possuem metadata['chunk_id']"""
+        for chunk in chunks:
+            self._indexar(chunk.metadata["chunk_id"], chunk.page_content, dict(chunk.metadata),
+                          dict(Counter(tokenizar(chunk.page_content))))
+
+    def remover(self, chunk_ids: List[str]):
+        for chunk_id in chunk_ids:
+            entrada = self.chunks.pop(chunk_id, None)
+            if entrada is None:
+                continue
+            for termo in entrada["tf"]:
+                docs_termo = self.postings.get(termo)
+                if docs_termo is not None:
+                    docs_termo.pop(chunk_id, None)
+                    if not docs_termo:
+                        del self.postings[termo]
+            self.tamanho_total -= entrada["tamanho"]
+
+    def pontuar(self, termos: List[str]) -> Dict[str, float]:
+        """Pontuação BM25 de cada chunk que contém ao menos um termo"""
+        n = len(self.chunks)
+        if not n:
+            return {}
+        media = self.tamanho_total / n
+        scores: Dict[str, float] = {}
+        for termo, repeticoes in Counter(termos).items():
+            docs_termo = self.postings.get(termo)
+            if not docs_termo:
+                continue
+            idf = math.log(1 + (n - len(docs_termo) + 0.5) / (len(docs_termo) + 0.5))
+            for chunk_id, freq in docs_termo.items():
+                norma = self.k1 * (1 - self.b + self.b * self.chunks[chunk_id]["tamanho"] / media)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + repeticoes * idf * freq * (self.k1 + 1) / (freq + norma)
+        return scores
+
+    def buscar(self, consulta: str, k: Optional[int] = None,
+               termos_extras: Optional[List[str]] = None) -> List[Tuple[Document, float]]:
+        """Top-k chunks por BM25 como (Document, score)"""
+        k = k or LEXICAL_CONFIG["max_resultados"]
+        termos = tokenizar(consulta)
+        for extra in termos_extras or []:
+            termos.extend(tokenizar(extra))
+        scores = self.pontuar(termos)
+        melhores = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            (Document(page_content=self.chunks[cid]["texto"], metadata=dict(self.chunks[cid]["metadata"])), score)
+            for cid, score in melhores
+        ]
+
+    def para_dict(self) -> Dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "chunks": {cid: {"texto": c["texto"], "metadata": c["metadata"], "tf": c["tf"]}
+                       for cid, c in self.chunks.items()}
+        }
+
+    @classmethod
+    def de_dict(cls, dados: Dict) -> "IndiceBM25":
+        indice = cls(k1=dados.get("k1"), b=dados.get("b"))
+        for cid, c in dados.get("chunks", {}).items():
+            indice._indexar(cid, c["texto"], c["metadata"], c["tf"])
+        return indice
+
+
+def _caminho(index_dir: Optional[Path] = None) -> Path:
+    return Path(index_dir or INDEX_CONFIG["index_dir"]) / LEXICAL_CONFIG["arquivo"]
+
+
+def _metadata_serializavel(chunks: List[Document]):
+    """PyMuPDF pode trazer valores não serializáveis; mantém só tipos JSON"""
+    for chunk in chunks:
+        chunk.metadata = {k: v for k, v in chunk.metadata.items()
+                          if isinstance(v, (str, int, float, bool)) or v is None}
+
+
+def salvar_indice_lexical(indice: IndiceBM25, arquivos: Dict[str, Dict], index_dir: Optional[Path] = None):
+    """Grava o índice e o registro de arquivos de forma atômica"""
+    caminho = _caminho(index_dir)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    dados = {
+        "versao_formato": VERSAO_FORMATO,
+        "chunker": indice_vetorial.configuracao_chunker(),
+        "arquivos": arquivos,
+        "indice": indice.para_dict()
+    }
+    tmp = caminho.with_suffix(".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(tmp, caminho)
+
+
+def ler_indice_lexical(index_dir: Optional[Path] = None) -> Tuple[Optional[IndiceBM25], Dict[str, Dict]]:
+    """Lê o índice persistido (None se ausente, ilegível ou de outro chunker)"""
+    caminho = _caminho(index_dir)
+    if not caminho.exists():
+        return None, {}
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[LEXICO] Índice lexical ilegível ({e}), será reconstruído")
+        return None, {}
+    if (dados.get("versao_formato") != VERSAO_FORMATO
+            or dados.get("chunker") != indice_vetorial.configuracao_chunker()):
+        return None, {}
+    return IndiceBM25.de_dict(dados["indice"]), dados.get("arquivos", {})
+
+
+def atualizar_indice_lexical(docs: Optional[List[Document]] = None,
+                             docs_path: Optional[Path] = None,
+                             index_dir: Optional[Path] = None,
+                             reconstruir: bool = False) -> Tuple[IndiceBM25, Dict]:
+    """
+    Sincroniza o índice BM25 persistido com os arquivos atuais, retokenizando
+    apenas arquivos novos ou modificados
+
+    Returns:
+        (indice, relatorio) com as contagens de chunks adicionados e removidos
+    """
+    grupos = indice_vetorial.agrupar_por_arquivo(docs) if docs is not None else None
+    origens = (list(grupos) if grupos is not None
+               else [p.as_posix() for p in indice_vetorial.listar_arquivos_docs(docs_path)])
+    hashes = indice_vetorial.calcular_hashes(origens)
+
+    indice, arquivos = (None, {}) if reconstruir else ler_indice_lexical(index_dir)
+    reconstruido = indice is None
+    if indice is None:
+        indice, arquivos = IndiceBM25(), {}
+
+    novos, modificados, removidos, _ = indice_vetorial.classificar_arquivos(arquivos, hashes)
+    # Carregar antes de remover: arquivo com falha mantém os chunks atuais
+    carregados, falhas = indice_vetorial.carregar_arquivos(novos + modificados, grupos)
+    novos = [o for o in novos if o in carregados]
+    modificados = [o for o in modificados if o in carregados]
+    relatorio = {"reconstruido": reconstruido, "chunks_adicionados": 0, "chunks_removidos": 0,
+                 "arquivos_com_falha": falhas}
+
+    for origem in removidos + modificados:
+        ids = arquivos.pop(origem, {}).get("chunk_ids", [])
+        indice.remover(ids)
+        relatorio["chunks_removidos"] += len(ids)
+
+    splitter = indice_vetorial.criar_splitter()
+    for origem in novos + modificados:
+        # Mesmo chunker e mesmos IDs do índice vetorial
+        chunks = indice_vetorial.dividir_arquivo(carregados.pop(origem), origem, hashes[origem], splitter)
+        _metadata_serializavel(chunks)
+        indice.adicionar(chunks)
+        arquivos[origem] = {"hash": hashes[origem], "chunk_ids": [c.metadata["chunk_id"] for c in chunks]}
+        relatorio["chunks_adicionados"] += len(chunks)
+
+    if reconstruido or novos or modificados or removidos:
+        salvar_indice_lexical(indice, arquivos, index_dir)
+        logger.info(f"[LEXICO] Índice lexical atualizado: +{relatorio['chunks_adicionados']} "
+                    f"-{relatorio['chunks_removidos']} ({len(indice)} chunks)")
+    return indice, relatorio
@@ -0,0 +1,398 @@
+"""
+Índice vetorial persistido em disco para os documentos de docs/
+Salva o FAISS + docstore junto com um manifesto (hash de cada arquivo,
+configuração do chunker e modelo de embeddings) e, quando docs/ muda,
+embeda apenas os arquivos novos ou modificados
+
+Uso pela linha de comando:
+    python indice_vetorial.py [--docs docs] [--index .indice_faiss] [--reconstruir]
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+
+from config import INDEX_CONFIG
+
+logger = logging.getLogger(__name__)
+
+VERSAO_FORMATO = 1
+ARQUIVO_MANIFESTO = "manifesto.json"
+
+
+def hash_arquivo(caminho: Path) -> str:
+    """Calcula o SHA-256 do conteúdo do arquivo lendo em blocos"""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def listar_arquivos_docs(docs_path: Optional[Path] = None) -> List[Path]:
+    """Lista os PDFs e Markdowns indexáveis em ordem estável"""
+    docs_path = Path(docs_path or INDEX_CONFIG["docs_dir"])
+    if not docs_path.exists():
+        return []
+    return sorted(list(docs_path.glob("*.pdf")) + list(docs_path.glob("*.md")))
+
+
+def carregar_arquivo(caminho: Path) -> List[Document]:
+    """Carrega um PDF (uma página por Document) ou um Markdown (Document único)"""
+    caminho = Path(caminho)
+    if caminho.suffix.lower() == ".pdf":
+        doc_pages = PyMuPDFLoader(str(caminho)).load()
+        for page in doc_pages:
+            page.metadata.update({
+                "filename": caminho.name,
+                "file_size": caminho.stat().st_size,
+                "content_type": "pdf_document"
+            })
+        return doc_pages
+
+    with open(caminho, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return [Document(
+        page_content=content,
+        metadata={
+            "filename": caminho.name,
+            "file_size": caminho.stat().st_size,
+            "content_type": "markdown_document",
+            "source": str(caminho)
+        }
+    )]
+
+
+def carregar_docs(docs_path: Optional[Path] = None) -> List[Document]:
+    """Carrega todos os documentos de docs/, ignorando arquivos com erro"""
+    docs = []
+    for n in listar_arquivos_docs(docs_path):
+        try:
+            docs.extend(carregar_arquivo(n))
+        except Exception as e:
+            tipo = "PDF" if n.suffix.lower() == ".pdf" else "Markdown"
+            print(f"[ERRO] Erro ao carregar {tipo} {n.name}: {e}")
+    return docs
+
+
+def configuracao_chunker() -> Dict:
+    """Parâmetros do chunker que entram no manifesto"""
+    return {
+        "chunk_size": INDEX_CONFIG["chunk_size"],
+        "chunk_overlap": INDEX_CONFIG["chunk_overlap"],
+        "separators": list(INDEX_CONFIG["separators"])
+    }
+
+
+def criar_splitter() -> RecursiveCharacterTextSplitter:
+    """Splitter usado tanto na indexação quanto na busca lexical"""
+    cfg = configuracao_chunker()
+    return RecursiveCharacterTextSplitter(
+        chunk_size=cfg["chunk_size"],
+        chunk_overlap=cfg["chunk_overlap"],
+        separators=cfg["separators"]
+    )
+
+
+def agrupar_por_arquivo(docs: List[Document]) -> Dict[str, List[Document]]:
+    """Agrupa páginas/documentos pelo caminho do arquivo de origem"""
+    grupos: Dict[str, List[Document]] = {}
+    for doc in docs:
+        origem = doc.metadata.get("source")
+        if not origem:
+            continue
+        grupos.setdefault(Path(origem).as_posix(), []).append(doc)
+    return grupos
+
+
+def dividir_arquivo(docs_arquivo: List[Document], origem: str, hash_conteudo: str,
+                    splitter: Optional[RecursiveCharacterTextSplitter] = None) -> List[Document]:
+    """Divide os documentos de um arquivo em chunks com IDs determinísticos"""
+    splitter = splitter or criar_splitter()
+    chunks = splitter.split_documents(docs_arquivo)
+    # O caminho entra no ID para que arquivos com conteúdo idêntico não colidam
+    prefixo = f"{hashlib.sha1(origem.encode()).hexdigest()[:8]}:{hash_conteudo[:16]}"
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["doc_hash"] = hash_conteudo
+        chunk.metadata["chunk_id"] = f"{prefixo}:{i}"
+    return chunks
+
+
+def calcular_hashes(origens: List[str]) -> Dict[str, str]:
+    """Hash do conteúdo de cada arquivo (arquivos ilegíveis ficam de fora)"""
+    hashes = {}
+    for origem in origens:
+        try:
+            hashes[origem] = hash_arquivo(Path(origem))
+        except OSError as e:
+            logger.warning(f"[INDICE] Não foi possível calcular hash de {origem}: {e}")
+    return hashes
+
+
+def classificar_arquivos(arquivos_anteriores: Dict[str, Dict],
+                         hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """
+    Compara o registro anterior com os hashes atuais: (novos, modificados, removidos, inalterados)
+    Só conta como removido o arquivo que sumiu do disco; um que existe mas ficou de
+    fora (erro de leitura/carregamento) mantém suas entradas para a próxima tentativa.
+    """
+    removidos = [o for o in arquivos_anteriores if o not in hashes and not Path(o).exists()]
+    modificados = [o for o in hashes if o in arquivos_anteriores and arquivos_anteriores[o].get("hash") != hashes[o]]
+    novos = [o for o in hashes if o not in arquivos_anteriores]
+    inalterados = [o for o in hashes if o not in novos and o not in modificados]
+    return novos, modificados, removidos, inalterados
+
+
+def calcular_versao_indice(manifesto: Dict) -> str:
+    """Hash estável do conteúdo do manifesto (exceto campos voláteis)"""
+    base = {
+        "versao_formato": manifesto.get("versao_formato"),
+        "modelo_embeddings": manifesto.get("modelo_embeddings"),
+        "chunker": manifesto.get("chunker"),
+        "arquivos": {k: v.get("hash") for k, v in sorted(manifesto.get("arquivos", {}).items())}
+    }
+    return hashlib.sha256(json.dumps(base, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def ler_manifesto(index_dir: Optional[Path] = None) -> Optional[Dict]:
+    """Lê o manifesto do índice persistido (None se ausente ou inválido)"""
+    caminho = Path(index_dir or INDEX_CONFIG["index_dir"]) / ARQUIVO_MANIFESTO
+    if not caminho.exists():
+        return None
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[INDICE] Manifesto ilegível ({e}), índice será reconstruído")
+        return None
+
+
+def salvar_indice(vectorstore: FAISS, manifesto: Dict, index_dir: Optional[Path] = None):
+    """Persiste FAISS + docstore e grava o manifesto por último, de forma atômica"""
+    index_dir = Path(index_dir or INDEX_CONFIG["index_dir"])
+    index_dir.mkdir(parents=True, exist_ok=True)
+    caminho_manifesto = index_dir / ARQUIVO_MANIFESTO
+
+    # Remove o manifesto antes de sobrescrever o índice: uma escrita interrompida
+    # nunca deixa um manifesto válido apontando para arquivos parciais
+    if caminho_manifesto.exists():
+        caminho_manifesto.unlink()
+    vectorstore.save_local(str(index_dir))
+
+    manifesto["versao_indice"] = calcular_versao_indice(manifesto)
+    manifesto["atualizado_em"] = datetime.now().isoformat()
+    tmp = caminho_manifesto.with_suffix(".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, caminho_manifesto)
+
+
+def manifesto_compativel(manifesto: Optional[Dict], modelo: str) -> bool:
+    """Verifica se o índice persistido pode ser atualizado incrementalmente"""
+    if not manifesto:
+        return False
+    return (manifesto.get("versao_formato") == VERSAO_FORMATO
+            and manifesto.get("modelo_embeddings") == modelo
+            and manifesto.get("chunker") == configuracao_chunker())
+
+
+def novo_manifesto(modelo: str) -> Dict:
+    """Manifesto vazio para o modelo de embeddings informado"""
+    return {
+        "versao_formato": VERSAO_FORMATO,
+        "modelo_embeddings": modelo,
+        "chunker": configuracao_chunker(),
+        "arquivos": {}
+    }
+
+
+def carregar_indice_persistido(index_dir: Path, embeddings) -> Optional[FAISS]:
+    """Lê FAISS + docstore do disco (None se ausente ou corrompido)"""
+    try:
+        return FAISS.load_local(
+            str(index_dir), embeddings,
+            allow_dangerous_deserialization=True  # arquivos gerados por este próprio módulo
+        )
+    except Exception as e:
+        logger.warning(f"[INDICE] Falha ao carregar índice persistido ({e}), reconstruindo")
+        return None
+
+
+def carregar_arquivos(origens: List[str],
+                      grupos: Optional[Dict[str, List[Document]]] = None) -> Tuple[Dict[str, List[Document]], List[str]]:
+    """Documentos de cada origem (dos grupos já carregados ou do disco) e as origens que falharam"""
+    carregados, falhas = {}, []
+    for origem in origens:
+        try:
+            carregados[origem] = grupos[origem] if grupos is not None else carregar_arquivo(Path(origem))
+        except Exception as e:
+            print(f"[ERRO] Erro ao carregar {Path(origem).name}: {e}")
+            falhas.append(origem)
+    return carregados, falhas
+
+
+def atualizar_indice(embeddings,
+                     docs: Optional[List[Document]] = None,
+                     docs_path: Optional[Path] = None,
+                     index_dir: Optional[Path] = None,
+                     modelo: Optional[str] = None,
+                     reconstruir: bool = False) -> Tuple[Optional[FAISS], Dict, Dict]:
+    """
+    Sincroniza o índice persistido com os arquivos atuais
+
+    Remove os vetores de arquivos apagados ou modificados, embeda apenas os
+    chunks de arquivos novos ou modificados e persiste o resultado. Se o
+    índice não existir ou for incompatível (formato, chunker ou modelo),
+    reconstrói do zero. Arquivos que falham ao carregar mantêm os vetores
+    e a entrada do manifesto anteriores (nova tentativa na próxima execução).
+
+    Args:
+        embeddings: Modelo de embeddings
+        docs: Documentos já carregados (None = carregar de docs_path sob demanda)
+        docs_path: Pasta de documentos quando docs não é informado
+        index_dir: Pasta do índice persistido
+        modelo: Nome do modelo de embeddings registrado no manifesto
+        reconstruir: Força a reconstrução completa
+
+    Returns:
+        (vectorstore, manifesto, relatorio) com as contagens de chunks
+        adicionados, removidos e inalterados
+    """
+    index_dir = Path(index_dir or INDEX_CONFIG["index_dir"])
+    modelo = modelo or INDEX_CONFIG["embedding_model"]
+
+    grupos = agrupar_por_arquivo(docs) if docs is not None else None
+    origens = list(grupos) if grupos is not None else [p.as_posix() for p in listar_arquivos_docs(docs_path)]
+    hashes = calcular_hashes(origens)
+
+    manifesto_anterior = ler_manifesto(index_dir)
+    arquivos_anteriores = (manifesto_anterior or {}).get("arquivos", {})
+
+    vectorstore = None
+    if not reconstruir and manifesto_compativel(manifesto_anterior, modelo):
+        vectorstore = carregar_indice_persistido(index_dir, embeddings)
+
+    if vectorstore is not None:
+        manifesto = manifesto_anterior
+        novos, modificados, removidos, inalterados = classificar_arquivos(arquivos_anteriores, hashes)
+    else:
+        manifesto = novo_manifesto(modelo)
+        removidos = list(arquivos_anteriores)
+        modificados = []
+        novos = list(hashes)
+        inalterados = []
+
+    # 1. Carregar antes de remover: falha transitória não apaga os vetores atuais
+    carregados, falhas = carregar_arquivos(novos + modificados, grupos)
+    novos = [o for o in novos if o in carregados]
+    modificados = [o for o in modificados if o in carregados]
+
+    relatorio = {
+        "reconstruido": vectorstore is None,
+        "arquivos_novos": novos,
+        "arquivos_modificados": modificados,
+        "arquivos_removidos": removidos,
+        "chunks_adicionados": 0,
+        "chunks_removidos": sum(len(arquivos_anteriores[o].get("chunk_ids", [])) for o in removidos + modificados),
+        "chunks_inalterados": sum(len(manifesto["arquivos"][o].get("chunk_ids", [])) for o in inalterados),
+        "arquivos_com_falha": falhas
+    }
+
+    # 2. Remover vetores de arquivos apagados ou modificados
+    if vectorstore is not None:
+        ids_remover = [cid for o in removidos + modificados for cid in arquivos_anteriores[o].get("chunk_ids", [])]
+        if ids_remover:
+            vectorstore.delete(ids_remover)
+        for o in removidos + modificados:
+            manifesto["arquivos"].pop(o, None)
+
+    # 3. Embedar apenas os chunks novos
+    splitter = criar_splitter()
+    chunks_novos: List[Document] = []
+    for origem in novos + modificados:
+        chunks = dividir_arquivo(carregados.pop(origem), origem, hashes[origem], splitter)
+        manifesto["arquivos"][origem] = {
+            "hash": hashes[origem],
+            "chunk_ids": [c.metadata["chunk_id"] for c in chunks]
+        }
+        chunks_novos.extend(chunks)
+
+    if chunks_novos:
+        ids = [c.metadata["chunk_id"] for c in chunks_novos]
+        if vectorstore is None:
+            vectorstore = FAISS.from_documents(chunks_novos, embeddings, ids=ids)
+        else:
+            vectorstore.add_documents(chunks_novos, ids=ids)
+    relatorio["chunks_adicionados"] = len(chunks_novos)
+
+    # 4. Persistir somente se algo mudou
+    alterado = relatorio["reconstruido"] or bool(novos or modificados or removidos)
+    if vectorstore is not None and vectorstore.index.ntotal == 0:
+        vectorstore = None
+    if alterado:
+        if vectorstore is not None:
+            salvar_indice(vectorstore, manifesto, index_dir)
+        else:
+            # Só os arquivos do FAISS: o índice lexical mora na mesma pasta
+            for nome in (ARQUIVO_MANIFESTO, "index.faiss", "index.pkl"):
+                (index_dir / nome).unlink(missing_ok=True)
+        logger.info(f"[INDICE] Índice atualizado: +{relatorio['chunks_adicionados']} "
+                    f"-{relatorio['chunks_removidos']} ={relatorio['chunks_inalterados']} chunks")
+    else:
+        logger.info(f"[INDICE] Índice carregado do disco (versão {manifesto.get('versao_indice')})")
+
+    return vectorstore, manifesto, relatorio
+
+
+def carregar_ou_construir_indice(docs: List[Document], embeddings,
+                                 index_dir: Optional[Path] = None,
+                                 modelo: Optional[str] = None) -> Tuple[Optional[FAISS], Dict]:
+    """
+    Carrega o índice persistido se o manifesto corresponder aos arquivos atuais;
+    caso contrário atualiza incrementalmente, persiste e devolve o índice
+    """
+    vectorstore, manifesto, _ = atualizar_indice(embeddings, docs=docs, index_dir=index_dir, modelo=modelo)
+    return vectorstore, manifesto
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Atualiza incrementalmente o índice vetorial de docs/")
+    parser.add_argument("--docs", default=INDEX_CONFIG["docs_dir"], help="Pasta de documentos")
+    parser.add_argument("--index", default=INDEX_CONFIG["index_dir"], help="Pasta do índice persistido")
+    parser.add_argument("--reconstruir", action="store_true", help="Força reconstrução completa")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    if not os.getenv("API_KEY"):
+        print("[AVISO] API_KEY não encontrada. Não é possível gerar embeddings.")
+        raise SystemExit(1)
+
+    from main import get_embeddings
+    _, manifesto, relatorio = atualizar_indice(
+        get_embeddings(), docs_path=Path(args.docs), index_dir=Path(args.index), reconstruir=args.reconstruir
+    )
+    print(f"📚 Índice {'reconstruído' if relatorio['reconstruido'] else 'atualizado'} "
+          f"(versão {manifesto.get('versao_indice', '-')})")
+    print(f"  ➕ Chunks adicionados: {relatorio['chunks_adicionados']}")
+    print(f"  ➖ Chunks removidos: {relatorio['chunks_removidos']}")
+    print(f"  ✔️ Chunks inalterados: {relatorio['chunks_inalterados']}")
+
+    import indice_lexical
+    indice, relatorio_lexico = indice_lexical.atualizar_indice_lexical(
+        docs_path=Path(args.docs), index_dir=Path(args.index), reconstruir=args.reconstruir
+    )
+    print(f"🔤 Índice lexical: +{relatorio_lexico['chunks_adicionados']} "
+          f"-{relatorio_lexico['chunks_removidos']} ({len(indice)} chunks)")
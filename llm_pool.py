@@ -0,0 +1,121 @@
+"""
+Registro de clientes LLM reutilizáveis por processo
+Mantém, para cada configuração (modelo, temperatura, opções), um pool
+limitado de clientes já construídos, de modo que conexões HTTP/gRPC e
+handshakes TLS sejam reaproveitados entre perguntas e entre threads
+"""
+
+import logging
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _congelar(valor: Any) -> Any:
+    """Converte listas/dicts em tuplas para compor a chave do registro"""
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _congelar(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+class _EntradaPool:
+    """Clientes de uma configuração e quantas chamadas cada um atende agora"""
+
+    def __init__(self):
+        self.clientes: List[Any] = []
+        self.em_uso: List[int] = []
+
+
+class PoolClientesLLM:
+    """
+    Pool limitado e não bloqueante de clientes LLM por configuração
+
+    Cada empréstimo pega o cliente com menos chamadas em andamento; um novo
+    cliente só é construído quando todos estão ocupados e o limite por
+    configuração ainda não foi atingido. Acima do limite os chamadores
+    compartilham clientes (os clientes do Google são thread-safe), então
+    nunca há espera por um cliente livre.
+    """
+
+    def __init__(self, fabrica: Callable[..., Any], max_por_config: int = 4):
+        """
+        Args:
+            fabrica: Função que constrói um cliente a partir de (modelo, temperatura, **opcoes)
+            max_por_config: Número máximo de clientes mantidos por configuração
+        """
+        self.fabrica = fabrica
+        self.max_por_config = max(1, max_por_config)
+        self._entradas: Dict[Tuple, _EntradaPool] = {}
+        self._lock = Lock()
+        self.stats = {
+            'construcoes': 0,
+            'reutilizacoes': 0,
+            'em_uso': 0,
+            'pico_em_uso': 0
+        }
+
+    def _chave(self, modelo: str, temperatura: float, opcoes: Dict[str, Any]) -> Tuple:
+        return (modelo, temperatura, _congelar(opcoes))
+
+    def _adquirir(self, modelo: str, temperatura: float, opcoes: Dict[str, Any]) -> Tuple[_EntradaPool, int]:
+        chave = self._chave(modelo, temperatura, opcoes)
+        with self._lock:
+            entrada = self._entradas.setdefault(chave, _EntradaPool())
+            indice = min(range(len(entrada.clientes)), key=lambda i: entrada.em_uso[i], default=None)
+            precisa_novo = indice is None or (entrada.em_uso[indice] > 0
+                                              and len(entrada.clientes) < self.max_por_config)
+            if not precisa_novo:
+                entrada.em_uso[indice] += 1
+                self.stats['reutilizacoes'] += 1
+                self._marcar_em_uso(1)
+                return entrada, indice
+
+        # Construção fora do lock: pode levar alguns milissegundos (canal gRPC)
+        cliente = self.fabrica(modelo=modelo, temperatura=temperatura, **opcoes)
+        with self._lock:
+            if len(entrada.clientes) >= self.max_por_config:
+                # Outra thread completou o pool enquanto este cliente era construído
+                indice = min(range(len(entrada.clientes)), key=lambda i: entrada.em_uso[i])
+                self.stats['reutilizacoes'] += 1
+            else:
+                entrada.clientes.append(cliente)
+                entrada.em_uso.append(0)
+                indice = len(entrada.clientes) - 1
+                self.stats['construcoes'] += 1
+                logger.info(f"[LLM_POOL] Novo cliente para {modelo} (t={temperatura}) "
+                            f"- {len(entrada.clientes)}/{self.max_por_config}")
+            entrada.em_uso[indice] += 1
+            self._marcar_em_uso(1)
+            return entrada, indice
+
+    def _marcar_em_uso(self, delta: int):
+        self.stats['em_uso'] += delta
+        self.stats['pico_em_uso'] = max(self.stats['pico_em_uso'], self.stats['em_uso'])
+
+    @contextmanager
+    def emprestar(self, modelo: str, temperatura: float, **opcoes):
+        """Empresta um cliente durante uma chamada (funciona em código síncrono e assíncrono)"""
+        entrada, indice = self._adquirir(modelo, temperatura, opcoes)
+        try:
+            yield entrada.clientes[indice]
+        finally:
+            with self._lock:
+                entrada.em_uso[indice] -= 1
+                self._marcar_em_uso(-1)
+
+    def obter(self, modelo: str, temperatura: float, **opcoes) -> Any:
+        """Devolve um cliente compartilhado sem contabilizá-lo como em uso"""
+        with self.emprestar(modelo, temperatura, **opcoes) as cliente:
+            return cliente
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de construção, reutilização e chamadas em andamento"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['configuracoes'] = len(self._entradas)
+            stats['clientes'] = sum(len(e.clientes) for e in self._entradas.values())
+        return stats
@@ -1,33 +1,99 @@
 import os
+import re
 import pathlib
 import json
+import asyncio
 import logging
 import hashlib
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import TypedDict, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.messages import HumanMessage
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 
+import indice_vetorial
+import indice_lexical
+from busca_hibrida import busca_hibrida, abusca_hibrida
+from cache_embeddings import EmbeddingsEmCache
+from cache_respostas import CacheRespostas, impressao_contexto
+from llm_pool import PoolClientesLLM
+from rate_limiter import LimitadorTaxa, estimar_tokens
+from metricas import metricas
+from config import (
+    INDEX_CONFIG, LLM_POOL_CONFIG, MODEL_CONFIG, RATE_LIMIT_CONFIG,
+    STRATEGY_CONFIG, CONCISENESS_THRESHOLDS, GENERATION_CONFIG
+)
+
 try:
     import streamlit as st
 except ImportError:
     st = None
 from dotenv import load_dotenv
 
-# Função utilitária para instanciar o LLM
-def get_llm():
+def _criar_llm(modelo, temperatura, **opcoes):
     return ChatGoogleGenerativeAI(
-        model="models/gemma-3-27b-it",
+        model=modelo,
         google_api_key=os.getenv("API_KEY"),
-        temperature=0.1,
-        convert_system_message_to_human=True
+        temperature=temperatura,
+        convert_system_message_to_human=True,
+        **opcoes
     )
 
+# Pool de clientes por processo: evita reconstruir o cliente (e refazer TLS) a cada chamada
+pool_llm = PoolClientesLLM(_criar_llm, max_por_config=LLM_POOL_CONFIG["max_clientes_por_config"])
+
+# Função utilitária para obter o LLM (cliente compartilhado do pool)
+def get_llm(**opcoes):
+    return pool_llm.obter(MODEL_CONFIG["triagem_model"], MODEL_CONFIG["temperature"], **opcoes)
+
+# Orçamentos de requisições/s e tokens/min por endpoint, compartilhados pelo processo
+limitador = LimitadorTaxa(RATE_LIMIT_CONFIG)
+
+def _tokens_estimados(prompt: str, opcoes: dict) -> int:
+    return estimar_tokens(prompt) + opcoes.get("max_output_tokens", MODEL_CONFIG["max_tokens"])
+
+def _tokens_reais(resposta) -> Optional[int]:
+    uso = getattr(resposta, "usage_metadata", None)
+    return uso.get("total_tokens") if uso else None
+
+def invocar_llm(prompt: str, stop: Optional[list] = None, **opcoes):
+    """Executa o prompt com um cliente emprestado do pool, respeitando o limite de taxa"""
+    estimados = _tokens_estimados(prompt, opcoes)
+    metricas.observar("espera_cota", limitador.adquirir("llm", tokens=estimados))
+    with pool_llm.emprestar(MODEL_CONFIG["triagem_model"], MODEL_CONFIG["temperature"], **opcoes) as llm:
+        with metricas.medir("geracao_llm"):
+            resposta = llm.invoke([HumanMessage(content=prompt)], stop=stop)
+    limitador["llm"].ajustar_tokens(estimados, _tokens_reais(resposta))
+    return resposta
+
+async def ainvocar_llm(prompt: str, config: Optional[dict] = None, stop: Optional[list] = None, **opcoes):
+    """Versão assíncrona de invocar_llm (a espera por cota não bloqueia o event loop)"""
+    estimados = _tokens_estimados(prompt, opcoes)
+    metricas.observar("espera_cota", await limitador.aadquirir("llm", tokens=estimados))
+    with pool_llm.emprestar(MODEL_CONFIG["triagem_model"], MODEL_CONFIG["temperature"], **opcoes) as llm:
+        with metricas.medir("geracao_llm"):
+            resposta = await llm.ainvoke([HumanMessage(content=prompt)], config=config, stop=stop)
+    limitador["llm"].ajustar_tokens(estimados, _tokens_reais(resposta))
+    return resposta
+
+# Limites de tamanho aplicados na geração das respostas ao usuário
+OPCOES_GERACAO = {
+    "max_output_tokens": GENERATION_CONFIG["max_output_tokens"],
+    "stop": GENERATION_CONFIG["stop_sequences"]
+}
+
+def resposta_interrompida(resposta) -> bool:
+    """True se a geração parou pelo teto de tokens (última frase possivelmente incompleta)"""
+    motivo = str(getattr(resposta, "response_metadata", {}).get("finish_reason", ""))
+    return motivo.upper().endswith("MAX_TOKENS")
+
+# Tag das chamadas ao LLM cujos tokens são transmitidos ao usuário em aprocessar_pergunta
+TAG_STREAM_RESPOSTA = "resposta_stream"
+CONFIG_STREAM_RESPOSTA = {"tags": [TAG_STREAM_RESPOSTA]}
+
 # Função stub para logar interações
 def log_interacao(pergunta, resultado, acao_final):
     # Aqui você pode integrar com um sistema de log real, banco ou arquivo
@@ -46,149 +112,164 @@ api_key = os.getenv("API_KEY")
 docs = []
 retriever = None
 retriever_keywords = None
+vectorstore = None
+manifesto_indice = None
+indice_lexico = None
+
+_embeddings_por_chave = {}
+
+# Função utilitária para obter o modelo de embeddings (com cache compartilhado)
+def get_embeddings(api_key=None):
+    api_key = api_key or os.getenv("API_KEY")
+    if api_key not in _embeddings_por_chave:
+        _embeddings_por_chave[api_key] = EmbeddingsEmCache(
+            GoogleGenerativeAIEmbeddings(
+                model=INDEX_CONFIG["embedding_model"],
+                google_api_key=api_key
+            ),
+            modelo=INDEX_CONFIG["embedding_model"],
+            limitador=limitador["embeddings"],
+            textos_por_requisicao=RATE_LIMIT_CONFIG["embeddings"]["textos_por_requisicao"]
+        )
+    return _embeddings_por_chave[api_key]
+
+
+def estatisticas_cache_embeddings() -> dict:
+    """Estatísticas de acerto do cache de embeddings da API key atual"""
+    emb = _embeddings_por_chave.get(api_key)
+    return emb.get_stats() if emb else {}
+
+
+# Cache semântico de respostas (validado pela versão do índice e pelos chunks recuperados)
+cache_respostas = CacheRespostas()
+
+
+def versao_indice_atual() -> Optional[str]:
+    return manifesto_indice.get("versao_indice") if manifesto_indice else None
+
+
+def impressao_docs(docs_contexto: list) -> str:
+    """Impressão digital dos chunks que compõem o contexto do prompt"""
+    ids = [
+        d.metadata.get("chunk_id") or hashlib.sha1(d.page_content.encode("utf-8")).hexdigest()
+        for d in docs_contexto
+    ]
+    return impressao_contexto(ids, versao_indice_atual())
+
+
+def estatisticas_cache_respostas() -> dict:
+    """Estatísticas de acerto do cache de respostas"""
+    return cache_respostas.get_stats()
+
+
+# Parâmetros das buscas vetoriais
+BUSCA_SIMILARIDADE = {"score_threshold": 0.15, "k": 8}
+BUSCA_MMR = {"k": 4, "fetch_k": 10}
+BUSCA_HIBRIDA = {
+    "k": 6,  # Chunks devolvidos após a fusão
+    "k_denso": BUSCA_SIMILARIDADE["k"],
+    "score_minimo": BUSCA_SIMILARIDADE["score_threshold"],
+    "k_lexical": 8,
+    "k_rrf": 60,  # Constante do reciprocal-rank fusion
+    "pesos": {"denso": 1.0, "lexical": 1.0}
+}
+
+
+def criar_retrievers(vs):
+    """Cria os retrievers de similaridade e MMR sobre o vectorstore"""
+    retriever = vs.as_retriever(
+        search_type="similarity_score_threshold",
+        search_kwargs=dict(BUSCA_SIMILARIDADE)
+    )
+    retriever_keywords = vs.as_retriever(
+        search_type="mmr",
+        search_kwargs=dict(BUSCA_MMR)
+    )
+    return retriever, retriever_keywords
+
+
+def inicializar_indice(docs, api_key):
+    """Carrega o índice persistido (ou reconstrói se o manifesto mudou)"""
+    if not docs or not api_key:
+        return None, None
+    try:
+        vs, manifesto = indice_vetorial.carregar_ou_construir_indice(docs, get_embeddings(api_key))
+        return vs, manifesto
+    except Exception as e:
+        print(f"[AVISO] Erro ao inicializar embeddings: {e}")
+        print(f"[INFO] Sistema entrará em modo fallback com busca textual")
+        return None, None
+
+
+def inicializar_indice_lexico(docs):
+    """Carrega o índice BM25 persistido, retokenizando só arquivos alterados"""
+    if not docs:
+        return None
+    try:
+        indice, _ = indice_lexical.atualizar_indice_lexical(docs=docs)
+        return indice
+    except Exception as e:
+        print(f"[AVISO] Erro ao inicializar índice lexical: {e}")
+        return None
+
 
 # Cache de carregamento de documentos
 if st:
     @st.cache_data(show_spinner=False)
     def carregar_docs_cache():
-        docs = []
-        docs_path = Path("docs")
-        if docs_path.exists():
-            for n in docs_path.glob("*.pdf"):
-                try:
-                    loader = PyMuPDFLoader(str(n))
-                    doc_pages = loader.load()
-                    for page in doc_pages:
-                        page.metadata.update({
-                            "filename": n.name,
-                            "file_size": n.stat().st_size,
-                            "content_type": "pdf_document"
-                        })
-                    docs.extend(doc_pages)
-                except Exception as e:
-                    print(f"[ERRO] Erro ao carregar PDF {n.name}: {e}")
-            for n in docs_path.glob("*.md"):
-                try:
-                    with open(n, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    from langchain_core.documents import Document
-                    md_doc = Document(
-                        page_content=content,
-                        metadata={
-                            "filename": n.name,
-                            "file_size": n.stat().st_size,
-                            "content_type": "markdown_document",
-                            "source": str(n)
-                        }
-                    )
-                    docs.append(md_doc)
-                except Exception as e:
-                    print(f"[ERRO] Erro ao carregar Markdown {n.name}: {e}")
-        return docs
+        return indice_vetorial.carregar_docs()
 
     @st.cache_resource(show_spinner=False)
     def carregar_embeddings_cache(docs, api_key):
-        if not docs or not api_key:
-            return None, None
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""]
-        )
-        chunks = splitter.split_documents(docs)
-        try:
-            embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/gemma-3-27b-it",
-                google_api_key=api_key
-            )
-            vectorstore = FAISS.from_documents(chunks, embeddings)
-            retriever = vectorstore.as_retriever(
-                search_type="similarity_score_threshold",
-                search_kwargs={"score_threshold": 0.15, "k": 8}
-            )
-            retriever_keywords = vectorstore.as_retriever(
-                search_type="mmr",
-                search_kwargs={"k": 4, "fetch_k": 10}
-            )
-            return retriever, retriever_keywords
-        except Exception as e:
-            print(f"[AVISO] Erro ao inicializar embeddings: {e}")
-            print(f"[INFO] Sistema entrará em modo fallback com busca textual")
-            return None, None
+        return inicializar_indice(docs, api_key)
+
+    @st.cache_resource(show_spinner=False)
+    def carregar_indice_lexico_cache(docs):
+        return inicializar_indice_lexico(docs)
 
     def carregar_documentos():
-        global docs, retriever, retriever_keywords, api_key
+        global docs, retriever, retriever_keywords, api_key, vectorstore, manifesto_indice, indice_lexico
         docs = carregar_docs_cache()
-        retriever, retriever_keywords = carregar_embeddings_cache(docs, api_key)
+        indice_lexico = carregar_indice_lexico_cache(docs)
+        vectorstore, manifesto_indice = carregar_embeddings_cache(docs, api_key)
+        retriever, retriever_keywords = criar_retrievers(vectorstore) if vectorstore else (None, None)
 else:
     def carregar_documentos():
-        global docs, retriever, retriever_keywords, api_key
-        docs = []
-        docs_path = Path("docs")
-        if docs_path.exists():
-            for n in docs_path.glob("*.pdf"):
-                try:
-                    loader = PyMuPDFLoader(str(n))
-                    doc_pages = loader.load()
-                    for page in doc_pages:
-                        page.metadata.update({
-                            "filename": n.name,
-                            "file_size": n.stat().st_size,
-                            "content_type": "pdf_document"
-                        })
-                    docs.extend(doc_pages)
-                except Exception as e:
-                    print(f"[ERRO] Erro ao carregar PDF {n.name}: {e}")
-            for n in docs_path.glob("*.md"):
-                try:
-                    with open(n, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    from langchain_core.documents import Document
-                    md_doc = Document(
-                        page_content=content,
-                        metadata={
-                            "filename": n.name,
-                            "file_size": n.stat().st_size,
-                            "content_type": "markdown_document",
-                            "source": str(n)
-                        }
-                    )
-                    docs.append(md_doc)
-                except Exception as e:
-                    print(f"[ERRO] Erro ao carregar Markdown {n.name}: {e}")
+        global docs, retriever, retriever_keywords, api_key, vectorstore, manifesto_indice, indice_lexico
+        docs = indice_vetorial.carregar_docs()
+        indice_lexico = inicializar_indice_lexico(docs)
         retriever = None
         retriever_keywords = None
         if docs:
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=800,
-                chunk_overlap=100,
-                separators=["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""]
-            )
-            chunks = splitter.split_documents(docs)
             if api_key:
-                try:
-                    embeddings = GoogleGenerativeAIEmbeddings(
-                        model="models/gemma-3-27b-it",
-                        google_api_key=api_key
-                    )
-                    vectorstore = FAISS.from_documents(chunks, embeddings)
-                    retriever = vectorstore.as_retriever(
-                        search_type="similarity_score_threshold",
-                        search_kwargs={"score_threshold": 0.15, "k": 8}
-                    )
-                    retriever_keywords = vectorstore.as_retriever(
-                        search_type="mmr",
-                        search_kwargs={"k": 4, "fetch_k": 10}
-                    )
-                except Exception as e:
-                    print(f"[AVISO] Erro ao inicializar embeddings: {e}")
-                    print(f"[INFO] Sistema entrará em modo fallback com busca textual")
-                    retriever = None
-                    retriever_keywords = None
+                vectorstore, manifesto_indice = inicializar_indice(docs, api_key)
+                if vectorstore:
+                    retriever, retriever_keywords = criar_retrievers(vectorstore)
             else:
                 print("[AVISO] API_KEY não encontrada. Funcionalidades RAG não estarão disponíveis.")
-                retriever = None
-                retriever_keywords = None
+
+
+def reindexar_documentos(reconstruir: bool = False) -> dict:
+    """
+    Atualiza o índice em memória e em disco com as mudanças em docs/,
+    embedando apenas arquivos novos ou modificados
+    Retorna o relatório com chunks adicionados, removidos e inalterados
+    """
+    global docs, retriever, retriever_keywords, vectorstore, manifesto_indice, indice_lexico
+    if not api_key:
+        raise RuntimeError("API_KEY não encontrada")
+    if st:
+        carregar_docs_cache.clear()
+        carregar_embeddings_cache.clear()
+        carregar_indice_lexico_cache.clear()
+    docs = indice_vetorial.carregar_docs()
+    vectorstore, manifesto_indice, relatorio = indice_vetorial.atualizar_indice(
+        get_embeddings(api_key), docs=docs, reconstruir=reconstruir
+    )
+    indice_lexico, relatorio["lexico"] = indice_lexical.atualizar_indice_lexical(docs=docs, reconstruir=reconstruir)
+    retriever, retriever_keywords = criar_retrievers(vectorstore) if vectorstore else (None, None)
+    logger.info(f"[INDICE] Reindexação concluída: {relatorio}")
+    return relatorio
 
 
 # Só carrega documentos se rodar como script principal
@@ -285,46 +366,34 @@ def analisar_fallback(mensagem: str) -> dict:
 # Sistema de busca textual alternativo (quando embeddings não estão disponíveis)
 # =========================
 
+# Variações de domínio acrescentadas à consulta lexical
+EXPANSOES_TEXTUAIS = {
+    "aplicinsumo": ["insumo", "agric", "aplicação"],
+    "int.": ["procedure", "função", "sp_"],
+    "origem": ["fonte", "erp", "sistema", "dados"]
+}
+
+
 def buscar_texto_simples(pergunta: str, docs_list: list) -> list:
-    """Busca textual simples quando embeddings não estão disponíveis"""
+    """Busca textual (BM25 sobre os chunks) quando embeddings não estão disponíveis"""
+    global indice_lexico
     if not docs_list:
         return []
-    
+    if indice_lexico is None:
+        # Índice ainda não carregado (ex.: docs passados diretamente): montar em memória uma vez
+        indice_lexico = inicializar_indice_lexico(docs_list)
+        if indice_lexico is None:
+            return []
+
     pergunta_lower = pergunta.lower()
-    palavras_busca = pergunta_lower.split()
-    
-    # Palavras-chave específicas para melhorar a busca
-    palavras_expandidas = []
-    for palavra in palavras_busca:
-        palavras_expandidas.append(palavra)
-        # Adicionar variações comuns
-        if "aplicinsumo" in palavra:
-            palavras_expandidas.extend(["insumo", "agric", "aplicação"])
-        elif "int." in palavra:
-            palavras_expandidas.extend(["procedure", "função", "sp_"])
-        elif "origem" in palavra:
-            palavras_expandidas.extend(["fonte", "erp", "sistema", "dados"])
-    
-    docs_relevantes = []
-    for doc in docs_list:
-        conteudo_lower = doc.page_content.lower()
-        score = 0
-        
-        # Pontuar baseado em matches de palavras
-        for palavra in palavras_expandidas:
-            if palavra in conteudo_lower:
-                score += conteudo_lower.count(palavra)
-        
-        # Bonus para matches exatos de frases importantes
-        if "int.int_aplicinsumoagric" in conteudo_lower and ("aplicinsumo" in pergunta_lower or "int." in pergunta_lower):
-            score += 10
-        
-        if score > 0:
-            docs_relevantes.append((doc, score))
-    
-    # Ordenar por relevância e retornar os melhores
-    docs_relevantes.sort(key=lambda x: x[1], reverse=True)
-    return [doc for doc, score in docs_relevantes[:6]]  # Top 6 documentos
+    termos_extras = [
+        extra
+        for palavra in pergunta_lower.split()
+        for chave, extras in EXPANSOES_TEXTUAIS.items() if chave in palavra
+        for extra in extras
+    ]
+    resultados = indice_lexico.buscar(pergunta, termos_extras=termos_extras)
+    return [doc for doc, score in resultados]  # Top 6 chunks
 
 
 def expandir_busca(pergunta: str) -> list[str]:
@@ -388,7 +457,93 @@ def criar_citacoes_melhoradas(docs: list) -> list[dict]:
     
     return citacoes
 
-def validar_e_corrigir_resposta(resposta: str, pergunta: str, docs: list) -> str:
+# Contadores de qual caminho de controle de tamanho cada resposta seguiu
+metricas_concisao = {
+    'dentro_limite': 0,
+    'interrompida_max_tokens': 0,
+    'aparada_local': 0,
+    'reescrita_llm': 0
+}
+_lock_metricas_concisao = threading.Lock()
+
+def _contar_concisao(caminho: str):
+    with _lock_metricas_concisao:
+        metricas_concisao[caminho] += 1
+
+def estatisticas_concisao() -> dict:
+    """Quantas respostas passaram por cada caminho de controle de tamanho"""
+    with _lock_metricas_concisao:
+        stats = dict(metricas_concisao)
+    total = stats['dentro_limite'] + stats['aparada_local'] + stats['reescrita_llm']
+    stats['taxa_aparada'] = (stats['aparada_local'] / max(total, 1)) * 100
+    stats['taxa_reescrita'] = (stats['reescrita_llm'] / max(total, 1)) * 100
+    return stats
+
+_FIM_FRASE = re.compile(r"(?<=[.!?])\s+")
+_PALAVRAS_PERGUNTA = re.compile(r"\w{4,}")
+
+def aparar_resposta(resposta: str, pergunta: str, max_palavras: int) -> str:
+    """
+    Encurta a resposta localmente, sem chamar o LLM
+    Mantém a primeira frase e completa o limite de palavras com as frases
+    que mais compartilham termos com a pergunta, na ordem original.
+    Frases incompletas no fim (geração interrompida) são descartadas.
+    """
+    frases = []
+    for linha in resposta.splitlines():
+        partes = [p for p in _FIM_FRASE.split(linha.strip()) if p]
+        for i, parte in enumerate(partes):
+            frases.append((parte, i == len(partes) - 1))  # (frase, termina a linha)
+    if not frases:
+        return resposta
+
+    # Última frase sem pontuação final provavelmente foi cortada no meio
+    if len(frases) > 1 and not re.search(r"[.!?:;)`*]$", frases[-1][0]):
+        frases.pop()
+
+    termos = {t.lower() for t in _PALAVRAS_PERGUNTA.findall(pergunta)}
+    def relevancia(indice):
+        palavras_frase = {t.lower() for t in _PALAVRAS_PERGUNTA.findall(frases[indice][0])}
+        return len(termos & palavras_frase) - indice * 0.01  # empate: frase anterior
+
+    escolhidas, total = {0}, len(frases[0][0].split())
+    for i in sorted(range(1, len(frases)), key=relevancia, reverse=True):
+        tamanho = len(frases[i][0].split())
+        if total + tamanho <= max_palavras:
+            escolhidas.add(i)
+            total += tamanho
+
+    if total > max_palavras:  # Primeira frase sozinha já passa do limite
+        return " ".join(frases[0][0].split()[:max_palavras]) + "…"
+
+    partes_saida = []
+    for i in sorted(escolhidas):
+        texto, fim_linha = frases[i]
+        partes_saida.append(texto + ("\n" if fim_linha else " "))
+    resposta_aparada = "".join(partes_saida).strip()
+    if resposta_aparada.count("```") % 2:  # Não deixar bloco de código aberto
+        resposta_aparada += "\n```"
+    return resposta_aparada
+
+def _reescrever_com_llm(resposta: str, pergunta: str) -> Optional[str]:
+    """Resumo por segunda chamada ao LLM (apenas com GENERATION_CONFIG['reescrita_llm'])"""
+    prompt_resumir = f"""
+            Resuma em NO MÁXIMO {STRATEGY_CONFIG["ideal_response_words"]} palavras, mantendo APENAS o essencial:
+            
+            Pergunta: {pergunta}
+            Resposta: {resposta}
+            
+            Versão ultra-resumida (máximo {STRATEGY_CONFIG["ideal_response_words"]} palavras):
+            """
+    try:
+        resposta_nova = invocar_llm(prompt_resumir).content.strip()
+        if len(resposta_nova.split()) < STRATEGY_CONFIG["max_response_words"]:
+            return resposta_nova
+    except Exception:
+        pass
+    return None
+
+def validar_e_corrigir_resposta(resposta: str, pergunta: str, docs: list, interrompida: bool = False) -> str:
     """Valida e corrige a resposta do RAG - PRIORIZANDO MÁXIMA CONCISÃO"""
     resposta_original = resposta
     
@@ -397,29 +552,30 @@ def validar_e_corrigir_resposta(resposta: str, pergunta: str, docs: list) -> str
     
     # 1. Resposta muito longa (MAIS RIGOROSO)
     palavras = len(resposta.split())
-    if palavras > 150:  # Reduzido de 200 para 150
+    if interrompida:
+        _contar_concisao('interrompida_max_tokens')
+    if palavras > CONCISENESS_THRESHOLDS["too_long"]:
         problemas.append("resposta_muito_longa")
-        # Tentar encurtar drasticamente
-        if docs:
-            prompt_resumir = f"""
-            Resuma em NO MÁXIMO 50 palavras, mantendo APENAS o essencial:
-            
-            Pergunta: {pergunta}
-            Resposta: {resposta}
-            
-            Versão ultra-resumida (máximo 50 palavras):
-            """
-            try:
-                resposta_resumida = get_llm().invoke([HumanMessage(content=prompt_resumir)])
-                resposta_nova = resposta_resumida.content.strip()
-                if len(resposta_nova.split()) < 80:  # Aceitar se ficar menor que 80 palavras
-                    resposta = resposta_nova
-            except Exception:
-                pass
-    elif palavras > 100:  # Moderadamente longa
-        problemas.append("resposta_longa")
-    elif palavras < 10:  # Muito curta
-        problemas.append("resposta_muito_curta")
+        resposta_nova = None
+        if docs and GENERATION_CONFIG["reescrita_llm"]:
+            resposta_nova = _reescrever_com_llm(resposta, pergunta)
+        if resposta_nova:
+            resposta = resposta_nova
+            _contar_concisao('reescrita_llm')
+        else:
+            resposta = aparar_resposta(resposta, pergunta, STRATEGY_CONFIG["max_response_words"])
+            _contar_concisao('aparada_local')
+    else:
+        if interrompida:
+            # Dentro do limite, mas a última frase pode ter sido cortada pelo teto de tokens
+            resposta = aparar_resposta(resposta, pergunta, palavras)
+            _contar_concisao('aparada_local')
+        else:
+            _contar_concisao('dentro_limite')
+        if palavras > 100:  # Moderadamente longa
+            problemas.append("resposta_longa")
+        elif palavras < 10:  # Muito curta
+            problemas.append("resposta_muito_curta")
     
     # 2. Detectar introduções desnecessárias
     introducoes_ruins = [
@@ -444,10 +600,9 @@ def validar_e_corrigir_resposta(resposta: str, pergunta: str, docs: list) -> str
     
     return resposta
 
-def gerar_resposta_sem_documentos(pergunta: str) -> str:
-    """Gera uma resposta útil mas CONCISA mesmo sem documentos específicos"""
-    
-    prompt = f"""Você é um Integrador de dados e desenvolvedor ETL da empresa SmartBreeder.
+def montar_prompt_sem_documentos(pergunta: str) -> str:
+    """Prompt BREVE e TÉCNICO para quando nenhum documento foi encontrado"""
+    return f"""Você é um Integrador de dados e desenvolvedor ETL da empresa SmartBreeder.
 
 INSTRUÇÃO: Forneça uma resposta BREVE e TÉCNICA para a pergunta.
 
@@ -460,74 +615,62 @@ REGRAS:
 PERGUNTA: {pergunta}
 
 Resposta técnica:"""
-    
-    resposta = get_llm().invoke([HumanMessage(content=prompt)])
+
+def _formatar_resposta_sem_documentos(resposta) -> str:
     txt = (resposta.content or "").strip()
     
     # Adicionar disclaimer breve
     return f"{txt}\n\n💡 **Para detalhes específicos, consulte a documentação técnica.**"
 
-def perguntar_politica_RAG(pergunta: str) -> dict:
-    try:
-        logger.info(f"[RAG] Iniciando busca para: {pergunta}")
-        
-        if not retriever:
-            logger.warning("[RAG] Retriever não disponível - tentando busca textual")
-            if docs:  # Se temos documentos carregados, usar busca textual
-                docs_relacionados = buscar_texto_simples(pergunta, docs)
-                estrategia = "busca_textual_simples"
-                logger.info(f"[RAG] Busca textual encontrou {len(docs_relacionados)} documentos")
-            else:
-                logger.warning("[RAG] Nenhum documento disponível")
-                return {
-                    "answer": "Sistema de documentos não disponível no momento.",
-                    "citacoes": [],
-                    "contexto_encontrado": False,
-                    "estrategia_usada": "nenhuma"
-                }
-
-        # Estratégia 1: Busca semântica principal
-        logger.info("[RAG] Executando busca semântica principal")
-        docs_relacionados = retriever.invoke(pergunta)
-        estrategia = "similaridade_semantica"
-        logger.info(f"[RAG] Busca principal encontrou {len(docs_relacionados)} documentos")
-        
-        # Estratégia 2: SEMPRE tentar busca expandida com termos relacionados
-        termos_expandidos = expandir_busca(pergunta)
-        logger.info(f"[RAG] Termos expandidos para '{pergunta}': {termos_expandidos}")
-        
-        for termo in termos_expandidos:
-            docs_extra = retriever.invoke(termo)
-            docs_relacionados.extend(docs_extra[:3])  # Aumentei para 3 docs por termo
-            logger.info(f"[RAG] Encontrados {len(docs_extra)} docs para termo '{termo}'")
-        
-        # Estratégia 3: Se poucos resultados, tentar busca por palavras-chave
-        if len(docs_relacionados) < 3 and retriever_keywords:
-            logger.info("[RAG] Executando busca por palavras-chave")
-            docs_keywords = retriever_keywords.invoke(pergunta)
-            docs_relacionados.extend(docs_keywords)
-            estrategia = "semantica_e_palavras_chave_expandida"
-        else:
-            estrategia = "busca_expandida"
-
-        if not docs_relacionados:
-            # Mesmo sem documentos específicos, tentar fornecer resposta útil
-            logger.warning("[RAG] Nenhum documento encontrado, gerando resposta genérica")
-            resposta_generica = gerar_resposta_sem_documentos(pergunta)
-            return {
-                "answer": resposta_generica,
-                "citacoes": [],
-                "contexto_encontrado": False,
-                "estrategia_usada": "resposta_generica"
-            }
-
-        # Remover duplicatas e ordenar por relevância
-        docs_unicos = remover_duplicatas_docs(docs_relacionados)
-        logger.info(f"[RAG] Total de documentos únicos encontrados: {len(docs_unicos)}")
-        contexto = "\n\n".join(d.page_content for d in docs_unicos[:4])  # Limitar contexto
-    
-        # Prompt mais útil e CONCISO
-        prompt = f"""🧠 Prompt: “Desenvolvedor ETL Agroindustrial (usinas de cana-de-açúcar)”
+def gerar_resposta_sem_documentos(pergunta: str) -> str:
+    """Gera uma resposta útil mas CONCISA mesmo sem documentos específicos"""
+    resposta = invocar_llm(montar_prompt_sem_documentos(pergunta), **OPCOES_GERACAO)
+    return _formatar_resposta_sem_documentos(resposta)
+
+async def agerar_resposta_sem_documentos(pergunta: str) -> str:
+    """Versão assíncrona de gerar_resposta_sem_documentos (tokens transmitidos)"""
+    resposta = await ainvocar_llm(montar_prompt_sem_documentos(pergunta), config=CONFIG_STREAM_RESPOSTA,
+                                  **OPCOES_GERACAO)
+    return _formatar_resposta_sem_documentos(resposta)
+
+def vetorizar_consultas(consultas: list[str]) -> list[list[float]]:
+    """Embeda todas as consultas de uma vez (uma única ida à API para as que não estão em cache)"""
+    embeddings = vectorstore.embedding_function
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(consultas)
+    return [embeddings.embed_query(c) for c in consultas]
+
+async def avetorizar_consultas(consultas: list[str]) -> list[list[float]]:
+    """Versão assíncrona de vetorizar_consultas"""
+    embeddings = vectorstore.embedding_function
+    if hasattr(embeddings, "aembed_queries"):
+        return await embeddings.aembed_queries(consultas)
+    return list(await asyncio.gather(*(embeddings.aembed_query(c) for c in consultas)))
+
+def _complementar_com_mmr(docs_relacionados: list, vetor: list[float]) -> tuple[list, str]:
+    """Se a busca híbrida trouxe poucos chunks, completa com MMR reaproveitando o vetor da pergunta"""
+    if len(docs_relacionados) < 3 and retriever_keywords:
+        logger.info("[RAG] Poucos resultados, complementando com MMR")
+        docs_relacionados = docs_relacionados + vectorstore.max_marginal_relevance_search_by_vector(vetor, **BUSCA_MMR)
+        return docs_relacionados, "hibrida_rrf_mmr"
+    return docs_relacionados, "hibrida_rrf"
+
+def selecionar_docs_rag(pergunta: str, termos_expandidos: list[str], vetor: list[float]) -> tuple[list, str]:
+    """Busca híbrida FAISS + BM25 (RRF); os termos expandidos entram só no BM25, sem embeddings extras"""
+    docs_relacionados = busca_hibrida(vectorstore, indice_lexico, pergunta, vetor, BUSCA_HIBRIDA, termos_expandidos)
+    logger.info(f"[RAG] Busca híbrida encontrou {len(docs_relacionados)} chunks")
+    return _complementar_com_mmr(docs_relacionados, vetor)
+
+async def aselecionar_docs_rag(pergunta: str, termos_expandidos: list[str], vetor: list[float]) -> tuple[list, str]:
+    """Versão assíncrona de selecionar_docs_rag"""
+    docs_relacionados = await abusca_hibrida(vectorstore, indice_lexico, pergunta, vetor, BUSCA_HIBRIDA,
+                                             termos_expandidos)
+    logger.info(f"[RAG] Busca híbrida encontrou {len(docs_relacionados)} chunks")
+    return _complementar_com_mmr(docs_relacionados, vetor)
+
+def montar_prompt_rag(pergunta: str, contexto: str) -> str:
+    """Prompt mais útil e CONCISO com o contexto recuperado"""
+    return f"""🧠 Prompt: “Desenvolvedor ETL Agroindustrial (usinas de cana-de-açúcar)”
                         Você deve simular um desenvolvedor ETL pleno/sênior especializado em integração de dados entre sistemas ERP e bancos relacionais, com forte atuação no setor agroindustrial, especialmente em usinas de cana-de-açúcar.
                         Seu papel é projetar, otimizar e automatizar fluxos de dados complexos, garantindo qualidade, performance e rastreabilidade das informações.
                         🧩 Contexto do domínio
@@ -572,41 +715,159 @@ def perguntar_politica_RAG(pergunta: str) -> dict:
 
                         Resposta técnica e direta:"""
 
-        logger.info("[RAG] Executando prompt com LLM")
-        resposta = get_llm().invoke([HumanMessage(content=prompt)])
-        txt = (resposta.content or "").strip()
-
-        # Validar e potencialmente corrigir a resposta
-        resposta_final = validar_e_corrigir_resposta(txt, pergunta, docs_unicos)
-        
-        if "não disponível" in resposta_final.lower() or "não sei" in resposta_final.lower():
-            return {
-                "answer": "Informação não encontrada nos documentos. Recomendo contatar um integrador esclarecimentos específicos.",
-                "citacoes": [],
-                "contexto_encontrado": False,
-                "estrategia_usada": estrategia,
-                "melhorada": False
-            }
-
-        logger.info(f"[RAG] Resposta gerada com sucesso, contexto_encontrado=True")
-        return {
-            "answer": resposta_final,
-            "citacoes": criar_citacoes_melhoradas(docs_unicos),
-            "contexto_encontrado": True,
-            "estrategia_usada": estrategia,
-            "melhorada": resposta_final != txt  # Indica se foi melhorada
-        }
-        
-    except Exception as e:
-        logger.error(f"[RAG] Erro: {type(e).__name__}: {str(e)}")
+def finalizar_resposta_rag(txt: str, pergunta: str, docs_unicos: list, estrategia: str,
+                           interrompida: bool = False) -> dict:
+    """Valida a resposta gerada e monta o retorno do RAG"""
+    # Validar e potencialmente corrigir a resposta
+    resposta_final = validar_e_corrigir_resposta(txt, pergunta, docs_unicos, interrompida)
+    
+    if "não disponível" in resposta_final.lower() or "não sei" in resposta_final.lower():
         return {
-            "answer": f"Erro no sistema RAG: {str(e)}",
+            "answer": "Informação não encontrada nos documentos. Recomendo contatar um integrador esclarecimentos específicos.",
             "citacoes": [],
             "contexto_encontrado": False,
-            "estrategia_usada": "erro",
+            "estrategia_usada": estrategia,
             "melhorada": False
         }
 
+    logger.info(f"[RAG] Resposta gerada com sucesso, contexto_encontrado=True")
+    return {
+        "answer": resposta_final,
+        "citacoes": criar_citacoes_melhoradas(docs_unicos),
+        "contexto_encontrado": True,
+        "estrategia_usada": estrategia,
+        "melhorada": resposta_final != txt  # Indica se foi melhorada
+    }
+
+def _resposta_rag_erro(e: Exception) -> dict:
+    logger.error(f"[RAG] Erro: {type(e).__name__}: {str(e)}")
+    return {
+        "answer": f"Erro no sistema RAG: {str(e)}",
+        "citacoes": [],
+        "contexto_encontrado": False,
+        "estrategia_usada": "erro",
+        "melhorada": False,
+        "erro": f"{type(e).__name__}: {str(e)}"  # Permite ao batch classificar e repetir
+    }
+
+def _resposta_generica_rag(resposta_generica: str) -> dict:
+    return {
+        "answer": resposta_generica,
+        "citacoes": [],
+        "contexto_encontrado": False,
+        "estrategia_usada": "resposta_generica"
+    }
+
+def perguntar_politica_RAG(pergunta: str) -> dict:
+    try:
+        logger.info(f"[RAG] Iniciando busca para: {pergunta}")
+        
+        if not retriever:
+            logger.warning("[RAG] Retriever não disponível - tentando busca textual")
+            if docs:  # Se temos documentos carregados, usar busca textual
+                docs_relacionados = buscar_texto_simples(pergunta, docs)
+                estrategia = "busca_textual_simples"
+                logger.info(f"[RAG] Busca textual encontrou {len(docs_relacionados)} documentos")
+            else:
+                logger.warning("[RAG] Nenhum documento disponível")
+                return {
+                    "answer": "Sistema de documentos não disponível no momento.",
+                    "citacoes": [],
+                    "contexto_encontrado": False,
+                    "estrategia_usada": "nenhuma"
+                }
+
+        # Mesma pergunta sobre o mesmo índice: resposta já conhecida
+        with metricas.medir("cache"):
+            em_cache = cache_respostas.buscar_exata(pergunta, versao_indice_atual())
+        if em_cache:
+            logger.info("[RAG] Resposta servida pelo cache (exato)")
+            return em_cache
+
+        # Busca híbrida: só a pergunta é embedada; termos expandidos reforçam o BM25
+        termos_expandidos = expandir_busca(pergunta)
+        logger.info(f"[RAG] Termos expandidos para '{pergunta}': {termos_expandidos}")
+        with metricas.medir("recuperacao"):
+            vetor = vetorizar_consultas([pergunta])[0]
+            docs_relacionados, estrategia = selecionar_docs_rag(pergunta, termos_expandidos, vetor)
+
+        if not docs_relacionados:
+            # Mesmo sem documentos específicos, tentar fornecer resposta útil
+            logger.warning("[RAG] Nenhum documento encontrado, gerando resposta genérica")
+            return _resposta_generica_rag(gerar_resposta_sem_documentos(pergunta))
+
+        # Remover duplicatas e ordenar por relevância
+        docs_unicos = remover_duplicatas_docs(docs_relacionados)
+        logger.info(f"[RAG] Total de documentos únicos encontrados: {len(docs_unicos)}")
+        contexto = "\n\n".join(d.page_content for d in docs_unicos[:4])  # Limitar contexto
+
+        # Pergunta parecida com o mesmo contexto recuperado: reaproveitar a resposta
+        impressao = impressao_docs(docs_unicos[:4])
+        with metricas.medir("cache"):
+            em_cache = cache_respostas.buscar_semelhante(vetor, impressao)
+        if em_cache:
+            return em_cache
+
+        logger.info("[RAG] Executando prompt com LLM")
+        resposta = invocar_llm(montar_prompt_rag(pergunta, contexto), **OPCOES_GERACAO)
+        txt = (resposta.content or "").strip()
+        with metricas.medir("pos_processamento"):
+            resultado = finalizar_resposta_rag(txt, pergunta, docs_unicos, estrategia, resposta_interrompida(resposta))
+        if resultado["contexto_encontrado"]:
+            cache_respostas.armazenar(pergunta, vetor, impressao, versao_indice_atual(), resultado)
+        return resultado
+        
+    except Exception as e:
+        return _resposta_rag_erro(e)
+
+async def aperguntar_politica_RAG(pergunta: str) -> dict:
+    """Versão assíncrona de perguntar_politica_RAG; os tokens da resposta são transmitidos"""
+    try:
+        logger.info(f"[RAG] Iniciando busca assíncrona para: {pergunta}")
+        if not retriever:
+            return await asyncio.to_thread(perguntar_politica_RAG, pergunta)
+
+        with metricas.medir("cache"):
+            em_cache = cache_respostas.buscar_exata(pergunta, versao_indice_atual())
+        if em_cache:
+            logger.info("[RAG] Resposta servida pelo cache (exato)")
+            return em_cache
+
+        termos_expandidos = expandir_busca(pergunta)
+        logger.info(f"[RAG] Termos expandidos para '{pergunta}': {termos_expandidos}")
+        with metricas.medir("recuperacao"):
+            vetor = (await avetorizar_consultas([pergunta]))[0]
+            docs_relacionados, estrategia = await aselecionar_docs_rag(pergunta, termos_expandidos, vetor)
+
+        if not docs_relacionados:
+            logger.warning("[RAG] Nenhum documento encontrado, gerando resposta genérica")
+            return _resposta_generica_rag(await agerar_resposta_sem_documentos(pergunta))
+
+        docs_unicos = remover_duplicatas_docs(docs_relacionados)
+        logger.info(f"[RAG] Total de documentos únicos encontrados: {len(docs_unicos)}")
+        contexto = "\n\n".join(d.page_content for d in docs_unicos[:4])
+
+        impressao = impressao_docs(docs_unicos[:4])
+        with metricas.medir("cache"):
+            em_cache = cache_respostas.buscar_semelhante(vetor, impressao)
+        if em_cache:
+            return em_cache
+
+        logger.info("[RAG] Executando prompt com LLM (stream)")
+        resposta = await ainvocar_llm(montar_prompt_rag(pergunta, contexto), config=CONFIG_STREAM_RESPOSTA,
+                                      **OPCOES_GERACAO)
+        txt = (resposta.content or "").strip()
+        # A validação pode chamar o LLM de forma síncrona (reescrita opt-in); não bloquear o event loop
+        with metricas.medir("pos_processamento"):
+            resultado = await asyncio.to_thread(finalizar_resposta_rag, txt, pergunta, docs_unicos, estrategia,
+                                                resposta_interrompida(resposta))
+        if resultado["contexto_encontrado"]:
+            cache_respostas.armazenar(pergunta, vetor, impressao, versao_indice_atual(), resultado)
+        return resultado
+
+    except Exception as e:
+        return _resposta_rag_erro(e)
+
 # =========================
 # Fluxo de decisão aprimorado
 # =========================
@@ -618,40 +879,55 @@ class AgentState(TypedDict, total=False):
     acao_final: str
     historico_tentativas: list[str]
     categoria: str
+    erro: str
+
 
 
+def _atualizacao_auto_resolver(state: AgentState, resposta_rag: dict) -> AgentState:
+    logger.info(f"[AUTO_RESOLVER] RAG retornou: contexto_encontrado={resposta_rag['contexto_encontrado']}")
+    
+    update: AgentState = {
+        "resposta": resposta_rag["answer"],
+        "citacoes": resposta_rag.get("citacoes", []),
+        "rag_sucesso": resposta_rag["contexto_encontrado"],
+        "historico_tentativas": state.get("historico_tentativas", []) + ["auto_resolver"]
+    }
+    if resposta_rag.get("erro"):
+        update["erro"] = resposta_rag["erro"]
+    
+    # Decisão baseada no sucesso do RAG
+    if resposta_rag["contexto_encontrado"]:
+        update["acao_final"] = "AUTO_RESOLVER"
+    else:
+        update["acao_final"] = "AUTO_RESOLVER"  # Sempre tenta resolver
+    
+    logger.info(f"[AUTO_RESOLVER] Finalizando com acao_final: {update['acao_final']}")
+    return update
+
+def _erro_auto_resolver(state: AgentState, e: Exception) -> AgentState:
+    logger.error(f"[AUTO_RESOLVER] Erro: {type(e).__name__}: {str(e)}")
+    return {
+        "resposta": f"Erro no processamento automático: {str(e)}",
+        "citacoes": [],
+        "rag_sucesso": False,
+        "acao_final": "ERRO",
+        "erro": f"{type(e).__name__}: {str(e)}",
+        "historico_tentativas": state.get("historico_tentativas", []) + ["auto_resolver_erro"]
+    }
 
 def node_auto_resolver(state: AgentState) -> AgentState:
     try:
         logger.info(f"[AUTO_RESOLVER] Iniciando para pergunta: {state['pergunta']}")
-        resposta_rag = perguntar_politica_RAG(state["pergunta"])
-        logger.info(f"[AUTO_RESOLVER] RAG retornou: contexto_encontrado={resposta_rag['contexto_encontrado']}")
-        
-        update: AgentState = {
-            "resposta": resposta_rag["answer"],
-            "citacoes": resposta_rag.get("citacoes", []),
-            "rag_sucesso": resposta_rag["contexto_encontrado"],
-            "historico_tentativas": state.get("historico_tentativas", []) + ["auto_resolver"]
-        }
-        
-        # Decisão baseada no sucesso do RAG
-        if resposta_rag["contexto_encontrado"]:
-            update["acao_final"] = "AUTO_RESOLVER"
-        else:
-            update["acao_final"] = "AUTO_RESOLVER"  # Sempre tenta resolver
-        
-        logger.info(f"[AUTO_RESOLVER] Finalizando com acao_final: {update['acao_final']}")
-        return update
-        
+        return _atualizacao_auto_resolver(state, perguntar_politica_RAG(state["pergunta"]))
     except Exception as e:
-        logger.error(f"[AUTO_RESOLVER] Erro: {type(e).__name__}: {str(e)}")
-        return {
-            "resposta": f"Erro no processamento automático: {str(e)}",
-            "citacoes": [],
-            "rag_sucesso": False,
-            "acao_final": "ERRO",
-            "historico_tentativas": state.get("historico_tentativas", []) + ["auto_resolver_erro"]
-        }
+        return _erro_auto_resolver(state, e)
+
+async def anode_auto_resolver(state: AgentState) -> AgentState:
+    try:
+        logger.info(f"[AUTO_RESOLVER] Iniciando (async) para pergunta: {state['pergunta']}")
+        return _atualizacao_auto_resolver(state, await aperguntar_politica_RAG(state["pergunta"]))
+    except Exception as e:
+        return _erro_auto_resolver(state, e)
 
 def node_pedir_info(state: AgentState) -> AgentState:
     # Resposta mais concisa para pedir informações
@@ -683,7 +959,8 @@ def decidir_pos_auto_resolver(state: AgentState) -> str:
 
 
 workflow = StateGraph(AgentState)
-workflow.add_node("auto_resolver", node_auto_resolver)
+# grafo.invoke usa a versão síncrona do nó; grafo.ainvoke/astream usa a assíncrona
+workflow.add_node("auto_resolver", RunnableLambda(node_auto_resolver, afunc=anode_auto_resolver, name="auto_resolver"))
 workflow.add_node("pedir_info", node_pedir_info)
 workflow.add_edge(START, "auto_resolver")
 workflow.add_conditional_edges("auto_resolver", decidir_pos_auto_resolver, {
@@ -693,6 +970,72 @@ workflow.add_conditional_edges("auto_resolver", decidir_pos_auto_resolver, {
 workflow.add_edge("pedir_info", END)
 grafo = workflow.compile()
 
+def _verificar_pre_condicoes(pergunta: str) -> Optional[dict]:
+    """Respostas imediatas para pergunta vazia ou API_KEY ausente (None = seguir)"""
+    if not pergunta.strip():
+        return {
+            "resposta": "Por favor, faça uma pergunta específica sobre procedimentos da integração.",
+            "citacoes": [],
+            "acao_final": "PEDIR_INFO",
+            "categoria": "GERAL",
+            "melhorada": False,
+            "feedback_id": None
+        }
+    
+    # Verificar se a API key está disponível
+    if not api_key:
+        logger.error("API_KEY não encontrada")
+        return {
+            "resposta": "Erro de configuração: API_KEY não encontrada. Verifique suas configurações.",
+            "citacoes": [],
+            "acao_final": "ERRO",
+            "categoria": "ERRO",
+            "erro": "API_KEY não encontrada",
+            "melhorada": False,
+            "feedback_id": None
+        }
+    return None
+
+def _processar_sem_retriever(pergunta: str, historico_conversa: list = None) -> dict:
+    logger.warning("Sistema de embeddings não disponível - usando modo inteligente")
+    # Em vez de fallback básico, tentar busca textual se temos documentos
+    if docs:
+        logger.info("Tentando busca textual nos documentos carregados")
+        return processar_pergunta_com_busca_textual(pergunta, historico_conversa)
+    else:
+        logger.warning("Nenhum documento disponível - usando modo fallback básico")
+        return processar_pergunta_fallback(pergunta, historico_conversa)
+
+def _finalizar_resultado(pergunta: str, resultado: dict) -> dict:
+    logger.info(f"Resultado do grafo: {resultado.get('acao_final', 'N/A')}")
+    
+    # Log da interação
+    log_interacao(pergunta, resultado, resultado.get("acao_final", "ERRO"))
+    
+    # Enriquecer resposta com metadados
+    resultado["timestamp"] = datetime.now().isoformat()
+    
+    # Verificar se precisa de ajustes baseado em feedback histórico
+    ajustes = verificar_ajustes_necessarios(pergunta, resultado)
+    if ajustes:
+        resultado["ajustes_aplicados"] = ajustes
+    
+    return resultado
+
+def _resultado_erro_interno(e: Exception) -> dict:
+    logger.error(f"Erro ao processar pergunta: {type(e).__name__}: {str(e)}")
+    import traceback
+    logger.error(f"Traceback: {traceback.format_exc()}")
+    return {
+        "resposta": f"Ocorreu um erro interno ({type(e).__name__}). Por favor, tente novamente ou contate o suporte.",
+        "citacoes": [],
+        "acao_final": "ERRO",
+        "categoria": "ERRO",
+        "erro": f"{type(e).__name__}: {str(e)}",
+        "melhorada": False,
+        "feedback_id": None
+    }
+
 def processar_pergunta(pergunta: str, historico_conversa: list = None) -> dict:
     """
     Função principal melhorada para processar perguntas
@@ -700,47 +1043,15 @@ def processar_pergunta(pergunta: str, historico_conversa: list = None) -> dict:
     """
     try:
         logger.info(f"Iniciando processamento da pergunta: {pergunta}")
+        historico_conversa = _janela_historico(historico_conversa)
         
-        # Garantir que o LLM está devidamente inicializado
-        try:
-            get_llm()
-        except Exception as e:
-            logger.error(f"Erro ao inicializar LLM: {e}")
-            # Apenas loga o erro, não tenta resetar LLM (função removida)
-        
-        if not pergunta.strip():
-            return {
-                "resposta": "Por favor, faça uma pergunta específica sobre procedimentos da integração.",
-                "citacoes": [],
-                "acao_final": "PEDIR_INFO",
-                "categoria": "GERAL",
-                "melhorada": False,
-                "feedback_id": None
-            }
-        
-        # Verificar se a API key está disponível
-        if not api_key:
-            logger.error("API_KEY não encontrada")
-            return {
-                "resposta": "Erro de configuração: API_KEY não encontrada. Verifique suas configurações.",
-                "citacoes": [],
-                "acao_final": "ERRO",
-                "categoria": "ERRO",
-                "erro": "API_KEY não encontrada",
-                "melhorada": False,
-                "feedback_id": None
-            }
+        resposta_imediata = _verificar_pre_condicoes(pergunta)
+        if resposta_imediata:
+            return resposta_imediata
         
         # Verificar se o retriever está inicializado - MODO FALLBACK SE NECESSÁRIO
         if retriever is None:
-            logger.warning("Sistema de embeddings não disponível - usando modo inteligente")
-            # Em vez de fallback básico, tentar busca textual se temos documentos
-            if docs:
-                logger.info("Tentando busca textual nos documentos carregados")
-                return processar_pergunta_com_busca_textual(pergunta, historico_conversa)
-            else:
-                logger.warning("Nenhum documento disponível - usando modo fallback básico")
-                return processar_pergunta_fallback(pergunta, historico_conversa)
+            return _processar_sem_retriever(pergunta, historico_conversa)
         
         # Analisar contexto do histórico para perguntas vagas
         logger.info("Analisando contexto do histórico")
@@ -750,34 +1061,81 @@ def processar_pergunta(pergunta: str, historico_conversa: list = None) -> dict:
         # Executar o workflow
         logger.info("Executando workflow do grafo")
         resultado = grafo.invoke({"pergunta": pergunta_contextualizada})
-        logger.info(f"Resultado do grafo: {resultado.get('acao_final', 'N/A')}")
+        return _finalizar_resultado(pergunta, resultado)
+        
+    except Exception as e:
+        return _resultado_erro_interno(e)
+
+async def aprocessar_pergunta(pergunta: str, historico_conversa: list = None):
+    """
+    Versão assíncrona de processar_pergunta com streaming da resposta
+    Gera eventos {"tipo": "token", "texto": ...} conforme o LLM responde e,
+    por último, {"tipo": "final", "resultado": ...} com o mesmo dicionário
+    de processar_pergunta (incluindo as citações)
+    """
+    try:
+        logger.info(f"Iniciando processamento assíncrono da pergunta: {pergunta}")
+        historico_conversa = _janela_historico(historico_conversa)
         
-        # Log da interação
-        log_interacao(pergunta, resultado, resultado.get("acao_final", "ERRO"))
+        resposta_imediata = _verificar_pre_condicoes(pergunta)
+        if resposta_imediata:
+            yield {"tipo": "final", "resultado": resposta_imediata}
+            return
         
-        # Enriquecer resposta com metadados
-        resultado["timestamp"] = datetime.now().isoformat()
+        if retriever is None:
+            resultado = await asyncio.to_thread(_processar_sem_retriever, pergunta, historico_conversa)
+            yield {"tipo": "final", "resultado": resultado}
+            return
         
-        # Verificar se precisa de ajustes baseado em feedback histórico
-        ajustes = verificar_ajustes_necessarios(pergunta, resultado)
-        if ajustes:
-            resultado["ajustes_aplicados"] = ajustes
+        pergunta_contextualizada = analisar_contexto_historico(pergunta, historico_conversa)
+        logger.info(f"Pergunta contextualizada: {pergunta_contextualizada}")
         
-        return resultado
+        resultado = {}
+        async for modo, dados in grafo.astream({"pergunta": pergunta_contextualizada},
+                                               stream_mode=["messages", "values"]):
+            if modo == "values":
+                resultado = dados
+                continue
+            chunk, metadata = dados
+            if TAG_STREAM_RESPOSTA in metadata.get("tags", []) and isinstance(chunk.content, str) and chunk.content:
+                yield {"tipo": "token", "texto": chunk.content}
+        
+        yield {"tipo": "final", "resultado": _finalizar_resultado(pergunta, dict(resultado))}
         
     except Exception as e:
-        logger.error(f"Erro ao processar pergunta: {type(e).__name__}: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        return {
-            "resposta": f"Ocorreu um erro interno ({type(e).__name__}). Por favor, tente novamente ou contate o suporte.",
-            "citacoes": [],
-            "acao_final": "ERRO",
-            "categoria": "ERRO",
-            "erro": f"{type(e).__name__}: {str(e)}",
-            "melhorada": False,
-            "feedback_id": None
-        }
+        yield {"tipo": "final", "resultado": _resultado_erro_interno(e)}
+
+# Event loop de fundo único: os clientes assíncronos do LLM ficam presos ao loop
+# em que foram criados, então todas as chamadas síncronas reutilizam o mesmo
+_loop_async = None
+_loop_async_lock = threading.Lock()
+
+def _obter_loop_async() -> asyncio.AbstractEventLoop:
+    global _loop_async
+    with _loop_async_lock:
+        if _loop_async is None:
+            _loop_async = asyncio.new_event_loop()
+            threading.Thread(target=_loop_async.run_forever, name="main-async-loop", daemon=True).start()
+    return _loop_async
+
+def processar_pergunta_stream(pergunta: str, historico_conversa: list = None):
+    """Itera de forma síncrona os eventos de aprocessar_pergunta (uso no Streamlit)"""
+    loop = _obter_loop_async()
+    eventos = aprocessar_pergunta(pergunta, historico_conversa)
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(eventos.__anext__(), loop).result()
+            except StopAsyncIteration:
+                break
+    finally:
+        asyncio.run_coroutine_threadsafe(eventos.aclose(), loop).result()
+
+def _janela_historico(historico_conversa: list = None) -> list:
+    """Últimos turnos da conversa: o custo não cresce com o tamanho da sessão"""
+    if not historico_conversa:
+        return []
+    return historico_conversa[-STRATEGY_CONFIG["janela_historico"]:]
 
 def analisar_contexto_historico(pergunta: str, historico_conversa: list = None) -> str:
     """Analisa o contexto do histórico para enriquecer perguntas vagas"""
@@ -843,8 +1201,8 @@ def analisar_contexto_historico(pergunta: str, historico_conversa: list = None)
         ultima_resposta_tecnica = None
         ultimo_assunto = None
         
-        # Procurar nas últimas 5 mensagens (mais contexto)
-        for item in reversed(historico_conversa[-5:]):
+        # Procurar nas últimas mensagens (janela_historico)
+        for item in reversed(_janela_historico(historico_conversa)):
             # Relaxar os critérios - qualquer resposta que não seja erro
             if item.get("acao") == "AUTO_RESOLVER" and item.get("resposta"):
                 ultima_resposta_tecnica = item.get("resposta", "")
@@ -945,11 +1303,12 @@ CONTEXTO DISPONÍVEL:
 
 Resposta técnica e direta:"""
 
-        resposta = get_llm().invoke([HumanMessage(content=prompt)])
+        resposta = invocar_llm(prompt, **OPCOES_GERACAO)
         resposta_texto = (resposta.content or "").strip()
         
         # Validar e corrigir resposta
-        resposta_final = validar_e_corrigir_resposta(resposta_texto, pergunta, docs_relacionados)
+        resposta_final = validar_e_corrigir_resposta(resposta_texto, pergunta, docs_relacionados,
+                                                     resposta_interrompida(resposta))
         
         # Adicionar disclaimer sobre busca textual
         resposta_final += "\n\n🔍 **Nota:** Busca realizada por texto (sistema de embeddings temporariamente indisponível)."
@@ -1001,7 +1360,7 @@ PERGUNTA: {pergunta}
 
 Resposta técnica (baseada em conhecimento geral):"""
 
-        resposta = get_llm().invoke([HumanMessage(content=prompt_fallback)])
+        resposta = invocar_llm(prompt_fallback)
         resposta_texto = (resposta.content or "").strip()
         
         resposta_final = resposta_texto
@@ -0,0 +1,177 @@
+"""
+Métricas de execução: contadores e histogramas de latência por estágio
+Cada thread grava no seu próprio fragmento (sem lock no caminho quente);
+fragmentos de threads encerradas são incorporados a um acumulador base, então
+a memória não cresce com as threads criadas por cada lote. O snapshot soma
+os fragmentos e estima p50/p95/p99 a partir de buckets logarítmicos.
+Exporta em JSON ou no formato texto do Prometheus.
+
+Estágios instrumentados: cache, espera_cota, recuperacao, geracao_llm,
+pos_processamento e, no batch, cache_lote, espera_vaga e item.
+"""
+
+import json
+import math
+import time
+import bisect
+import weakref
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Limites dos buckets: 0,5 ms a ~10 min, crescendo 20% (erro relativo dos percentis <= 20%)
+_LIMITES: List[float] = []
+_limite = 0.0005
+while _limite < 600:
+    _LIMITES.append(_limite)
+    _limite *= 1.2
+_LIMITES.append(math.inf)
+
+PERCENTIS = (0.5, 0.95, 0.99)
+
+
+class _Fragmento:
+    """Dados de uma única thread: só ela escreve, o snapshot apenas lê"""
+
+    def __init__(self, thread: Optional[threading.Thread] = None):
+        self.contadores: Dict[str, float] = {}
+        self.buckets: Dict[str, List[int]] = {}
+        self.somas: Dict[str, float] = {}
+        self.maximos: Dict[str, float] = {}
+        self._thread = weakref.ref(thread) if thread is not None else None
+
+    def encerrado(self) -> bool:
+        """A thread dona terminou: o fragmento não recebe mais escritas"""
+        thread = self._thread() if self._thread is not None else None
+        return thread is None or not thread.is_alive()
+
+    def incorporar(self, outro: "_Fragmento"):
+        """Soma os dados de outro fragmento a este"""
+        for nome, valor in list(outro.contadores.items()):
+            self.contadores[nome] = self.contadores.get(nome, 0) + valor
+        for estagio, valores in list(outro.buckets.items()):
+            total = self.buckets.setdefault(estagio, [0] * len(_LIMITES))
+            for i, n in enumerate(list(valores)):
+                total[i] += n
+            self.somas[estagio] = self.somas.get(estagio, 0.0) + outro.somas.get(estagio, 0.0)
+            self.maximos[estagio] = max(self.maximos.get(estagio, 0.0), outro.maximos.get(estagio, 0.0))
+
+
+def _percentil(buckets: List[int], total: int, q: float, maximo: float) -> float:
+    """Interpolação linear dentro do bucket que contém o q-ésimo valor"""
+    alvo = q * total
+    acumulado = 0
+    for i, n in enumerate(buckets):
+        if n and acumulado + n >= alvo:
+            inferior = _LIMITES[i - 1] if i else 0.0
+            superior = min(_LIMITES[i], maximo)
+            return inferior + (superior - inferior) * (alvo - acumulado) / n
+        acumulado += n
+    return maximo
+
+
+class RegistroMetricas:
+    """Registro de contadores e latências, seguro para várias threads"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._fragmentos: List[_Fragmento] = []
+        self._base = _Fragmento()  # Dados das threads já encerradas
+        self._lock = threading.Lock()  # Registro de fragmentos e acesso à base
+
+    def _fragmento(self) -> _Fragmento:
+        fragmento = getattr(self._local, "fragmento", None)
+        if fragmento is None:
+            fragmento = _Fragmento(threading.current_thread())
+            with self._lock:
+                self._recolher_encerrados()
+                self._fragmentos.append(fragmento)
+            self._local.fragmento = fragmento
+        return fragmento
+
+    def _recolher_encerrados(self):
+        """Incorpora à base os fragmentos de threads encerradas (chamar com o lock)"""
+        vivos = []
+        for fragmento in self._fragmentos:
+            if fragmento.encerrado():
+                self._base.incorporar(fragmento)
+            else:
+                vivos.append(fragmento)
+        self._fragmentos = vivos
+
+    def incrementar(self, nome: str, valor: float = 1):
+        f = self._fragmento()
+        f.contadores[nome] = f.contadores.get(nome, 0) + valor
+
+    def observar(self, estagio: str, segundos: float):
+        f = self._fragmento()
+        buckets = f.buckets.get(estagio)
+        if buckets is None:
+            buckets = f.buckets[estagio] = [0] * len(_LIMITES)
+        buckets[bisect.bisect_left(_LIMITES, segundos)] += 1
+        f.somas[estagio] = f.somas.get(estagio, 0.0) + segundos
+        if segundos > f.maximos.get(estagio, 0.0):
+            f.maximos[estagio] = segundos
+
+    @contextmanager
+    def medir(self, estagio: str):
+        """Mede o bloco, inclusive quando ele termina com exceção"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(estagio, time.perf_counter() - inicio)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Soma dos fragmentos: contadores e, por estágio, contagem, média, p50/p95/p99 e máximo"""
+        soma = _Fragmento()
+        with self._lock:
+            self._recolher_encerrados()
+            soma.incorporar(self._base)
+            fragmentos = list(self._fragmentos)
+        for f in fragmentos:
+            soma.incorporar(f)
+        buckets, somas, maximos = soma.buckets, soma.somas, soma.maximos
+
+        latencias = {}
+        for estagio, valores in sorted(buckets.items()):
+            total = sum(valores)
+            if not total:
+                continue
+            estatisticas = {'count': total, 'media_s': somas[estagio] / total, 'soma_s': somas[estagio],
+                            'max_s': maximos[estagio]}
+            for q in PERCENTIS:
+                estatisticas[f"p{int(q * 100)}_s"] = _percentil(valores, total, q, maximos[estagio])
+            latencias[estagio] = {k: (round(v, 6) if isinstance(v, float) else v) for k, v in estatisticas.items()}
+        return {'contadores': dict(sorted(soma.contadores.items())), 'latencias': latencias}
+
+    def para_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def para_prometheus(self, prefixo: str = "ia_integrador") -> str:
+        """Formato texto do Prometheus: contadores e um summary de latência por estágio"""
+        snap = self.snapshot()
+        linhas = []
+        for nome, valor in snap['contadores'].items():
+            metrica = f"{prefixo}_{nome}_total"
+            linhas += [f"# TYPE {metrica} counter", f"{metrica} {valor}"]
+        if snap['latencias']:
+            metrica = f"{prefixo}_latencia_segundos"
+            linhas.append(f"# TYPE {metrica} summary")
+            for estagio, est in snap['latencias'].items():
+                for q in PERCENTIS:
+                    linhas.append(f'{metrica}{{estagio="{estagio}",quantile="{q}"}} {est[f"p{int(q * 100)}_s"]}')
+                linhas.append(f'{metrica}_sum{{estagio="{estagio}"}} {est["soma_s"]}')
+                linhas.append(f'{metrica}_count{{estagio="{estagio}"}} {est["count"]}')
+        return "\n".join(linhas) + "\n"
+
+    def reset(self):
+        """Descarta tudo (os fragmentos das threads são recriados sob demanda)"""
+        with self._lock:
+            self._fragmentos = []
+            self._base = _Fragmento()
+        self._local = threading.local()
+
+
+# Registro global compartilhado por main e batch_processor
+metricas = RegistroMetricas()
@@ -0,0 +1,184 @@
+"""
+Limitação de taxa por token bucket para as APIs do Google
+Cada endpoint (LLM, embeddings) tem dois baldes independentes: requisições
+por segundo (com rajada) e tokens por minuto. A reserva é feita sob o lock
+e a espera acontece fora dele, então várias threads aguardam em paralelo
+e os workers ficam ocupados até o limite configurado.
+"""
+
+import time
+import asyncio
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token)"""
+    return max(1, len(texto or "") // 4)
+
+
+class BaldeTokens:
+    """
+    Token bucket com reserva: quem chega reserva a quantidade e recebe o tempo
+    de espera até ela estar disponível. O saldo pode ficar negativo, o que
+    ordena as reservas seguintes sem que ninguém durma segurando o lock.
+    """
+
+    def __init__(self, taxa_por_segundo: float, capacidade: float,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.taxa = taxa_por_segundo
+        self.capacidade = max(capacidade, 1.0)
+        self._relogio = relogio  # Injetável para testes determinísticos
+        self.saldo = self.capacidade
+        self.ultima_recarga = relogio()
+        self._lock = Lock()
+
+    def _recarregar(self, agora: float):
+        self.saldo = min(self.capacidade, self.saldo + (agora - self.ultima_recarga) * self.taxa)
+        self.ultima_recarga = agora
+
+    def reservar(self, quantidade: float) -> float:
+        """Reserva a quantidade e devolve quantos segundos esperar (0 = liberado)"""
+        if self.taxa <= 0:
+            return 0.0
+        with self._lock:
+            self._recarregar(self._relogio())
+            self.saldo -= quantidade
+            return 0.0 if self.saldo >= 0 else -self.saldo / self.taxa
+
+    def tentar_reservar(self, quantidade: float) -> bool:
+        """Reserva apenas se houver saldo agora (nunca cria espera)"""
+        if self.taxa <= 0:
+            return True
+        with self._lock:
+            self._recarregar(self._relogio())
+            if self.saldo < quantidade:
+                return False
+            self.saldo -= quantidade
+            return True
+
+    def devolver(self, quantidade: float):
+        """Ajusta o saldo (positivo devolve, negativo consome mais)"""
+        if self.taxa <= 0:
+            return
+        with self._lock:
+            self.saldo = min(self.capacidade, self.saldo + quantidade)
+
+    def configurar(self, taxa_por_segundo: float, capacidade: float):
+        with self._lock:
+            self._recarregar(self._relogio())
+            self.taxa = taxa_por_segundo
+            self.capacidade = max(capacidade, 1.0)
+            self.saldo = min(self.saldo, self.capacidade)
+
+
+class LimitadorEndpoint:
+    """Orçamentos de requisições/s e tokens/min de um endpoint, com contadores"""
+
+    def __init__(self, nome: str, rps: float, rajada: float, tpm: float,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.nome = nome
+        self.requisicoes = BaldeTokens(rps, rajada, relogio)
+        # Tokens por minuto: recarga contínua e rajada de um minuto inteiro
+        self.tokens = BaldeTokens(tpm / 60.0, tpm, relogio)
+        self._lock = Lock()
+        self.stats = {
+            'aquisicoes': 0,
+            'throttles': 0,
+            'rejeicoes': 0,
+            'espera_total_s': 0.0,
+            'espera_max_s': 0.0,
+            'tokens_reservados': 0
+        }
+
+    def _reservar(self, requisicoes: int, tokens: int) -> float:
+        espera = max(self.requisicoes.reservar(requisicoes), self.tokens.reservar(tokens))
+        with self._lock:
+            self.stats['aquisicoes'] += 1
+            self.stats['tokens_reservados'] += tokens
+            if espera > 0:
+                self.stats['throttles'] += 1
+                self.stats['espera_total_s'] += espera
+                self.stats['espera_max_s'] = max(self.stats['espera_max_s'], espera)
+        return espera
+
+    def adquirir(self, tokens: int = 0, requisicoes: int = 1) -> float:
+        """Bloqueia a thread atual (fora de qualquer lock) até haver cota; devolve a espera"""
+        espera = self._reservar(requisicoes, tokens)
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    async def aadquirir(self, tokens: int = 0, requisicoes: int = 1) -> float:
+        """Versão assíncrona de adquirir: cede o event loop durante a espera"""
+        espera = self._reservar(requisicoes, tokens)
+        if espera > 0:
+            await asyncio.sleep(espera)
+        return espera
+
+    def tentar_adquirir(self, tokens: int = 0, requisicoes: int = 1) -> bool:
+        """Não bloqueante: adquire se houver cota agora, senão devolve False"""
+        if not self.requisicoes.tentar_reservar(requisicoes):
+            with self._lock:
+                self.stats['rejeicoes'] += 1
+            return False
+        if not self.tokens.tentar_reservar(tokens):
+            self.requisicoes.devolver(requisicoes)
+            with self._lock:
+                self.stats['rejeicoes'] += 1
+            return False
+        with self._lock:
+            self.stats['aquisicoes'] += 1
+            self.stats['tokens_reservados'] += tokens
+        return True
+
+    def ajustar_tokens(self, estimados: int, reais: Optional[int]):
+        """Corrige o balde de tokens com o uso real informado pela API"""
+        if reais is not None and reais != estimados:
+            self.tokens.devolver(estimados - reais)
+            with self._lock:
+                self.stats['tokens_reservados'] += reais - estimados
+
+    def configurar(self, rps: Optional[float] = None, rajada: Optional[float] = None,
+                   tpm: Optional[float] = None):
+        if rps is not None or rajada is not None:
+            self.requisicoes.configurar(rps if rps is not None else self.requisicoes.taxa,
+                                        rajada if rajada is not None else self.requisicoes.capacidade)
+        if tpm is not None:
+            self.tokens.configurar(tpm / 60.0, tpm)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['espera_media_s'] = stats['espera_total_s'] / max(stats['throttles'], 1)
+        stats['rps'] = self.requisicoes.taxa
+        stats['tpm'] = self.tokens.taxa * 60
+        return stats
+
+
+class LimitadorTaxa:
+    """Registro de limitadores por endpoint ("llm", "embeddings")"""
+
+    def __init__(self, config: Dict[str, Dict[str, float]]):
+        self.endpoints = {
+            nome: LimitadorEndpoint(nome, cfg["rps"], cfg["rajada"], cfg["tpm"])
+            for nome, cfg in config.items()
+        }
+
+    def __getitem__(self, nome: str) -> LimitadorEndpoint:
+        return self.endpoints[nome]
+
+    def adquirir(self, endpoint: str, tokens: int = 0, requisicoes: int = 1) -> float:
+        return self.endpoints[endpoint].adquirir(tokens, requisicoes)
+
+    async def aadquirir(self, endpoint: str, tokens: int = 0, requisicoes: int = 1) -> float:
+        return await self.endpoints[endpoint].aadquirir(tokens, requisicoes)
+
+    def tentar_adquirir(self, endpoint: str, tokens: int = 0, requisicoes: int = 1) -> bool:
+        return self.endpoints[endpoint].tentar_adquirir(tokens, requisicoes)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {nome: e.get_stats() for nome, e in self.endpoints.items()}
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("main")
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+import db_sqlalchemy as db
+from config import UI_CONFIG
+
+
+@pytest.fixture
+def conversa(tmp_path, monkeypatch):
+    """Conversa com 30 mensagens em um SQLite temporário; janela de 5 turnos e páginas de 12"""
+    monkeypatch.setitem(UI_CONFIG, "turnos_visiveis", 5)
+    monkeypatch.setitem(UI_CONFIG, "max_chat_history", 12)
+    engine = db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")
+    db.criar_tabelas()
+    agora = datetime(2024, 1, 1)
+    db.gravar_registros(
+        [{"tipo": "conversa", "id": "c1", "user_id": "u1", "titulo": "t", "total_mensagens": 0,
+          "created_at": agora, "updated_at": agora}]
+        + [{"tipo": "mensagem", "conversation_id": "c1", "pergunta": f"p{i}", "resposta": f"r{i}",
+            "citacoes": [], "acao": "AUTO_RESOLVER", "created_at": agora} for i in range(30)])
+    yield
+    engine.dispose()
+
+
+def _app():
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.query_params["usuario"] = "u1"
+    at.query_params["conversa"] = "c1"
+    return at.run()
+
+
+def _carregar_anteriores(at):
+    next(b for b in at.button if b.label == "Carregar mensagens anteriores").click().run()
+
+
+def _ids_renderizados(at):
+    return [item["id"] for item in at.session_state.historico[-at.session_state.turnos_visiveis:]]
+
+
+def test_renderiza_so_a_janela_e_cacheia_o_html_dela(conversa):
+    at = _app()
+    assert not at.exception
+    assert len(at.session_state.historico) == 12  # Só a última página vem do banco
+    assert sorted(at.session_state.html_turnos) == sorted(_ids_renderizados(at))
+    assert len(at.session_state.html_turnos) == 5
+
+
+def test_carregar_anteriores_amplia_janela_e_busca_no_banco(conversa):
+    at = _app()
+    _carregar_anteriores(at)
+    assert at.session_state.turnos_visiveis == 10
+    assert len(at.session_state.historico) == 12  # 7 turnos ocultos já bastam: sem consulta
+    _carregar_anteriores(at)
+    assert at.session_state.turnos_visiveis == 15
+    assert len(at.session_state.historico) == 24  # Restavam 2: próxima página lida do banco
+    assert sorted(at.session_state.html_turnos) == sorted(_ids_renderizados(at))
+
+
+def test_cache_descarta_turnos_que_sairam_da_janela(conversa):
+    at = _app()
+    _carregar_anteriores(at)
+    assert len(at.session_state.html_turnos) == 10
+
+    at.session_state.turnos_visiveis = 5  # Janela volta a encolher (ex.: turnos novos empurram os antigos)
+    at.run()
+    assert sorted(at.session_state.html_turnos) == sorted(_ids_renderizados(at))
+    assert len(at.session_state.html_turnos) == 5
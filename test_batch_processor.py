@@ -0,0 +1,102 @@
+import time
+import threading
+
+import pytest
+
+main = pytest.importorskip("main")
+batch_processor = pytest.importorskip("batch_processor")
+
+
+@pytest.fixture
+def processar_falso(monkeypatch):
+    monkeypatch.setattr(main, "processar_pergunta",
+                        lambda conteudo: {"resposta": conteudo, "acao_final": "AUTO_RESOLVER"})
+
+
+def _itens(n):
+    return [batch_processor.BatchItem(id=f"i{k}", content=f"texto {k}", metadata={}) for k in range(n)]
+
+
+def test_rate_limit_nao_altera_limitador_global(processar_falso):
+    rps_global = main.limitador["llm"].requisicoes.taxa
+    processor = batch_processor.BatchProcessor(max_workers=4, rate_limit=5.0, enable_caching=False)
+
+    inicio = time.monotonic()
+    resultados = processor.process_batch(_itens(8))
+    decorrido = time.monotonic() - inicio
+
+    assert all(r.success for r in resultados)
+    assert main.limitador["llm"].requisicoes.taxa == rps_global
+    assert decorrido >= 0.5  # Rajada de 5 itens, os outros 3 a 5/s
+    assert processor.get_processing_summary()["rate_limit"]["lote"]["throttles"] == 3
+
+
+def test_sem_rate_limit_nao_cria_balde_proprio(processar_falso):
+    processor = batch_processor.BatchProcessor(max_workers=2, enable_caching=False)
+    assert processor.item_limiter is None
+    assert len(processor.process_batch(_itens(3))) == 3
+    assert "lote" not in processor.get_processing_summary()["rate_limit"]
+
+
+def _processador(**opcoes):
+    return batch_processor.BatchProcessor(adaptive_concurrency=False, enable_caching=False, **opcoes)
+
+
+def test_prioridade_com_fifo_no_empate(monkeypatch):
+    liberar = threading.Event()
+    ordem = []
+
+    def processar(conteudo):
+        if conteudo == "porta":
+            liberar.wait(5)  # Segura o único worker até todos os itens estarem na fila
+        ordem.append(conteudo)
+        return {"resposta": conteudo}
+
+    monkeypatch.setattr(main, "processar_pergunta", processar)
+    itens = [batch_processor.BatchItem(id="porta", content="porta", metadata={}, priority=9)]
+    itens += [batch_processor.BatchItem(id=f"i{k}", content=f"p{p}-{k}", metadata={}, priority=p)
+              for k, p in enumerate([1, 3, 1, 3, 2])]
+    threading.Timer(0.2, liberar.set).start()
+
+    _processador(max_workers=1).process_batch(itens)
+    assert ordem == ["porta", "p3-1", "p3-3", "p2-4", "p1-0", "p1-2"]
+
+
+def test_retentativa_nao_ocupa_worker(monkeypatch):
+    tentativas = []
+
+    def processar(conteudo):
+        tentativas.append(conteudo)
+        if conteudo == "instavel" and tentativas.count("instavel") == 1:
+            raise ConnectionError("503 unavailable")
+        return {"resposta": conteudo}
+
+    monkeypatch.setattr(main, "processar_pergunta", processar)
+    monkeypatch.setattr(batch_processor, "calcular_backoff", lambda *args: 0.3)
+    itens = [batch_processor.BatchItem(id="a", content="instavel", metadata={}, priority=2),
+             batch_processor.BatchItem(id="b", content="estavel", metadata={})]
+
+    processor = _processador(max_workers=1)
+    inicio = time.monotonic()
+    resultados = list(processor.iter_results(itens))
+    # Durante o backoff de "a" o único worker atende "b"
+    assert [r.item_id for r in resultados] == ["b", "a"] and all(r.success for r in resultados)
+    assert processor.stats["retries"] == 1 and time.monotonic() - inicio < 1.0
+
+
+def test_gerador_limitado_pelos_itens_em_voo(processar_falso, monkeypatch):
+    monkeypatch.setitem(batch_processor.BATCH_CONFIG, "itens_em_voo", 3)
+    lidos = []
+
+    def gerar():
+        for k in range(20):
+            lidos.append(k)
+            yield batch_processor.BatchItem(id=f"i{k}", content=f"texto {k}", metadata={})
+
+    consumidos = 0
+    for _ in _processador(max_workers=2).iter_results(gerar()):
+        consumidos += 1
+        time.sleep(0.02)  # Consumidor lento: o alimentador precisa esperar
+        # Até 3 itens em voo além dos consumidos, mais o que aguarda vaga no semáforo
+        assert len(lidos) <= consumidos + 3 + 1
+    assert consumidos == 20
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.documents import Document
+
+import busca_hibrida
+
+
+def _doc(cid, texto=None):
+    return Document(page_content=texto or cid, metadata={"chunk_id": cid})
+
+
+def test_rrf_soma_as_fontes_e_remove_duplicados():
+    resultados = {"denso": [(_doc("a"), 0.9), (_doc("b"), 0.8)],
+                  "lexical": [(_doc("b"), 7.0), (_doc("c"), 5.0)]}
+    docs = busca_hibrida.fundir_rrf(resultados, k=10)
+    assert [d.metadata["chunk_id"] for d in docs] == ["b", "a", "c"]  # "b" nas duas listas vence
+    scores = docs[0].metadata["scores_busca"]
+    assert scores["denso"] == 0.8 and scores["lexical"] == 7.0
+    assert (scores["posicao_denso"], scores["posicao_lexical"]) == (2, 1)
+    assert scores["rrf"] == pytest.approx(1 / 62 + 1 / 61, abs=1e-6)
+
+
+def test_rrf_pesos_mudam_a_ordem():
+    resultados = {"denso": [(_doc("a"), 0.9)], "lexical": [(_doc("b"), 3.0)]}
+    assert [d.metadata["chunk_id"] for d in busca_hibrida.fundir_rrf(resultados, k=2, pesos={"lexical": 2.0})] == ["b", "a"]
+    assert [d.metadata["chunk_id"] for d in busca_hibrida.fundir_rrf(resultados, k=2, pesos={"denso": 2.0})] == ["a", "b"]
+
+
+def test_rrf_empate_desfeito_pelo_chunk_id_e_top_k():
+    # Mesma posição em fontes de mesmo peso: empate, resolvido pelo chunk_id independente da ordem das fontes
+    resultados = {"denso": [(_doc("z"), 0.5)], "lexical": [(_doc("m"), 1.0)]}
+    invertido = dict(reversed(list(resultados.items())))
+    for entrada in (resultados, invertido):
+        assert [d.metadata["chunk_id"] for d in busca_hibrida.fundir_rrf(entrada, k=5)] == ["m", "z"]
+    assert len(busca_hibrida.fundir_rrf(resultados, k=1)) == 1
+
+
+def test_rrf_nao_altera_documentos_originais():
+    original = _doc("a")
+    busca_hibrida.fundir_rrf({"denso": [(original, 0.9)]}, k=1)
+    assert "scores_busca" not in original.metadata
+
+
+def test_buscar_denso_normaliza_e_filtra_com_faiss():
+    pytest.importorskip("faiss")
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    docs = [_doc("a", "tabela de clientes"), _doc("b", "procedure de carga")]
+    vectorstore = FAISS.from_documents(docs, embeddings, ids=["a", "b"])
+    vetor = embeddings.embed_query("tabela de clientes")
+
+    todos = busca_hibrida.buscar_denso(vectorstore, vetor, k=2, score_minimo=-100)
+    assert todos[0][0].metadata["chunk_id"] == "a" and todos[0][1] == pytest.approx(1.0, abs=1e-3)
+    assert todos[0][1] > todos[1][1]
+    # Mesma escala da API pública do langchain (que embedaria a consulta de novo)
+    # (só o primeiro: os embeddings falsos não são normalizados, então o resto sai de 0-1)
+    publico = vectorstore.similarity_search_with_relevance_scores("tabela de clientes", k=1)
+    assert todos[0][1] == pytest.approx(publico[0][1])
+    assert [d.metadata["chunk_id"] for d, _ in busca_hibrida.buscar_denso(vectorstore, vetor, 2, 0.99)] == ["a"]
+    assert busca_hibrida.buscar_denso(None, vetor, 2, 0.0) == []
+
+
+def test_executor_criado_sob_demanda(monkeypatch):
+    monkeypatch.setattr(busca_hibrida, "_executor", None)
+    executor = busca_hibrida.executor_busca()
+    assert executor is busca_hibrida.executor_busca()
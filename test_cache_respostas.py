@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from cache_respostas import CacheRespostas, normalizar_pergunta
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def cache(request, tmp_path):
+    caminho = "" if request.param == "memoria" else str(tmp_path / "respostas.sqlite")
+    return CacheRespostas(caminho_db=caminho, ttl_segundos=0.2, max_entradas=100, limiar_similaridade=0.95)
+
+
+def test_normalizar_pergunta():
+    assert normalizar_pergunta("  Qual a ORIGEM da int.SP_X? ") == "qual a origem da int.sp_x"
+
+
+def test_expirada_sai_da_memoria_e_conta_uma_vez(cache):
+    cache.armazenar("Qual a origem?", [1.0, 0.0], "imp", "v1", {"resposta": "r"})
+    assert cache.buscar_exata("qual a origem", "v1")["cache"] == "exato"
+    time.sleep(0.3)
+
+    assert cache.buscar_exata("qual a origem", "v1") is None
+    assert cache.memoria.get(cache._chave("qual a origem", "v1")) is None
+    assert cache.buscar_exata("qual a origem", "v1") is None
+    stats = cache.get_stats()
+    assert stats['expirados'] == 1
+    assert (stats['hits_exatos'], stats['misses_exatos']) == (1, 2)
+
+
+def test_hit_rate_conta_misses_do_nivel_exato(cache):
+    cache.armazenar("pergunta a", [1.0, 0.0], "imp", "v1", {"resposta": "a"})
+    assert cache.buscar_exata("pergunta a", "v1") is not None
+    # Miss exato que não chega ao nível semântico (ex.: nenhum documento encontrado)
+    assert cache.buscar_exata("outra", "v1") is None
+    # Miss exato seguido de acerto semântico
+    assert cache.buscar_exata("pergunta b", "v1") is None
+    assert cache.buscar_semelhante([0.99, 0.01], "imp")["cache"] == "semantico"
+
+    stats = cache.get_stats()
+    assert (stats['hits_exatos'], stats['hits_semanticos'], stats['misses']) == (1, 1, 1)
+    assert stats['hit_rate'] == pytest.approx(200 / 3)
@@ -0,0 +1,46 @@
+import time
+
+from cache_resultados import BackendResultadosSQLite, CacheResultados, chave_resultado
+
+
+def test_chave_muda_com_versoes():
+    base = chave_resultado("texto", "idx1", 1, "gemini")
+    assert base == chave_resultado("texto", "idx1", 1, "gemini")
+    assert len({base, chave_resultado("texto", "idx2", 1, "gemini"),
+                chave_resultado("texto", "idx1", 2, "gemini"), chave_resultado("texto", "idx1", 1, "outro")}) == 4
+
+
+def test_memoria_disco_e_hit_rate_percentual(tmp_path):
+    caminho = tmp_path / "resultados.sqlite"
+    cache = CacheResultados(max_memoria=10, ttl_segundos=0, max_entradas=0, backend=BackendResultadosSQLite(caminho))
+    cache.set("a", {"resposta": "x"})
+    assert cache.get("a") == {"resposta": "x"}
+    assert cache.get("b") is None
+
+    # Outro processo/execução: só o disco tem a entrada
+    outro = CacheResultados(max_memoria=10, ttl_segundos=0, max_entradas=0, backend=BackendResultadosSQLite(caminho))
+    assert outro.get("a") == {"resposta": "x"}
+    assert outro.get("a") == {"resposta": "x"}
+    stats = outro.get_stats()
+    assert (stats['hits_disco'], stats['hits_memoria'], stats['em_memoria']) == (1, 1, 1)
+    assert stats['hit_rate'] == 100.0
+    assert cache.get_stats()['hit_rate'] == 50.0
+
+
+def test_expiracao_remove_da_memoria_e_do_disco(tmp_path):
+    backend = BackendResultadosSQLite(tmp_path / "resultados.sqlite")
+    cache = CacheResultados(max_memoria=10, ttl_segundos=0.05, max_entradas=0, backend=backend)
+    cache.set("a", 1)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.get_stats()['expirados'] == 2  # Memória e disco
+    assert len(backend) == 0 and len(cache.memoria) == 0
+
+
+def test_evicao_lru_em_memoria():
+    cache = CacheResultados(max_memoria=2, ttl_segundos=0, max_entradas=0)
+    for chave in "abc":
+        cache.set(chave, chave)
+    assert cache.get("a") is None and cache.get("c") == "c"
+    stats = cache.get_stats()
+    assert stats['evicoes'] == 1 and not stats['persistente']
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from checkpoint_lote import DiarioCheckpoint, chave_item
+
+
+def _linha(chave, success=True, **extra):
+    return json.dumps(dict({"chave": chave, "item_id": chave, "success": success}, **extra)) + "\n"
+
+
+def test_chave_item_depende_do_conteudo():
+    assert chave_item("a", "x") == chave_item("a", "x")
+    assert chave_item("a", "x") != chave_item("a", "y")
+
+
+def test_linha_corrompida_no_meio_e_ignorada(tmp_path):
+    caminho = tmp_path / "diario.jsonl"
+    caminho.write_text(_linha("a") + '{"chave": "b", "succ\n' + _linha("c") + _linha("d"), encoding="utf-8")
+
+    diario = DiarioCheckpoint(caminho, fsync=False)
+    assert diario.concluido("a") and diario.concluido("c") and diario.concluido("d")
+    assert [r["chave"] for r in diario.iterar()] == ["a", "c", "d"]
+    assert caminho.read_text(encoding="utf-8").count("\n") == 4  # Nada foi truncado
+    diario.fechar()
+
+
+def test_linha_final_incompleta_e_descartada(tmp_path):
+    caminho = tmp_path / "diario.jsonl"
+    caminho.write_text(_linha("a") + _linha("b", success=False) + '{"chave": "b", "su', encoding="utf-8")
+
+    diario = DiarioCheckpoint(caminho, fsync=False)
+    assert diario.concluido("a") and not diario.concluido("b")
+    diario.registrar("b", {"item_id": "b", "success": True})
+    assert [(r["chave"], r["success"]) for r in diario.iterar()] == [("a", True), ("b", True)]
+    diario.fechar()
+
+
+def test_ultima_linha_sem_quebra_e_completada(tmp_path):
+    caminho = tmp_path / "diario.jsonl"
+    caminho.write_text(_linha("a").rstrip("\n"), encoding="utf-8")
+    diario = DiarioCheckpoint(caminho, fsync=False)
+    diario.registrar("b", {"item_id": "b", "success": True})
+    assert [r["chave"] for r in diario.iterar()] == ["a", "b"]
+    diario.fechar()
+
+
+def test_fechar_e_reabrir(tmp_path):
+    diario = DiarioCheckpoint(tmp_path / "diario.jsonl", fsync=False)
+    diario.registrar("a", {"success": True})
+    diario.fechar()
+    assert diario._arquivo.closed
+    assert [r["chave"] for r in diario.iterar()] == ["a"]
+    diario.registrar("b", {"success": True})
+    assert diario.get_stats()["concluidos"] == 2
+    diario.fechar()
+
+
+def test_batch_fecha_checkpoint_e_retoma(tmp_path, monkeypatch):
+    main = pytest.importorskip("main")
+    batch_processor = pytest.importorskip("batch_processor")
+    chamadas = []
+
+    def processar(conteudo):
+        chamadas.append(conteudo)
+        return {"resposta": conteudo.upper(), "acao_final": "AUTO_RESOLVER"}
+
+    monkeypatch.setattr(main, "processar_pergunta", processar)
+    itens = [batch_processor.BatchItem(id=f"i{n}", content=f"texto {n}", metadata={}) for n in range(20)]
+    caminho = tmp_path / "diario.jsonl"
+
+    processor = batch_processor.BatchProcessor(max_workers=4, enable_caching=False, checkpoint_path=str(caminho))
+    assert len(processor.process_batch(itens[:12])) == 12
+    assert processor.checkpoint._arquivo.closed
+
+    retomado = batch_processor.BatchProcessor(max_workers=4, enable_caching=False, checkpoint_path=str(caminho))
+    assert len(retomado.process_batch(itens)) == 8
+    assert retomado.stats["resumed"] == 12 and len(chamadas) == 20
+    assert retomado.checkpoint._arquivo.closed
+    assert len(list(retomado.iter_checkpoint_results())) == 20
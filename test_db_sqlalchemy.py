@@ -0,0 +1,304 @@
+import json
+import time
+from datetime import datetime
+
+import threading
+
+import pytest
+from sqlalchemy import event, text
+
+import db_sqlalchemy as db
+
+
+@pytest.fixture
+def banco(tmp_path):
+    engine = db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")
+    db.criar_tabelas()
+    yield engine
+    engine.dispose()
+
+
+def _gravador(tmp_path, **config):
+    return db.GravadorChat(dict({"arquivo_pendentes": str(tmp_path / "pendente.jsonl"), "intervalo_s": 0.05,
+                                 "backoff_base_s": 0.0}, **config))
+
+
+def _total_chats(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM chat_history")).scalar()
+
+
+def test_gravador_grava_em_lotes(banco, tmp_path):
+    gravador = _gravador(tmp_path, tamanho_lote=10)
+    for i in range(35):
+        gravador.enfileirar("u1", f"p{i}", f"r{i}")
+    gravador.fechar()
+
+    stats = gravador.get_stats()
+    assert _total_chats(banco) == 35
+    assert stats["gravados"] == 35 and stats["lotes"] >= 4 and stats["na_fila"] == 0
+
+
+def test_gravador_desvia_e_reenvia_pendentes(tmp_path):
+    db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")  # Sem tabelas: toda gravação falha
+    gravador = _gravador(tmp_path, max_tentativas=2)
+    gravador.enfileirar("u1", "p", "r")
+    gravador.fechar()
+    assert gravador.get_stats()["desviados_arquivo"] == 1
+    assert (tmp_path / "pendente.jsonl").exists()
+
+    db.criar_tabelas()
+    gravador = _gravador(tmp_path)
+    gravador.fechar()
+    assert gravador.get_stats()["reenviados"] == 1
+    assert not (tmp_path / "pendente.jsonl").exists()
+    assert _total_chats(db.get_engine()) == 1
+
+
+def test_linha_corrompida_nao_derruba_gravador(banco, tmp_path):
+    valido = {"tipo": "chat", "user_id": "u1", "pergunta": "p", "resposta": "r",
+              "created_at": datetime.utcnow().isoformat()}
+    (tmp_path / "pendente.jsonl").write_text(
+        json.dumps(valido) + "\n" + '{"tipo": "chat", "user_id": "u1", "perg' + "\n" + json.dumps(valido) + "\n",
+        encoding="utf-8")
+
+    gravador = _gravador(tmp_path)
+    gravador.enfileirar("u1", "depois", "da falha")
+    gravador.fechar()
+
+    # Com pendentes no arquivo, o registro novo entra atrás deles e é reenviado junto
+    stats = gravador.get_stats()
+    assert stats["reenviados"] == 3 and stats["pendentes_invalidos"] == 1 and stats["gravados"] == 0
+    assert _total_chats(banco) == 3
+    assert "perg" in (tmp_path / "pendente.jsonl.invalidos").read_text(encoding="utf-8")
+
+
+def test_erro_inesperado_nao_encerra_thread(banco, tmp_path, monkeypatch):
+    gravador = _gravador(tmp_path)
+    gravar_original = gravador._gravar
+    chamadas = []
+
+    def gravar_instavel(lote):
+        chamadas.append(len(lote))
+        if len(chamadas) == 1:
+            raise RuntimeError("falha inesperada")
+        return gravar_original(lote)
+
+    monkeypatch.setattr(gravador, "_gravar", gravar_instavel)
+    gravador.enfileirar("u1", "perdida", "r")
+    while not chamadas:
+        time.sleep(0.01)
+    gravador.enfileirar("u1", "gravada", "r")
+    gravador.fechar()
+
+    assert not gravador._thread.is_alive()
+    assert gravador.get_stats()["falhas"] == 1
+    assert _total_chats(banco) == 1
+
+
+def test_historico_paginado_por_keyset(banco):
+    mesma_data = datetime(2024, 1, 1, 12, 0, 0)
+    registros = [{"user_id": "u1", "pergunta": f"p{i}", "resposta": "r",
+                  "created_at": mesma_data if i < 10 else datetime(2024, 1, 1, 12, 0, i)} for i in range(25)]
+    registros.append({"user_id": "u2", "pergunta": "outro", "resposta": "r", "created_at": mesma_data})
+    db.salvar_chats(registros)
+
+    vistas, cursor = [], None
+    while True:
+        linhas, cursor = db.buscar_historico_pagina("u1", limit=7, before=cursor)
+        vistas += [l.pergunta for l in linhas]
+        if cursor is None:
+            break
+    # Mais recentes primeiro; empates de created_at desempatados pelo id, sem repetir nem pular
+    assert vistas == [f"p{i}" for i in range(24, -1, -1)]
+
+
+def test_migrar_indices_cria_indice_faltante(tmp_path):
+    engine = db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chat_history (id INTEGER PRIMARY KEY, user_id VARCHAR(64), "
+                          "pergunta TEXT, resposta TEXT, created_at TIMESTAMP)"))
+    db.criar_tabelas()
+
+    with engine.connect() as conn:
+        indices = {linha[1] for linha in conn.execute(text("PRAGMA index_list('chat_history')"))}
+    assert "idx_chat_history_usuario_data" in indices
+
+
+def test_criar_tabelas_uma_vez_por_engine(tmp_path, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(db, "migrar_indices", lambda engine=None: chamadas.append(engine))
+    engine = db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")
+    for _ in range(3):
+        db.criar_tabelas()
+    assert chamadas == [engine]
+
+    outro = db.configurar_banco(f"sqlite:///{tmp_path / 'outro.sqlite'}")
+    db.criar_tabelas()
+    assert chamadas == [engine, outro]
+
+
+def test_ddl_concorrente_nao_altera_indice_do_modelo():
+    from sqlalchemy.dialects import postgresql
+
+    indice = next(i for i in db.ChatHistory.__table__.indexes if i.name == "idx_chat_history_usuario_data")
+    ddl = db.ddl_indice_concorrente(indice, postgresql.dialect())
+    assert ddl.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_history_usuario_data")
+    assert indice.dialect_options["postgresql"]["concurrently"] is False
+
+
+def test_criar_engine_aplica_pool_da_config(tmp_path):
+    engine = db.criar_engine(f"sqlite:///{tmp_path / 'sub' / 'chat.sqlite'}", pool_size=3)
+    try:
+        assert (tmp_path / "sub").is_dir()
+        assert engine.pool.size() == 3
+        assert engine.pool._max_overflow == db.DB_CONFIG["max_overflow"]
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_em_memoria_compartilha_conexao_entre_threads():
+    import threading
+    from sqlalchemy.pool import StaticPool
+
+    engine = db.configurar_banco("sqlite://")
+    assert isinstance(engine.pool, StaticPool)
+    db.criar_tabelas()
+    thread = threading.Thread(target=db.salvar_chat, args=("u1", "p", "r"))
+    thread.start()
+    thread.join()
+    assert _total_chats(engine) == 1
+
+
+def test_get_engine_cria_sob_demanda(monkeypatch):
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "DATABASE_URL", "sqlite://")
+    engine = db.get_engine()
+    assert engine is db.get_engine() and str(engine.url) == "sqlite://"
+    assert db.Session.kw["bind"] is engine
+
+
+def test_sessao_commit_e_rollback(banco):
+    with db.sessao() as session:
+        session.add(db.ChatHistory(user_id="u1", pergunta="ok", resposta="r"))
+    with pytest.raises(RuntimeError):
+        with db.sessao() as session:
+            session.add(db.ChatHistory(user_id="u1", pergunta="desfeita", resposta="r"))
+            session.flush()
+            raise RuntimeError("falha no meio da transação")
+
+    linhas, _ = db.buscar_historico_pagina("u1")
+    assert [l.pergunta for l in linhas] == ["ok"]
+
+
+def test_conversas_e_mensagens(banco):
+    inicio = datetime(2024, 1, 1, 12, 0, 0)
+    conversas = [{"tipo": "conversa", "id": f"c{i}", "user_id": "u1", "titulo": f"Conversa {i}",
+                  "total_mensagens": 0, "created_at": inicio, "updated_at": inicio} for i in range(5)]
+    mensagens = [{"tipo": "mensagem", "conversation_id": "c0", "pergunta": f"p{i}", "resposta": "r",
+                  "citacoes": [{"documento": "a.md", "pagina": i}], "acao": None,
+                  "created_at": datetime(2024, 1, 2, 0, 0, i)} for i in range(7)]
+    db.gravar_registros(conversas + mensagens)
+    # Reenvio da mesma conversa não duplica nem falha
+    db.gravar_registros(conversas[:1] + [dict(mensagens[0], pergunta="p7", created_at=datetime(2024, 1, 3))])
+
+    conversa = db.buscar_conversa("c0")
+    assert conversa.total_mensagens == 8 and conversa.updated_at == datetime(2024, 1, 3)
+    assert db.buscar_conversa("inexistente") is None
+
+    vistas, cursor = [], None
+    while True:
+        linhas = db.listar_conversas("u1", limit=2, before=cursor)
+        if not linhas:
+            break
+        vistas += [l.id for l in linhas]
+        cursor = db.cursor_conversa(linhas[-1])
+    assert vistas == ["c0", "c4", "c3", "c2", "c1"]
+
+    pagina = db.carregar_mensagens("c0", limit=5)
+    assert [m.pergunta for m in pagina] == ["p7", "p6", "p5", "p4", "p3"]
+    assert pagina[1].citacoes == [{"documento": "a.md", "pagina": 6}]
+    anterior = db.carregar_mensagens("c0", limit=5, before_id=pagina[-1].id)
+    assert [m.pergunta for m in anterior] == ["p2", "p1", "p0"]
+
+
+def test_gravador_grava_conversa_com_mensagens(banco, tmp_path):
+    gravador = _gravador(tmp_path)
+    conversation_id = db.nova_conversa_id()
+    gravador.enfileirar_conversa(conversation_id, "u1", "x" * 300)
+    for i in range(3):
+        gravador.enfileirar_mensagem(conversation_id, f"p{i}", "r", acao={"tipo": "sql"})
+    gravador.fechar()
+
+    conversa = db.buscar_conversa(conversation_id)
+    assert conversa.total_mensagens == 3 and len(conversa.titulo) == 200
+    assert [m.acao for m in db.carregar_mensagens(conversation_id)] == [{"tipo": "sql"}] * 3
+
+
+@pytest.fixture
+def banco_com_fk(tmp_path):
+    """SQLite com chaves estrangeiras ativas, como no Postgres"""
+    engine = db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")
+    event.listen(engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    db.criar_tabelas()
+    yield engine
+    engine.dispose()
+
+
+def test_fila_cheia_preserva_ordem_conversa_mensagens(banco_com_fk, tmp_path, monkeypatch):
+    entrou, liberar = threading.Event(), threading.Event()
+    gravar_original = db.gravar_registros
+    tentativas = []
+
+    def gravar_lento(registros):
+        entrou.set()
+        liberar.wait(5)
+        tentativas.extend(r.get("pergunta", r.get("id")) for r in registros)
+        return gravar_original(registros)
+
+    monkeypatch.setattr(db, "gravar_registros", gravar_lento)
+    gravador = _gravador(tmp_path, max_fila=1)
+    gravador.enfileirar("u1", "primeiro", "r")
+    assert entrou.wait(5)  # Gravador ocupado: a fila enche
+    gravador.enfileirar_conversa("c1", "u1", "Conversa")
+    for i in range(3):
+        gravador.enfileirar_mensagem("c1", f"p{i}", "r")
+    liberar.set()
+    gravador.fechar()
+
+    # Nenhuma mensagem chega antes da sua conversa (sem falha de FK no caminho)
+    stats = gravador.get_stats()
+    assert tentativas == ["primeiro", "c1", "p0", "p1", "p2"] and stats["falhas"] == 0
+    assert stats["desviados_arquivo"] == 3 and stats["reenviados"] == 3 and stats["pendentes_invalidos"] == 0
+    assert db.buscar_conversa("c1").total_mensagens == 3
+    assert not (tmp_path / "pendente.jsonl").exists()
+
+
+def test_registro_invalido_no_reenvio_vai_para_quarentena(banco_com_fk, tmp_path):
+    agora = datetime.utcnow().isoformat()
+    registros = [{"tipo": "conversa", "id": "c1", "user_id": "u1", "titulo": "t", "total_mensagens": 0,
+                  "created_at": agora, "updated_at": agora},
+                 {"tipo": "mensagem", "conversation_id": "perdida", "pergunta": "orfã", "resposta": "r",
+                  "citacoes": [], "acao": None, "created_at": agora},
+                 {"tipo": "mensagem", "conversation_id": "c1", "pergunta": "p", "resposta": "r",
+                  "citacoes": [], "acao": None, "created_at": agora}]
+    (tmp_path / "pendente.jsonl").write_text("".join(json.dumps(r) + "\n" for r in registros), encoding="utf-8")
+
+    gravador = _gravador(tmp_path)
+    gravador.fechar()
+
+    stats = gravador.get_stats()
+    assert stats["reenviados"] == 2 and stats["pendentes_invalidos"] == 1
+    assert not (tmp_path / "pendente.jsonl").exists()
+    assert "perdida" in (tmp_path / "pendente.jsonl.invalidos").read_text(encoding="utf-8")
+    assert db.buscar_conversa("c1").total_mensagens == 1
+
+
+def test_banco_fora_do_ar_mantem_pendentes(tmp_path):
+    db.configurar_banco(f"sqlite:///{tmp_path / 'chat.sqlite'}")  # Sem tabelas: erro do banco, não do registro
+    gravador = _gravador(tmp_path, max_tentativas=1)
+    gravador.enfileirar("u1", "p", "r")
+    gravador.fechar()
+    stats = gravador.get_stats()
+    assert stats["pendentes_invalidos"] == 0 and stats["reenviados"] == 0
+    assert len((tmp_path / "pendente.jsonl").read_text(encoding="utf-8").splitlines()) == 1
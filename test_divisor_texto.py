@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from divisor_texto import dividir_em_chunks, encontrar_corte
+
+
+def _texto_aleatorio(n_palavras, semente=7):
+    rnd = random.Random(semente)
+    palavras = []
+    for i in range(n_palavras):
+        palavra = "".join(rnd.choice("abcdefghijklmnopqrstuvwxyzçã") for _ in range(rnd.randint(1, 14)))
+        fim = rnd.random()
+        palavras.append(palavra + (".\n\n" if fim < 0.02 else ". " if fim < 0.1 else " "))
+    return "".join(palavras)
+
+
+def _gravar(tmp_path, texto):
+    caminho = tmp_path / "doc.txt"
+    caminho.write_text(texto, encoding="utf-8", newline="")
+    return caminho
+
+
+@pytest.mark.parametrize("tamanho,sobreposicao", [(100, 0), (100, 50), (300, 120), (1000, 500), (1000, 100)])
+def test_offsets_cobertura_e_quantidade(tmp_path, tamanho, sobreposicao):
+    texto = _texto_aleatorio(25000)
+    chunks = list(dividir_em_chunks(_gravar(tmp_path, texto), tamanho, sobreposicao, tamanho_leitura=4096))
+
+    fim_anterior = 0
+    for conteudo, inicio, fim in chunks:
+        assert conteudo == texto[inicio:fim]
+        assert len(conteudo) <= tamanho
+        assert inicio <= fim_anterior  # Sem lacunas entre chunks
+        assert fim_anterior - inicio <= sobreposicao  # Nunca recua mais que a sobreposição
+        fim_anterior = fim
+    assert fim_anterior == len(texto)
+    assert len(chunks) <= 2 * len(texto) / (tamanho - sobreposicao) + 1
+
+
+def test_chunks_sem_palavras_cortadas(tmp_path):
+    texto = _texto_aleatorio(5000, semente=3)
+    for conteudo, inicio, fim in dividir_em_chunks(_gravar(tmp_path, texto), 200, 60):
+        assert inicio == 0 or texto[inicio - 1].isspace()
+        assert fim == len(texto) or conteudo[-1].isspace() or texto[fim].isspace()
+
+
+def test_texto_sem_espacos_usa_corte_seco(tmp_path):
+    # Sem fronteira de palavra a sobreposição cortaria a "palavra": chunks contíguos
+    texto = "x" * 1050
+    chunks = list(dividir_em_chunks(_gravar(tmp_path, texto), 100, 30))
+    assert [(i, f) for _, i, f in chunks] == [(i, min(i + 100, 1050)) for i in range(0, 1050, 100)]
+
+
+def test_corte_prefere_paragrafo():
+    texto = "a" * 60 + ".\n\n" + "b" * 20 + ". " + "c" * 100
+    assert encontrar_corte(texto, 100) == 63
+    assert encontrar_corte("a" * 60 + ". " + "b" * 20 + " " + "c" * 100, 100) == 62
+
+
+def test_sobreposicao_invalida(tmp_path):
+    with pytest.raises(ValueError):
+        list(dividir_em_chunks(_gravar(tmp_path, "abc"), 10, 10))
+
+
+def test_iter_large_document_progresso(tmp_path, monkeypatch):
+    main = pytest.importorskip("main")
+    batch_processor = pytest.importorskip("batch_processor")
+    monkeypatch.setattr(main, "processar_pergunta",
+                        lambda conteudo: {"resposta": conteudo, "acao_final": "AUTO_RESOLVER"})
+    texto = _texto_aleatorio(3000, semente=11)
+    processor = batch_processor.BatchProcessor(max_workers=4, enable_caching=False)
+    progresso = {}
+    resultados = list(processor.iter_large_document(_gravar(tmp_path, texto), 500, 100, progresso))
+
+    assert resultados and all(r.success for r in resultados)
+    assert progresso == {"chunks": len(resultados), "characters": len(texto)}
+    assert sorted(r.item_id for r in resultados) == sorted(f"chunk_{n}" for n in range(1, len(resultados) + 1))
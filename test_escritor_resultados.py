@@ -0,0 +1,45 @@
+import gzip
+import json
+
+import pytest
+
+from escritor_resultados import COMPRESSOES, caminho_resumo, gravar_jsonl
+
+
+def _registros(n):
+    return ({"item_id": f"i{k}", "resposta": f"ação {k}"} for k in range(n))
+
+
+def _ler(caminho, compressao):
+    if compressao == "gzip":
+        dados = gzip.decompress(caminho.read_bytes())
+    elif compressao == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        dados = zstandard.ZstdDecompressor().stream_reader(caminho.read_bytes()).read()
+    else:
+        dados = caminho.read_bytes()
+    return [json.loads(linha) for linha in dados.decode("utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("compressao", list(COMPRESSOES))
+def test_ida_e_volta_com_resumo(tmp_path, compressao):
+    if compressao == "zstd":
+        pytest.importorskip("zstandard")
+    caminho = tmp_path / f"resultados.jsonl{COMPRESSOES[compressao]}"
+    total = gravar_jsonl(_registros(2500), str(caminho), compressao,
+                         resumo=lambda: {"sucessos": 2500}, max_pendentes=10)
+
+    assert total == 2500
+    assert _ler(caminho, compressao) == list(_registros(2500))
+    resumo = json.loads((tmp_path / "resultados.summary.json").read_text(encoding="utf-8"))
+    assert resumo == {"sucessos": 2500, "registros": 2500, "arquivo": str(caminho)}
+
+
+@pytest.mark.parametrize("nome", ["saida.jsonl", "saida.jsonl.gz", "saida.jsonl.zst", "saida.gz", "saida"])
+def test_caminho_resumo(tmp_path, nome):
+    assert caminho_resumo(str(tmp_path / nome)) == tmp_path / "saida.summary.json"
+
+
+def test_compressao_desconhecida(tmp_path):
+    with pytest.raises(ValueError, match="bzip2"):
+        gravar_jsonl(_registros(1), str(tmp_path / "x.jsonl"), "bzip2")
@@ -0,0 +1,64 @@
+import pytest
+
+import indice_lexical
+from indice_lexical import IndiceBM25, _radical, tokenizar
+
+
+@pytest.mark.parametrize("palavra, radical", [
+    ("tabelas", "tabela"), ("processos", "processo"), ("dados", "dado"),
+    ("access", "access"), ("class", "class"),  # Terminação "ss" não é plural
+    ("mes", "mes"), ("gas", "gas"),  # Palavras curtas ficam inteiras
+])
+def test_radical(palavra, radical):
+    assert _radical(palavra) == radical
+
+
+def test_tokenizar_normaliza_e_preserva_identificadores():
+    assert tokenizar("As Tabelas de Configuração") == ["tabela", "configuracao"]
+    assert tokenizar("EXEC int.sp_Carga") == ["exec", "int.sp_carga", "int", "sp_carga"]
+
+
+def test_plural_e_singular_se_encontram(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text("Lista das tabelas de integração.", encoding="utf-8")
+    (docs / "b.md").write_text("Access via class do conector.", encoding="utf-8")
+    indice, _ = indice_lexical.atualizar_indice_lexical(docs_path=docs, index_dir=tmp_path / "idx")
+
+    assert [d.metadata["filename"] for d, _ in indice.buscar("tabela")] == ["a.md"]
+    assert [d.metadata["filename"] for d, _ in indice.buscar("access")] == ["b.md"]
+
+
+def test_arquivo_modificado_substitui_postings(tmp_path):
+    docs, index_dir = tmp_path / "docs", tmp_path / "idx"
+    docs.mkdir()
+    (docs / "a.md").write_text("Procedure carga estoque.", encoding="utf-8")
+    (docs / "b.md").write_text("Tabela clientes.", encoding="utf-8")
+    indice, relatorio = indice_lexical.atualizar_indice_lexical(docs_path=docs, index_dir=index_dir)
+    assert relatorio["reconstruido"] and len(indice) == 2
+
+    (docs / "a.md").write_text("Procedure carga faturamento.", encoding="utf-8")
+    indice, relatorio = indice_lexical.atualizar_indice_lexical(docs_path=docs, index_dir=index_dir)
+    assert not relatorio["reconstruido"]
+    assert (relatorio["chunks_adicionados"], relatorio["chunks_removidos"]) == (1, 1)
+    assert len(indice) == 2
+    assert "estoque" not in indice.postings
+    assert len(indice.postings["carga"]) == 1 and list(indice.postings["carga"].values()) == [1]
+    assert indice.tamanho_total == sum(c["tamanho"] for c in indice.chunks.values())
+
+    # Sem mudanças: nada é retokenizado e o índice salvo é o mesmo
+    _, relatorio = indice_lexical.atualizar_indice_lexical(docs_path=docs, index_dir=index_dir)
+    assert (relatorio["chunks_adicionados"], relatorio["chunks_removidos"]) == (0, 0)
+    relido, _ = indice_lexical.ler_indice_lexical(index_dir)
+    assert relido.postings == indice.postings
+
+
+def test_bm25_remover_limpa_termos_orfaos():
+    from langchain_core.documents import Document
+
+    indice = IndiceBM25()
+    indice.adicionar([Document(page_content="carga de estoque", metadata={"chunk_id": "x"})])
+    indice.adicionar([Document(page_content="carga de estoque", metadata={"chunk_id": "x"})])  # Reindexar
+    assert indice.postings == {"carga": {"x": 1}, "estoque": {"x": 1}}
+    indice.remover(["x", "inexistente"])
+    assert (indice.postings, indice.tamanho_total, len(indice)) == ({}, 0, 0)
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("faiss")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import indice_lexical
+import indice_vetorial
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text("Tabela de clientes e pedidos.", encoding="utf-8")
+    (docs / "b.md").write_text("Procedure int.sp_carga atualiza o estoque.", encoding="utf-8")
+    return docs, tmp_path / "indice"
+
+
+def _atualizar(docs, index_dir, **kwargs):
+    return indice_vetorial.atualizar_indice(DeterministicFakeEmbedding(size=8), docs_path=docs,
+                                            index_dir=index_dir, modelo="fake", **kwargs)
+
+
+def _origem(docs, nome):
+    return (docs / nome).as_posix()
+
+
+def test_incremental_embeda_so_o_modificado_e_remove_o_apagado(pasta):
+    docs, index_dir = pasta
+    _, manifesto, relatorio = _atualizar(docs, index_dir)
+    assert relatorio["reconstruido"] and set(manifesto["arquivos"]) == {_origem(docs, "a.md"), _origem(docs, "b.md")}
+
+    (docs / "a.md").write_text("Tabela de clientes, pedidos e faturas.", encoding="utf-8")
+    (docs / "b.md").unlink()
+    vs, manifesto, relatorio = _atualizar(docs, index_dir)
+    assert relatorio["arquivos_modificados"] == [_origem(docs, "a.md")]
+    assert relatorio["arquivos_removidos"] == [_origem(docs, "b.md")]
+    assert list(manifesto["arquivos"]) == [_origem(docs, "a.md")]
+    assert vs.index.ntotal == len(manifesto["arquivos"][_origem(docs, "a.md")]["chunk_ids"])
+
+
+def test_falha_ao_carregar_mantem_vetores_e_manifesto(pasta, monkeypatch):
+    docs, index_dir = pasta
+    vs, manifesto, _ = _atualizar(docs, index_dir)
+    total, anterior = vs.index.ntotal, manifesto["arquivos"][_origem(docs, "b.md")]
+
+    (docs / "b.md").write_text("Procedure int.sp_carga atualiza estoque e preço.", encoding="utf-8")
+    carregar = indice_vetorial.carregar_arquivo
+
+    def falhar_b(caminho):
+        if caminho.name == "b.md":
+            raise OSError("arquivo bloqueado")
+        return carregar(caminho)
+
+    monkeypatch.setattr(indice_vetorial, "carregar_arquivo", falhar_b)
+    vs, manifesto, relatorio = _atualizar(docs, index_dir)
+    assert relatorio["arquivos_com_falha"] == [_origem(docs, "b.md")]
+    assert relatorio["arquivos_modificados"] == [] and relatorio["arquivos_removidos"] == []
+    assert manifesto["arquivos"][_origem(docs, "b.md")] == anterior
+    assert vs.index.ntotal == total
+
+    # Na próxima execução sem erro o arquivo é reindexado
+    monkeypatch.setattr(indice_vetorial, "carregar_arquivo", carregar)
+    _, _, relatorio = _atualizar(docs, index_dir)
+    assert relatorio["arquivos_modificados"] == [_origem(docs, "b.md")]
+
+
+def test_docs_sem_arquivo_existente_nao_remove(pasta):
+    docs, index_dir = pasta
+    todos = indice_vetorial.carregar_docs(docs)
+    _atualizar(docs, index_dir)
+
+    # Carregamento externo perdeu b.md, mas o arquivo continua no disco
+    so_a = [d for d in todos if d.metadata["filename"] == "a.md"]
+    vs, manifesto, relatorio = indice_vetorial.atualizar_indice(
+        DeterministicFakeEmbedding(size=8), docs=so_a, index_dir=index_dir, modelo="fake")
+    assert relatorio["arquivos_removidos"] == []
+    assert _origem(docs, "b.md") in manifesto["arquivos"]
+
+    indice, relatorio = indice_lexical.atualizar_indice_lexical(docs=todos, index_dir=index_dir)
+    assert relatorio["chunks_adicionados"] == 2
+    indice, relatorio = indice_lexical.atualizar_indice_lexical(docs=so_a, index_dir=index_dir)
+    assert relatorio["chunks_removidos"] == 0
+    assert indice.buscar("sp_carga")
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from metricas import RegistroMetricas
+
+
+def _rodar_threads(registro, n_threads, n_obs):
+    def trabalho():
+        for i in range(n_obs):
+            registro.incrementar("itens")
+            registro.observar("item", 0.001 * (i + 1))
+    threads = [threading.Thread(target=trabalho) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_fragmentos_de_threads_encerradas_sao_incorporados():
+    registro = RegistroMetricas()
+    for _ in range(20):
+        _rodar_threads(registro, 8, 10)
+
+    snap = registro.snapshot()
+    assert snap["contadores"]["itens"] == 20 * 8 * 10
+    assert snap["latencias"]["item"]["count"] == 20 * 8 * 10
+    assert snap["latencias"]["item"]["max_s"] == pytest.approx(0.01)
+    assert len(registro._fragmentos) == 0  # Todas as threads já terminaram
+
+
+def test_thread_viva_mantem_fragmento_proprio():
+    registro = RegistroMetricas()
+    registro.incrementar("principal", 2)
+    _rodar_threads(registro, 4, 5)
+
+    snap = registro.snapshot()
+    assert snap["contadores"] == {"itens": 20, "principal": 2}
+    assert len(registro._fragmentos) == 1
+    registro.incrementar("principal")
+    assert registro.snapshot()["contadores"]["principal"] == 3
+
+
+def test_percentis_e_reset():
+    registro = RegistroMetricas()
+    for i in range(1, 1001):
+        registro.observar("geracao_llm", i / 1000)
+    lat = registro.snapshot()["latencias"]["geracao_llm"]
+    assert lat["p50_s"] == pytest.approx(0.5, rel=0.2)
+    assert lat["p99_s"] == pytest.approx(0.99, rel=0.2)
+    assert 'quantile="0.95"' in registro.para_prometheus()
+
+    registro.reset()
+    assert registro.snapshot() == {"contadores": {}, "latencias": {}}
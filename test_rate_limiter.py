@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limiter import BaldeTokens, LimitadorEndpoint, LimitadorTaxa
+
+
+class Relogio:
+    """Relógio manual: o tempo só anda quando o teste manda"""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+
+def test_rajada_e_recarga():
+    relogio = Relogio()
+    balde = BaldeTokens(taxa_por_segundo=2, capacidade=5, relogio=relogio)
+    assert [balde.reservar(1) for _ in range(5)] == [0.0] * 5  # Rajada inteira sem espera
+    assert balde.reservar(1) == pytest.approx(0.5)
+    assert balde.reservar(1) == pytest.approx(1.0)  # Saldo negativo enfileira as reservas
+
+    relogio.avancar(1.0)  # +2 fichas: saldo volta a 0
+    assert balde.reservar(1) == pytest.approx(0.5)
+    relogio.avancar(100)
+    balde.reservar(0)
+    assert balde.saldo == 5  # A recarga para na capacidade
+
+
+def test_tentar_reservar_nunca_cria_espera():
+    relogio = Relogio()
+    balde = BaldeTokens(1, 2, relogio)
+    assert balde.tentar_reservar(2) and not balde.tentar_reservar(1)
+    assert balde.saldo == 0
+    relogio.avancar(1)
+    assert balde.tentar_reservar(1)
+
+
+def test_reserva_de_tokens_maior_que_a_rajada():
+    relogio = Relogio()
+    limitador = LimitadorEndpoint("llm", rps=10, rajada=10, tpm=60, relogio=relogio)  # 1 token/s, rajada 60
+    assert limitador._reservar(1, 120) == pytest.approx(60.0)  # Metade já disponível, o resto a 1 token/s
+    assert limitador._reservar(1, 1) == pytest.approx(61.0)  # Quem vem depois espera a reserva grande
+    relogio.avancar(61)
+    assert limitador._reservar(1, 1) == pytest.approx(1.0)
+    stats = limitador.get_stats()
+    assert stats["throttles"] == 3 and stats["espera_max_s"] == pytest.approx(61.0)
+    assert stats["tokens_reservados"] == 122
+
+
+def test_devolver_reserva_nao_usada():
+    relogio = Relogio()
+    limitador = LimitadorEndpoint("llm", rps=1, rajada=1, tpm=600, relogio=relogio)
+    assert limitador.tentar_adquirir(tokens=500)
+    limitador.ajustar_tokens(estimados=500, reais=100)  # A API usou menos que o estimado
+    assert limitador.tokens.saldo == pytest.approx(500)
+    assert limitador.get_stats()["tokens_reservados"] == 100
+
+    # Sem cota de tokens, a vaga de requisição reservada é devolvida
+    relogio.avancar(1)
+    assert not limitador.tentar_adquirir(tokens=10_000)
+    assert limitador.requisicoes.saldo == pytest.approx(1)
+    assert limitador.get_stats()["rejeicoes"] == 1
+
+    balde = BaldeTokens(1, 3, relogio)
+    balde.devolver(10)
+    assert balde.saldo == 3  # Devolução não passa da capacidade
+
+
+def test_taxa_zero_desliga_o_balde():
+    limitador = LimitadorTaxa({"embeddings": {"rps": 0, "rajada": 0, "tpm": 0}})
+    assert [limitador.adquirir("embeddings", tokens=10**6) for _ in range(3)] == [0.0] * 3
+    assert limitador.tentar_adquirir("embeddings", tokens=10**6)
+
+
+def test_aadquirir_nao_bloqueia_o_event_loop():
+    limitador = LimitadorEndpoint("llm", rps=5, rajada=1, tpm=0)
+    batidas = []
+
+    async def relogio_do_loop():
+        for _ in range(5):
+            batidas.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def cenario():
+        await limitador.aadquirir()  # Consome a rajada
+        inicio = time.monotonic()
+        espera, _ = await asyncio.gather(limitador.aadquirir(), relogio_do_loop())
+        return inicio, espera
+
+    inicio, espera = asyncio.run(cenario())
+    assert espera == pytest.approx(0.2, abs=0.05)
+    # O loop seguiu rodando durante a espera de 0,2 s
+    assert len(batidas) == 5 and batidas[-1] - inicio < espera